@@ -0,0 +1,23 @@
+from django.apps import AppConfig
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+
+
+class ProjectConfig(AppConfig):
+    name = 'app'
+
+    def ready(self) -> None:
+        from app.auth import check_user_cache, invalidate_user
+        from app.db import configure_connection
+        from app.response_cache import invalidate_on_write
+        from app.startup import first_response
+
+        post_save.connect(invalidate_on_write)
+        post_delete.connect(invalidate_on_write)
+        post_save.connect(invalidate_user, sender=get_user_model())
+        post_delete.connect(invalidate_user, sender=get_user_model())
+        connection_created.connect(configure_connection)
+        request_finished.connect(first_response)
+        check_user_cache()
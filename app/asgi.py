@@ -12,5 +12,20 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('GRAPHQL_ASYNC', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the apps are loaded by get_asgi_application
+from app.startup import application_ready  # noqa: E402
+from app.subscriptions import websocket_application  # noqa: E402
+
+application_ready()
+
+
+async def application(scope, receive, send):
+    '''Django for HTTP, the GraphQL subscriptions for websockets'''
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+from datetime import timedelta
+from functools import lru_cache, partial
+from typing import Any, Dict, NamedTuple, Optional, Union
+import time
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import User
+from django.core.cache import BaseCache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.http import HttpRequest
+from django.utils.translation import gettext as _
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import (
+    get_credentials,
+    get_http_authorization,
+    get_payload,
+)
+from app.lru import LRUCache
+
+
+class VerifiedToken(NamedTuple):
+    user_id: Any
+    username: str
+    expires_at: Optional[float]
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_JWT_CACHE', {})
+
+
+@lru_cache(maxsize=None)
+def get_token_cache() -> LRUCache[str, VerifiedToken]:
+    return LRUCache(get_config().get('TOKENS', 10000))
+
+
+def get_user_cache() -> Optional[BaseCache]:
+    alias: Optional[str] = get_config().get('CACHE')
+    return None if alias is None else caches[alias]
+
+
+def check_user_cache() -> None:
+    '''Refuse a user cache local to the process, called at startup
+
+    Saving a user only clears it from the user cache: other processes
+    would keep authenticating a disabled or deleted user until TIMEOUT.
+    '''
+    if isinstance(get_user_cache(), LocMemCache):
+        raise ImproperlyConfigured(
+            "GRAPHQL_JWT_CACHE['CACHE'] must be shared by every process, "
+            'not a LocMemCache'
+        )
+
+
+def user_key(user_id: Any) -> str:
+    return f'graphql_jwt:user:{user_id}'
+
+
+def cache_user(user: User) -> None:
+    cache: Optional[BaseCache] = get_user_cache()
+    if cache is not None:
+        cache.set(user_key(user.pk), user, get_config().get('TIMEOUT', 300))
+
+
+def invalidate_user(sender: type, instance: User, **kwargs: Any) -> None:
+    '''Drop `instance` from the user cache, now and on commit'''
+    cache: Optional[BaseCache] = get_user_cache()
+    if cache is None:
+        return
+    key: str = user_key(instance.pk)
+    cache.delete(key)
+    transaction.on_commit(partial(cache.delete, key))
+
+
+def get_expiration(payload: Dict[str, Any]) -> Optional[float]:
+    if not jwt_settings.JWT_VERIFY_EXPIRATION or 'exp' not in payload:
+        return None
+    leeway: Union[int, float, timedelta] = jwt_settings.JWT_LEEWAY
+    if isinstance(leeway, timedelta):
+        leeway = leeway.total_seconds()
+    return payload['exp'] + leeway
+
+
+def verify(token: str, context: Optional[HttpRequest]) -> Optional[User]:
+    '''Decode `token` and load its user, as graphql_jwt does'''
+    payload: Dict[str, Any] = get_payload(token, context)
+    username: str = jwt_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER(payload)
+    if not username:
+        raise JSONWebTokenError(_('Invalid payload'))
+    user: Optional[User] = jwt_settings.JWT_GET_USER_BY_NATURAL_KEY_HANDLER(
+        username
+    )
+    if user is None:
+        return None
+    if not getattr(user, 'is_active', True):
+        raise JSONWebTokenError(_('User is disabled'))
+    get_token_cache().set(
+        token, VerifiedToken(user.pk, username, get_expiration(payload))
+    )
+    cache_user(user)
+    return user
+
+
+def get_user_by_token(
+    token: str, context: Optional[HttpRequest] = None
+) -> Optional[User]:
+    '''graphql_jwt.shortcuts.get_user_by_token, cached
+
+    A verified token is remembered until it expires, and its user, in the
+    user cache if there is one, until it is saved or deleted. Anything
+    that does not match the cached state goes through the full
+    verification again.
+    '''
+    verified: Optional[VerifiedToken] = get_token_cache().get(token)
+    if verified is None or (
+        verified.expires_at is not None and verified.expires_at <= time.time()
+    ):
+        return verify(token, context)
+    cache: Optional[BaseCache] = get_user_cache()
+    user: Optional[User] = (
+        None if cache is None else cache.get(user_key(verified.user_id))
+    )
+    if user is None:
+        user = (
+            get_user_model()
+            ._default_manager.filter(pk=verified.user_id)
+            .first()
+        )
+        if user is None:
+            return None
+        cache_user(user)
+    if user.get_username() != verified.username or not getattr(
+        user, 'is_active', True
+    ):
+        return verify(token, context)
+    return user
+
+
+class JSONWebTokenBackend:
+    '''graphql_jwt's backend, verifying each token once per request'''
+
+    def authenticate(
+        self, request: Optional[HttpRequest] = None, **kwargs: Any
+    ) -> Optional[User]:
+        if request is None or getattr(request, '_jwt_token_auth', False):
+            return None
+        token: Optional[str] = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+        memo: Dict[str, Any] = request.__dict__.setdefault('_jwt_users', {})
+        if token not in memo:
+            try:
+                memo[token] = get_user_by_token(token, request)
+            except JSONWebTokenError as error:
+                memo[token] = error
+        if isinstance(memo[token], JSONWebTokenError):
+            raise memo[token]
+        return memo[token]
+
+    def get_user(self, user_id: Any) -> None:
+        return None
+
+
+def authenticate_request(request: HttpRequest) -> None:
+    '''Authenticate the JWT of `request` once, before execution
+
+    This replaces graphql_jwt's middleware: the user it authenticates is
+    the same for every field, and any field middleware makes graphql-core
+    wrap every resolved value into a promise. Tokens passed as field
+    arguments (JWT_ALLOW_ARGUMENT) still need that middleware.
+    '''
+    user: Optional[User] = getattr(request, 'user', None)
+    if user is not None and not user.is_anonymous:
+        return
+    if get_http_authorization(request) is None:
+        return
+    user = authenticate(request=request)
+    if user is not None:
+        request.user = user
@@ -0,0 +1,202 @@
+from __future__ import annotations
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional
+from django.conf import settings
+from graphql import GraphQLError
+from graphql.backend.base import GraphQLDocument
+from graphql.language import ast
+from graphql.type.definition import (
+    GraphQLList,
+    GraphQLNonNull,
+    GraphQLObjectType,
+    get_named_type,
+)
+from graphql.type.schema import GraphQLSchema
+import graphene
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+
+class QueryCost(NamedTuple):
+    '''Nesting depth of an operation and its estimated number of rows'''
+
+    depth: int
+    cost: int
+
+
+class QueryTooComplexError(GraphQLError):
+    pass
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_QUERY_LIMITS', {})
+
+
+def _is_connection(type_: Any) -> bool:
+    graphene_type: Any = getattr(type_, 'graphene_type', None)
+    return isinstance(graphene_type, type) and issubclass(
+        graphene_type, graphene.relay.Connection
+    )
+
+
+def _is_model(type_: Any) -> bool:
+    return (
+        getattr(
+            getattr(getattr(type_, 'graphene_type', None), '_meta', None),
+            'model',
+            None,
+        )
+        is not None
+    )
+
+
+def _is_list(type_: Any) -> bool:
+    if isinstance(type_, GraphQLNonNull):
+        type_ = type_.of_type
+    return isinstance(type_, GraphQLList)
+
+
+class CostAnalysis:
+    '''Estimates the rows an operation can load, before executing it
+
+    Every selected model object counts as one row. Connections, and
+    plain lists taking a `first` argument such as topTracks, multiply the
+    cost of their items by their page size; other plain lists, such as
+    the reverse relations, by LIST_SIZE.
+    '''
+
+    def __init__(
+        self,
+        document: GraphQLDocument,
+        variables: Optional[Dict[str, Any]],
+        list_size: int = DEFAULT_PAGE_SIZE,
+    ) -> None:
+        self.schema: GraphQLSchema = document.schema
+        self.variables: Dict[str, Any] = variables or {}
+        self.list_size: int = list_size
+        self.fragments: Dict[str, ast.FragmentDefinition] = {
+            definition.name.value: definition
+            for definition in document.document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        self.operations: Dict[Optional[str], ast.OperationDefinition] = {
+            definition.name.value if definition.name else None: definition
+            for definition in document.document_ast.definitions
+            if isinstance(definition, ast.OperationDefinition)
+        }
+
+    def analyze(self, operation_name: Optional[str]) -> QueryCost:
+        operation: Optional[ast.OperationDefinition]
+        if operation_name is None and len(self.operations) == 1:
+            operation = next(iter(self.operations.values()))
+        else:
+            operation = self.operations.get(operation_name)
+        if operation is None:
+            return QueryCost(0, 0)
+        root: Optional[GraphQLObjectType] = {
+            'query': self.schema.get_query_type,
+            'mutation': self.schema.get_mutation_type,
+            'subscription': self.schema.get_subscription_type,
+        }[operation.operation]()
+        return self.visit(root, operation.selection_set, frozenset())
+
+    def visit(
+        self,
+        parent: Any,
+        selection_set: Optional[ast.SelectionSet],
+        fragments: FrozenSet[str],
+    ) -> QueryCost:
+        depth: int = 0
+        cost: int = 0
+        if selection_set is None or not isinstance(parent, GraphQLObjectType):
+            return QueryCost(depth, cost)
+        for selection in selection_set.selections:
+            child: QueryCost
+            if isinstance(selection, ast.Field):
+                child = self.visit_field(parent, selection, fragments)
+            elif isinstance(selection, ast.InlineFragment):
+                condition: Any = parent
+                if selection.type_condition is not None:
+                    condition = self.schema.get_type(
+                        selection.type_condition.name.value
+                    )
+                child = self.visit(
+                    condition, selection.selection_set, fragments
+                )
+            else:
+                name: str = selection.name.value
+                if name not in self.fragments or name in fragments:
+                    continue
+                child = self.visit(
+                    parent,
+                    self.fragments[name].selection_set,
+                    fragments | {name},
+                )
+            depth = max(depth, child.depth)
+            cost += child.cost
+        return QueryCost(depth, cost)
+
+    def visit_field(
+        self,
+        parent: GraphQLObjectType,
+        selection: ast.Field,
+        fragments: FrozenSet[str],
+    ) -> QueryCost:
+        name: str = selection.name.value
+        field: Any = parent.fields.get(name)
+        if field is None or name.startswith('__'):
+            return QueryCost(0, 0)
+        type_: Any = get_named_type(field.type)
+        child: QueryCost = self.visit(
+            type_, selection.selection_set, fragments
+        )
+        size: int = 1
+        if _is_connection(type_) or (
+            _is_list(field.type) and 'first' in field.args
+        ):
+            size = self.get_page_size(field, selection)
+        elif _is_list(field.type) and not _is_connection(parent):
+            size = self.list_size
+        return QueryCost(
+            child.depth + 1, size * (int(_is_model(type_)) + child.cost)
+        )
+
+    def get_page_size(self, field: Any, selection: ast.Field) -> int:
+        first: Any = None
+        argument: Any = field.args.get('first')
+        if argument is not None:
+            first = argument.default_value
+        for node in selection.arguments or ():
+            if node.name.value != 'first':
+                continue
+            if isinstance(node.value, ast.Variable):
+                first = self.variables.get(node.value.name.value, first)
+            elif isinstance(node.value, ast.IntValue):
+                first = int(node.value.value)
+        if not isinstance(first, int):
+            first = DEFAULT_PAGE_SIZE
+        return max(0, min(first, MAX_PAGE_SIZE))
+
+
+def check_limits(
+    document: GraphQLDocument,
+    variables: Optional[Dict[str, Any]],
+    operation_name: Optional[str],
+) -> QueryCost:
+    '''The cost of the operation, or QueryTooComplexError over the limits
+
+    The limits are read from the GRAPHQL_QUERY_LIMITS setting.
+    '''
+    config: Dict[str, Any] = get_config()
+    cost: QueryCost = CostAnalysis(
+        document, variables, config.get('LIST_SIZE', DEFAULT_PAGE_SIZE)
+    ).analyze(operation_name)
+    max_depth: Optional[int] = config.get('MAX_DEPTH')
+    if max_depth is not None and cost.depth > max_depth:
+        raise QueryTooComplexError(
+            f'Query depth {cost.depth} exceeds the limit of {max_depth}'
+        )
+    max_cost: Optional[int] = config.get('MAX_COST')
+    if max_cost is not None and cost.cost > max_cost:
+        raise QueryTooComplexError(
+            f'Query cost {cost.cost} exceeds the limit of {max_cost}'
+        )
+    return cost
@@ -0,0 +1,173 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import logging
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def get_pragmas() -> Dict[str, Any]:
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def configure_connection(
+    sender: type, connection: BaseDatabaseWrapper, **kwargs: Any
+) -> None:
+    '''Apply the SQLITE_PRAGMAS setting to every new SQLite connection'''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in get_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'DATABASE_REPLICAS', {})
+
+
+class ReplicaPool:
+    '''Hands out the healthy replicas, round-robin
+
+    A replica is probed with a `SELECT 1` when it is chosen, at most
+    every `check_interval` seconds; one whose probe fails is skipped for
+    `retry_after` seconds.
+    '''
+
+    def __init__(
+        self,
+        replicas: Sequence[str],
+        check_interval: float = 5,
+        retry_after: float = 30,
+    ) -> None:
+        self.replicas: List[str] = list(replicas)
+        self.check_interval: float = check_interval
+        self.retry_after: float = retry_after
+        self.lock: Lock = Lock()
+        self.next: int = 0
+        self.checked_at: Dict[str, float] = {}
+        self.down_until: Dict[str, float] = {}
+
+    def choose(self) -> Optional[str]:
+        for _ in range(len(self.replicas)):
+            with self.lock:
+                replica: str = self.replicas[self.next % len(self.replicas)]
+                self.next += 1
+            if self.is_healthy(replica):
+                return replica
+        return None
+
+    def is_healthy(self, replica: str) -> bool:
+        now: float = time.monotonic()
+        if self.down_until.get(replica, now) > now:
+            return False
+        if now - self.checked_at.get(replica, -self.check_interval) < (
+            self.check_interval
+        ):
+            return True
+        try:
+            self.check(replica)
+        except DatabaseError as error:
+            logger.warning('Replica %s is down: %s', replica, error)
+            self.down_until[replica] = now + self.retry_after
+            return False
+        self.checked_at[replica] = now
+        return True
+
+    def check(self, replica: str) -> None:
+        with connections[replica].cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+@lru_cache(maxsize=None)
+def get_replica_pool() -> ReplicaPool:
+    config: Dict[str, Any] = get_config()
+    return ReplicaPool(
+        config.get('REPLICAS', []),
+        config.get('CHECK_INTERVAL', 5),
+        config.get('RETRY_AFTER', 30),
+    )
+
+
+class Routing:
+    '''Where the reads of the current request go'''
+
+    def __init__(self) -> None:
+        self.replica_reads: bool = False
+        self.pinned: bool = False
+        self.replica: Optional[str] = None
+
+
+routing: ContextVar[Optional[Routing]] = ContextVar('routing', default=None)
+
+
+@contextmanager
+def request_routing() -> Iterator[Routing]:
+    '''Track the writes of a request, to pin its later reads to the primary'''
+    state: Routing = Routing()
+    token: Any = routing.set(state)
+    try:
+        yield state
+    finally:
+        routing.reset(token)
+
+
+def has_written() -> bool:
+    '''Whether the current request wrote, so reads from the primary'''
+    state: Optional[Routing] = routing.get()
+    return state is not None and state.pinned
+
+
+@contextmanager
+def replica_reads(enabled: bool = True) -> Iterator[None]:
+    '''Let the reads of the block go to a replica, in request_routing()'''
+    state: Optional[Routing] = routing.get()
+    if state is None:
+        yield
+        return
+    previous: bool = state.replica_reads
+    state.replica_reads = enabled
+    try:
+        yield
+    finally:
+        state.replica_reads = previous
+
+
+class ReplicaRouter:
+    '''Sends the reads allowed by replica_reads() to a replica
+
+    A request reads from a single replica, chosen the first time it reads,
+    so that it sees a consistent state. Once it writes, its reads go to
+    the primary, where its writes are. Everything else uses the primary.
+
+    Replicas lag: a query right after a mutation may still read the former
+    state, which the response cache then keeps until its next
+    invalidation.
+    '''
+
+    def db_for_read(self, model: type, **hints: Any) -> Optional[str]:
+        state: Optional[Routing] = routing.get()
+        if state is None or not state.replica_reads or state.pinned:
+            return None
+        if state.replica is None:
+            state.replica = get_replica_pool().choose() or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model: type, **hints: Any) -> Optional[str]:
+        state: Optional[Routing] = routing.get()
+        if state is not None:
+            state.pinned = True
+        return None
+
+    def allow_relation(self, obj1: Any, obj2: Any, **hints: Any) -> bool:
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, **hints: Any) -> bool:
+        '''Replicas get their schema from the primary'''
+        return db not in get_config().get('REPLICAS', [])
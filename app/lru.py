@@ -0,0 +1,33 @@
+from __future__ import annotations
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, Optional, TypeVar
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class LRUCache(Generic[K, V]):
+    '''A thread-safe mapping keeping the `size` most recently used keys'''
+
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            value: Optional[V] = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
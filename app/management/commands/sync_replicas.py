@@ -0,0 +1,40 @@
+from typing import Any, List
+import time
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+    CommandParser,
+)
+from django.db import DEFAULT_DB_ALIAS, connections
+from app.db import get_config
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the SQLite replicas, which '
+        'stand in for replication when testing locally'
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--every',
+            type=float,
+            help='keep syncing, every given number of seconds',
+        )
+
+    def handle(self, *args: Any, every: float, **options: Any) -> None:
+        replicas: List[str] = get_config().get('REPLICAS', [])
+        primary: Any = connections[DEFAULT_DB_ALIAS]
+        for alias in [DEFAULT_DB_ALIAS, *replicas]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias} is not a SQLite database')
+        while True:
+            primary.ensure_connection()
+            for alias in replicas:
+                replica: Any = connections[alias]
+                replica.ensure_connection()
+                primary.connection.backup(replica.connection)
+            self.stdout.write(f'Synced {len(replicas)} replicas')
+            if every is None:
+                return
+            time.sleep(every)
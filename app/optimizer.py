@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Sequence, Set
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, Prefetch, QuerySet
+from graphene.utils.str_converters import to_snake_case
+from graphql.execution.base import ResolveInfo
+from graphql.language import ast
+
+
+def get_selections(
+    info: ResolveInfo, path: Sequence[str] = ()
+) -> Dict[str, List[ast.Field]]:
+    '''Return the sub-fields selected on the resolved field, by name
+
+    `path` walks down wrapper fields first, e.g. ('edges', 'node') for a
+    relay connection.
+    '''
+    fields: Dict[str, List[ast.Field]] = collect_fields(info, info.field_asts)
+    for name in path:
+        fields = collect_fields(info, fields.get(name, []))
+    return fields
+
+
+def collect_fields(
+    info: ResolveInfo, field_asts: Iterable[ast.Field]
+) -> Dict[str, List[ast.Field]]:
+    fields: Dict[str, List[ast.Field]] = {}
+    for field_ast in field_asts:
+        if field_ast.selection_set is not None:
+            _collect_selections(info, field_ast.selection_set, fields, set())
+    return fields
+
+
+def _collect_selections(
+    info: ResolveInfo,
+    selection_set: ast.SelectionSet,
+    fields: Dict[str, List[ast.Field]],
+    visited: Set[str],
+) -> None:
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            fields.setdefault(selection.name.value, []).append(selection)
+        elif isinstance(selection, ast.InlineFragment):
+            _collect_selections(info, selection.selection_set, fields, visited)
+        elif isinstance(selection, ast.FragmentSpread):
+            name: str = selection.name.value
+            if name in visited or name not in info.fragments:
+                continue
+            visited.add(name)
+            _collect_selections(
+                info, info.fragments[name].selection_set, fields, visited
+            )
+
+
+def optimize(
+    queryset: QuerySet,
+    info: ResolveInfo,
+    path: Sequence[str] = (),
+    required: Iterable[str] = (),
+) -> QuerySet:
+    '''Shape `queryset` after the client's selection set
+
+    Forward relations are joined with select_related, reverse relations
+    are prefetched, and only the columns backing a selected field (plus
+    the `required` ones) are loaded.
+    '''
+    return _optimize(queryset, info, get_selections(info, path), required)
+
+
+def _optimize(
+    queryset: QuerySet,
+    info: ResolveInfo,
+    fields: Dict[str, List[ast.Field]],
+    required: Iterable[str] = (),
+) -> QuerySet:
+    only: List[str] = [queryset.model._meta.pk.name, *required]
+    select_related: List[str] = []
+    prefetches: List[Prefetch] = []
+    _plan(queryset.model, info, fields, '', only, select_related, prefetches)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset.only(*only)
+
+
+def _plan(
+    model: type,
+    info: ResolveInfo,
+    fields: Dict[str, List[ast.Field]],
+    prefix: str,
+    only: List[str],
+    select_related: List[str],
+    prefetches: List[Prefetch],
+) -> None:
+    for name, field_asts in fields.items():
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            continue
+        lookup: str = prefix + field.name
+        if not field.is_relation:
+            only.append(lookup)
+        elif field.many_to_one or (field.one_to_one and field.concrete):
+            only.append(lookup)
+            related: Dict[str, List[ast.Field]] = collect_fields(
+                info, field_asts
+            )
+            if related:
+                select_related.append(lookup)
+                only.append(f'{lookup}__{field.related_model._meta.pk.name}')
+                _plan(
+                    field.related_model,
+                    info,
+                    related,
+                    f'{lookup}__',
+                    only,
+                    select_related,
+                    prefetches,
+                )
+        else:
+            required: List[str] = []
+            if field.one_to_many or field.one_to_one:
+                required.append(field.field.name)
+            accessor: str = prefix + field.get_accessor_name()
+            prefetches.append(
+                Prefetch(
+                    accessor,
+                    queryset=_optimize(
+                        field.related_model._default_manager.all(),
+                        info,
+                        collect_fields(info, field_asts),
+                        required,
+                    ),
+                )
+            )
+
+
+def is_loaded(instance: Model, name: str) -> bool:
+    '''Whether the relation `name` was joined or prefetched already'''
+    if name in getattr(instance, '_prefetched_objects_cache', {}):
+        return True
+    field = instance._meta.get_field(name)
+    return field.concrete and field.is_cached(instance)
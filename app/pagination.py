@@ -0,0 +1,96 @@
+from __future__ import annotations
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from typing import Any, List, Optional, Sequence, Type
+import json
+from django.db.models import Model, Q, QuerySet
+from graphene import relay
+from graphql import GraphQLError
+
+DEFAULT_PAGE_SIZE: int = 20
+MAX_PAGE_SIZE: int = 100
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload: str = json.dumps(
+        [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in values
+        ]
+    )
+    return urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values: Any = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (Base64Error, UnicodeDecodeError, ValueError):
+        raise GraphQLError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise GraphQLError('Invalid cursor')
+    return values
+
+
+def _field_name(ordering: str) -> str:
+    return ordering.lstrip('-')
+
+
+def _after(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    '''Rows strictly after `values` in `ordering`, as a keyset predicate'''
+    condition: Q = Q()
+    for i, field in enumerate(ordering):
+        lookup: str = 'lt' if field.startswith('-') else 'gt'
+        clause: Q = Q(
+            **{
+                _field_name(previous): value
+                for previous, value in zip(ordering[:i], values)
+            },
+            **{f'{_field_name(field)}__{lookup}': values[i]},
+        )
+        condition |= clause
+    return condition
+
+
+def paginate(
+    queryset: QuerySet,
+    connection_type: Type[relay.Connection],
+    ordering: Sequence[str],
+    first: Optional[int] = None,
+    after: Optional[str] = None,
+) -> relay.Connection:
+    '''Return a page of `queryset` as a relay connection
+
+    Pages are cut with a keyset predicate on `ordering` (which must end
+    with a unique field), never with OFFSET, so every page costs an index
+    range scan however deep the client pages.
+    '''
+    if first is None:
+        first = DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise GraphQLError('`first` must be a positive integer')
+    first = min(first, MAX_PAGE_SIZE)
+    queryset = queryset.order_by(*ordering)
+    if after is not None:
+        queryset = queryset.filter(
+            _after(ordering, decode_cursor(after, len(ordering)))
+        )
+    nodes: List[Model] = list(queryset[: first + 1])
+    has_next_page: bool = len(nodes) > first
+    edges: List[Any] = [
+        connection_type.Edge(
+            node=node,
+            cursor=encode_cursor(
+                [getattr(node, _field_name(field)) for field in ordering]
+            ),
+        )
+        for node in nodes[:first]
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=after is not None,
+            has_next_page=has_next_page,
+        ),
+    )
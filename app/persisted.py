@@ -0,0 +1,144 @@
+from __future__ import annotations
+from functools import lru_cache, partial
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+import json
+from django.conf import settings
+from graphql import GraphQLError
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult, execute
+from graphql.language.base import parse
+from graphql.type.schema import GraphQLSchema
+from graphql.validation import validate
+from promise import Promise
+from app.lru import LRUCache
+
+
+def query_hash(query: str) -> str:
+    return sha256(query.encode()).hexdigest()
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    '''Parses and validates each distinct document once
+
+    Documents are cached by the hash of their text, so the hot path of a
+    request repeating a known query is a dictionary lookup.
+    '''
+
+    def __init__(self, cache_size: int = 1000, executor: Any = None) -> None:
+        super().__init__(executor)
+        self.documents: LRUCache[str, GraphQLDocument] = LRUCache(cache_size)
+
+    def document_from_string(
+        self, schema: GraphQLSchema, document_string: Any
+    ) -> GraphQLDocument:
+        if not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+        key: str = query_hash(document_string)
+        document: Optional[GraphQLDocument] = self.documents.get(key)
+        if document is None or document.schema is not schema:
+            document = self.build_document(schema, document_string)
+            self.documents.set(key, document)
+        return document
+
+    def build_document(
+        self, schema: GraphQLSchema, document_string: str
+    ) -> GraphQLDocument:
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        run: Callable[..., Union[ExecutionResult, Promise]]
+        if errors:
+
+            def run(*args: Any, **kwargs: Any) -> ExecutionResult:
+                return ExecutionResult(errors=errors, invalid=True)
+
+        else:
+            run = partial(execute, schema, document_ast, **self.execute_params)
+        return GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=run,
+        )
+
+
+class PersistedQueryError(GraphQLError):
+    pass
+
+
+class PersistedQueries:
+    '''Resolves Apollo-style persisted query hashes into query text
+
+    Without an allow-list, any client may register a query by sending it
+    along with its sha256 hash once, then send the hash alone. With an
+    allow-list, only the listed queries can be executed.
+    '''
+
+    def __init__(
+        self,
+        cache_size: int = 1000,
+        allow_list: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.registered: LRUCache[str, str] = LRUCache(cache_size)
+        self.allow_list: Optional[Dict[str, str]] = None
+        if allow_list is not None:
+            self.allow_list = {
+                query_hash(query): query for query in allow_list
+            }
+
+    @classmethod
+    def from_settings(cls, config: Dict[str, Any]) -> PersistedQueries:
+        allow_list: Optional[Iterable[str]] = None
+        if config.get('ALLOW_LIST'):
+            allow_list = json.loads(Path(config['ALLOW_LIST']).read_text())
+        return cls(config.get('CACHE_SIZE', 1000), allow_list)
+
+    def get_query(
+        self, query: Optional[str], extensions: Optional[Dict[str, Any]]
+    ) -> Optional[str]:
+        persisted: Dict[str, Any] = (extensions or {}).get(
+            'persistedQuery'
+        ) or {}
+        digest: Optional[str] = persisted.get('sha256Hash')
+        if self.allow_list is not None:
+            return self._get_allowed(self.allow_list, query, digest)
+        if digest is None:
+            return query
+        if query is None:
+            query = self.registered.get(digest)
+            if query is None:
+                raise PersistedQueryError('PersistedQueryNotFound')
+            return query
+        if query_hash(query) != digest:
+            raise PersistedQueryError('provided sha does not match query')
+        self.registered.set(digest, query)
+        return query
+
+    @staticmethod
+    def _get_allowed(
+        allow_list: Dict[str, str], query: Optional[str], digest: Optional[str]
+    ) -> Optional[str]:
+        if digest is None and query is not None:
+            digest = query_hash(query)
+        allowed: Optional[str] = allow_list.get(digest or '')
+        if allowed is None:
+            raise PersistedQueryError('PersistedQueryNotFound')
+        if query is not None and query != allowed:
+            raise PersistedQueryError('provided sha does not match query')
+        return allowed
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', {})
+
+
+@lru_cache(maxsize=None)
+def get_document_backend() -> CachedDocumentBackend:
+    return CachedDocumentBackend(get_config().get('CACHE_SIZE', 1000))
+
+
+@lru_cache(maxsize=None)
+def get_persisted_queries() -> PersistedQueries:
+    return PersistedQueries.from_settings(get_config())
@@ -0,0 +1,129 @@
+from __future__ import annotations
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Set
+import asyncio
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Event:
+    '''One published payload, as seen by every listener of its channel
+
+    Listeners of the same process share the instance, so they can share
+    the work done for it too.
+    '''
+
+    __slots__ = ('channel', 'payload', 'results')
+
+    def __init__(self, channel: str, payload: Dict[str, Any]) -> None:
+        self.channel: str = channel
+        self.payload: Dict[str, Any] = payload
+        self.results: Dict[Any, Any] = {}
+
+
+Listener = Callable[[Event], None]
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_SUBSCRIPTIONS', {})
+
+
+class PubSub:
+    '''Fans the events published on a channel out to its listeners
+
+    Listeners are called in the publishing thread and must not block:
+    a websocket connection only hands the event over to its event loop.
+    '''
+
+    def __init__(self) -> None:
+        self.lock: Lock = Lock()
+        self.listeners: Dict[str, Set[Listener]] = {}
+
+    async def subscribe(self, channel: str, listener: Listener) -> None:
+        with self.lock:
+            self.listeners.setdefault(channel, set()).add(listener)
+
+    async def unsubscribe(self, channel: str, listener: Listener) -> None:
+        with self.lock:
+            listeners: Set[Listener] = self.listeners.get(channel, set())
+            listeners.discard(listener)
+            if not listeners:
+                self.listeners.pop(channel, None)
+
+    def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        self.dispatch(channel, payload)
+
+    def dispatch(self, channel: str, payload: Dict[str, Any]) -> None:
+        with self.lock:
+            listeners: List[Listener] = list(self.listeners.get(channel, ()))
+        event: Event = Event(channel, payload)
+        for listener in listeners:
+            listener(event)
+
+
+class ChannelLayerPubSub(PubSub):
+    '''Relays the events through a Channels layer to every process
+
+    Each process joins the group of a channel while it has listeners for
+    it, and dispatches what the layer delivers to them. Payloads must be
+    serializable by the layer.
+    '''
+
+    def __init__(self, alias: str = 'default') -> None:
+        super().__init__()
+        try:
+            from channels.layers import get_channel_layer
+        except ImportError as error:
+            raise ImproperlyConfigured(
+                'ChannelLayerPubSub requires the channels package'
+            ) from error
+        self.layer: Any = get_channel_layer(alias)
+        if self.layer is None:
+            raise ImproperlyConfigured(f'No channel layer named {alias!r}')
+        self.name: Optional[str] = None
+        self.started: Optional[asyncio.Future] = None
+
+    async def subscribe(self, channel: str, listener: Listener) -> None:
+        if self.started is None:
+            self.started = asyncio.ensure_future(self.start())
+        await self.started
+        new: bool = channel not in self.listeners
+        await super().subscribe(channel, listener)
+        if new:
+            await self.layer.group_add(channel, self.name)
+
+    async def unsubscribe(self, channel: str, listener: Listener) -> None:
+        await super().unsubscribe(channel, listener)
+        if channel not in self.listeners:
+            await self.layer.group_discard(channel, self.name)
+
+    def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        async_to_sync(self.layer.group_send)(
+            channel,
+            {'type': 'pubsub.event', 'channel': channel, 'payload': payload},
+        )
+
+    async def start(self) -> None:
+        self.name = await self.layer.new_channel()
+        asyncio.ensure_future(self.read())
+
+    async def read(self) -> None:
+        while True:
+            message: Dict[str, Any] = await self.layer.receive(self.name)
+            self.dispatch(message['channel'], message['payload'])
+
+
+@lru_cache(maxsize=None)
+def get_pubsub() -> PubSub:
+    config: Dict[str, Any] = get_config()
+    backend: type = import_string(config.get('BACKEND', 'app.pubsub.PubSub'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def publish(channel: str, payload: Dict[str, Any]) -> None:
+    '''Publish the event once the current transaction commits'''
+    transaction.on_commit(lambda: get_pubsub().publish(channel, payload))
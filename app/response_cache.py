@@ -0,0 +1,286 @@
+from __future__ import annotations
+from functools import partial
+from hashlib import sha256
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Type
+from weakref import WeakKeyDictionary
+import json
+import time
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+from django.db.models import Model
+from django.http import HttpRequest
+from graphql.backend.base import GraphQLDocument
+from graphql.execution import ExecutionResult
+from graphql.language import ast
+from graphql.language.printer import print_ast
+from graphql.type.definition import GraphQLObjectType, get_named_type
+from graphql.type.schema import GraphQLSchema
+from graphql_jwt.utils import get_http_authorization
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_RESPONSE_CACHE', {})
+
+
+def get_group(model: Type[Model]) -> Optional[str]:
+    '''The invalidation group of `model`, if its writes invalidate anything'''
+    return get_config().get('MODELS', {}).get(model._meta.label_lower)
+
+
+class DocumentMemo:
+    '''What is computed once per document'''
+
+    def __init__(self) -> None:
+        self.touched_groups: Optional[FrozenSet[str]] = None
+        self.introspection_results: Dict[str, Dict[str, Any]] = {}
+        self.normalized_hash: str = ''
+
+
+memos: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def get_memo(document: GraphQLDocument) -> DocumentMemo:
+    '''The memo of `document`, kept as long as the backend caches it'''
+    memo: Optional[DocumentMemo] = memos.get(document)
+    if memo is None:
+        memo = memos.setdefault(document, DocumentMemo())
+    return memo
+
+
+def touched_groups(document: GraphQLDocument) -> FrozenSet[str]:
+    '''The invalidation groups of every model type the document selects
+
+    Memoized per document, which the backend caches by query text.
+    '''
+    memo: DocumentMemo = get_memo(document)
+    groups: Optional[FrozenSet[str]] = memo.touched_groups
+    if groups is None:
+        schema: GraphQLSchema = document.schema
+        fragments: Dict[str, ast.FragmentDefinition] = {
+            definition.name.value: definition
+            for definition in document.document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        found: Set[str] = set()
+        for definition in document.document_ast.definitions:
+            if isinstance(definition, ast.OperationDefinition):
+                _walk(
+                    schema.get_query_type(),
+                    definition.selection_set,
+                    fragments,
+                    found,
+                    set(),
+                )
+        groups = frozenset(found)
+        memo.touched_groups = groups
+    return groups
+
+
+def _walk(
+    parent: Any,
+    selection_set: Optional[ast.SelectionSet],
+    fragments: Dict[str, ast.FragmentDefinition],
+    found: Set[str],
+    visited: Set[str],
+) -> None:
+    if selection_set is None or not isinstance(parent, GraphQLObjectType):
+        return
+    model: Optional[Type[Model]] = getattr(
+        getattr(getattr(parent, 'graphene_type', None), '_meta', None),
+        'model',
+        None,
+    )
+    group: Optional[str] = None if model is None else get_group(model)
+    if group is not None:
+        found.add(group)
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            field: Any = parent.fields.get(selection.name.value)
+            if field is not None:
+                _walk(
+                    get_named_type(field.type),
+                    selection.selection_set,
+                    fragments,
+                    found,
+                    visited,
+                )
+        elif isinstance(selection, ast.InlineFragment):
+            _walk(
+                parent,
+                selection.selection_set,
+                fragments,
+                found,
+                visited,
+            )
+        elif isinstance(selection, ast.FragmentSpread):
+            name: str = selection.name.value
+            if name in fragments and name not in visited:
+                visited.add(name)
+                _walk(
+                    parent,
+                    fragments[name].selection_set,
+                    fragments,
+                    found,
+                    visited,
+                )
+
+
+def is_introspection(
+    document: GraphQLDocument, operation_name: Optional[str]
+) -> bool:
+    '''Whether the operation only selects __schema, __type or __typename'''
+    operations: List[ast.OperationDefinition] = [
+        definition
+        for definition in document.document_ast.definitions
+        if isinstance(definition, ast.OperationDefinition)
+        and (
+            operation_name is None
+            or (definition.name and definition.name.value == operation_name)
+        )
+    ]
+    return len(operations) == 1 and all(
+        isinstance(selection, ast.Field)
+        and selection.name.value.startswith('__')
+        for selection in operations[0].selection_set.selections
+    )
+
+
+def get_introspection(
+    document: GraphQLDocument, operation_name: Optional[str]
+) -> ExecutionResult:
+    '''Execute an introspection operation once per document
+
+    Its result only depends on the schema, so the data is memoized per
+    document, which the backend caches by query text, for every viewer.
+    '''
+    results: Dict[str, Dict[str, Any]] = get_memo(
+        document
+    ).introspection_results
+    data: Optional[Dict[str, Any]] = results.get(operation_name or '')
+    if data is None:
+        result: ExecutionResult = document.execute(
+            operation_name=operation_name
+        )
+        if result.errors or result.invalid or result.data is None:
+            return result
+        data = results[operation_name or ''] = result.data
+    return ExecutionResult(data=data)
+
+
+def normalized_hash(document: GraphQLDocument) -> str:
+    '''Hash the printed document, memoized per document'''
+    memo: DocumentMemo = get_memo(document)
+    if not memo.normalized_hash:
+        memo.normalized_hash = sha256(
+            print_ast(document.document_ast).encode()
+        ).hexdigest()
+    return memo.normalized_hash
+
+
+def get_viewer(request: HttpRequest) -> str:
+    '''Identify whose permissions a response was computed with
+
+    This must not hit the database: the raw credentials are hashed rather
+    than resolved into a user.
+    '''
+    token: Optional[str] = get_http_authorization(request)
+    if token is not None:
+        return 'jwt:' + sha256(token.encode()).hexdigest()
+    session_key: Optional[str] = request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if session_key is not None:
+        return 'session:' + sha256(session_key.encode()).hexdigest()
+    return 'anonymous'
+
+
+class ResponseCache:
+    '''Caches the data of successful Query operations
+
+    Entries are keyed by the printed document, variables, operation name
+    and viewer, plus the current generation of every invalidation group
+    the document touches. Bumping a group's generation makes all the
+    entries built from it unreachable; the cache backend's TTL and LRU
+    culling then reclaim them.
+    '''
+
+    def __init__(self, cache: BaseCache) -> None:
+        self.cache: BaseCache = cache
+
+    @staticmethod
+    def generation_key(group: str) -> str:
+        return f'graphql:generation:{group}'
+
+    def get_generations(self, groups: FrozenSet[str]) -> List[Any]:
+        keys: List[str] = [self.generation_key(group) for group in groups]
+        generations: Dict[str, Any] = self.cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                # Never restart from a generation an old entry may carry
+                self.cache.add(key, time.time_ns(), None)
+                generations[key] = self.cache.get(key)
+        return [generations[key] for key in sorted(keys)]
+
+    def get_key(
+        self,
+        document: GraphQLDocument,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        viewer: str,
+    ) -> str:
+        groups: FrozenSet[str] = touched_groups(document)
+        payload: str = json.dumps(
+            [
+                normalized_hash(document),
+                variables or {},
+                operation_name,
+                viewer,
+                sorted(groups),
+                self.get_generations(groups),
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return 'graphql:response:' + sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.cache.get(key)
+
+    def set(self, key: str, data: Dict[str, Any]) -> None:
+        self.cache.set(key, data)
+
+    def invalidate(self, group: str) -> None:
+        key: str = self.generation_key(group)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, time.time_ns(), None)
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    config: Dict[str, Any] = get_config()
+    if not config.get('ENABLED', False):
+        return None
+    return ResponseCache(caches[config.get('CACHE', 'default')])
+
+
+def invalidate(model: Type[Model]) -> None:
+    '''Drop the cached responses built from `model`
+
+    The generation is bumped right away and again on commit, so that a
+    response computed from the pre-commit state by a concurrent request
+    cannot outlive the transaction. Call this after writes that bypass
+    model signals (bulk_create, QuerySet.update).
+    '''
+    group: Optional[str] = get_group(model)
+    response_cache: Optional[ResponseCache] = get_response_cache()
+    if group is not None and response_cache is not None:
+        response_cache.invalidate(group)
+        transaction.on_commit(partial(response_cache.invalidate, group))
+
+
+def invalidate_on_write(
+    sender: Type[Model], instance: Model, **kwargs: Any
+) -> None:
+    invalidate(sender)
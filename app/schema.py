@@ -1,5 +1,8 @@
+from functools import lru_cache
+from typing import Any
 import graphene
 import graphql_jwt
+from app.startup import mark
 import tracks.schema
 import users.schema
 
@@ -18,4 +21,21 @@ class Mutation(
     refresh_token: graphql_jwt.Refresh.Field = graphql_jwt.Refresh.Field()
 
 
-schema: graphene.Schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+class Subscription(tracks.schema.Subscription, graphene.ObjectType):
+    pass
+
+
+@lru_cache(maxsize=None)
+def get_schema() -> graphene.Schema:
+    schema: graphene.Schema = graphene.Schema(
+        query=Query, mutation=Mutation, subscription=Subscription
+    )
+    mark('schema')
+    return schema
+
+
+def __getattr__(name: str) -> Any:
+    '''Build `schema` on first access, rather than on import (PEP 562)'''
+    if name == 'schema':
+        return get_schema()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
 from pathlib import Path
+import os
+import app.startup  # noqa: F401 Starts the clock of the startup timings
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent
@@ -30,14 +32,19 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# The admin site, at /admin/, is only installed in debug unless
+# DJANGO_ADMIN=1: importing it is a good part of the startup time.
+ADMIN_ENABLED = os.environ.get('DJANGO_ADMIN', '1' if DEBUG else '0') == '1'
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    *(['django.contrib.admin'] if ADMIN_ENABLED else []),
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'graphene_django',
+    'app.apps.ProjectConfig',
     'tracks',
 ]
 
@@ -75,12 +82,83 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# DJANGO_DB_PROFILE selects the database: 'development' (the default),
+# or 'sqlite' and 'postgresql' for production. Production connections are
+# persistent: each server thread keeps its own for DB_CONN_MAX_AGE seconds,
+# so the pool size is the number of threads serving requests (see
+# GRAPHQL_ASYNC['WORKERS'] under ASGI).
+#
+# The production profiles add a read replica per host listed, comma
+# separated, in POSTGRES_REPLICA_HOSTS, or per file in SQLITE_REPLICAS
+# (copies of the primary, refreshed by `manage.py sync_replicas`).
+
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+
+if DB_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'tracks'),
+            'USER': os.environ.get('POSTGRES_USER', 'tracks'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            # Set DB_POOLER=1 behind a transaction pooler such as PgBouncer,
+            # which cannot hold server-side cursors across transactions
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_POOLER') == '1',
+            'OPTIONS': {'connect_timeout': 5},
+        }
+    }
+    replica_hosts = os.environ.get('POSTGRES_REPLICA_HOSTS', '')
+    for index, host in enumerate(filter(None, replica_hosts.split(',')), 1):
+        DATABASES[f'replica{index}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'TEST': {'MIRROR': 'default'},
+        }
+elif DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            # Seconds a writer waits for the lock before "database is locked"
+            'OPTIONS': {'timeout': 20},
+        }
+    }
+    for index, path in enumerate(
+        filter(None, os.environ.get('SQLITE_REPLICAS', '').split(',')), 1
+    ):
+        DATABASES[f'replica{index}'] = {
+            **DATABASES['default'],
+            'NAME': path,
+            'TEST': {'MIRROR': 'default'},
+        }
+    # Applied to every new connection (see app.db). With WAL, readers no
+    # longer block the writer nor wait for it.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# GraphQL query operations read from the REPLICAS, one per request chosen
+# round-robin, until the request writes: from then on it reads from the
+# primary (see app.db.ReplicaRouter). A replica failing its probe, run at
+# most every CHECK_INTERVAL seconds, is skipped for RETRY_AFTER seconds.
+DATABASE_ROUTERS = ['app.db.ReplicaRouter']
+DATABASE_REPLICAS = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    'CHECK_INTERVAL': 5,
+    'RETRY_AFTER': 30,
 }
 
 
@@ -122,14 +200,149 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'graphql': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'graphql',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 GRAPHENE = {
     'SCHEMA': 'app.schema.schema',
-    'MIDDLEWARE': [
-        'graphql_jwt.middleware.JSONWebTokenMiddleware',
-    ],
+    # JWTs are authenticated once by the GraphQL view (see app.auth). Add
+    # graphql_jwt.middleware.JSONWebTokenMiddleware for JWT_ALLOW_ARGUMENT.
+    'MIDDLEWARE': [],
+}
+
+# Parsed-document cache and Apollo persisted queries of the /graphql/ view.
+# Set ALLOW_LIST to a JSON file holding the list of accepted query strings
+# to reject every other query.
+GRAPHQL_PERSISTED_QUERIES = {
+    'CACHE_SIZE': 1000,
+    'ALLOW_LIST': None,
+}
+
+# Trending tracks (see tracks.trending): a like weighs half as much every
+# HALF_LIFE seconds, and the SIZE best tracks are ranked by the
+# compute_trending command, which reads new likes CHUNK_SIZE at a time.
+# Scores decayed below MIN_SCORE are forgotten.
+TRACKS_TRENDING = {
+    'HALF_LIFE': 24 * 3600,
+    'SIZE': 100,
+    'CHUNK_SIZE': 10000,
+    'MIN_SCORE': 0.001,
+}
+
+# Write-behind of createLike (see tracks.write_behind): when ENABLED, likes
+# are queued in memory (up to MAX_SIZE, waiting TIMEOUT seconds for room)
+# and inserted by a thread, BATCH_SIZE at a time or every INTERVAL seconds.
+# Likes queued by a killed process are lost.
+TRACKS_WRITE_BEHIND = {
+    'ENABLED': os.environ.get('TRACKS_WRITE_BEHIND') == '1',
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'INTERVAL': 0.5,
+    'TIMEOUT': 1.0,
+    'RETRIES': 3,
+}
+
+# Response cache of Query operations. Writes to a model listed in MODELS
+# invalidate every cached response selecting a type of the same group.
+GRAPHQL_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'graphql',
+    'MODELS': {
+        'tracks.track': 'tracks',
+        'tracks.like': 'tracks',
+        'tracks.follow': 'tracks',
+        'tracks.feedentry': 'tracks',
+        'tracks.trendingtrack': 'tracks',
+        'auth.user': 'users',
+    },
+}
+
+# Operations deeper than MAX_DEPTH fields, or estimated to load more than
+# MAX_COST rows, are rejected. Connections are weighted by their page size
+# and plain lists, such as Track.likes, by LIST_SIZE. A batch (a JSON
+# array of operations) holds up to MAX_BATCH_SIZE of them.
+GRAPHQL_QUERY_LIMITS = {
+    'MAX_DEPTH': 10,
+    'MAX_COST': 10000,
+    'LIST_SIZE': 20,
+    'MAX_BATCH_SIZE': 20,
+}
+
+# Tracing of a SAMPLE_RATE fraction of the /graphql/ operations: resolver
+# times, SQL query count and time. Traces are aggregated into the histograms
+# served at /metrics/ when METRICS is set, and returned in the Apollo tracing
+# format as the extensions.tracing of the response when EXTENSIONS is set.
+# Operations are labelled by name, up to MAX_OPERATIONS distinct names per
+# process: the operations named otherwise afterwards are labelled "other".
+GRAPHQL_TRACING = {
+    'SAMPLE_RATE': float(os.environ.get('GRAPHQL_TRACING_SAMPLE_RATE', 0.0)),
+    'EXTENSIONS': False,
+    'METRICS': True,
+    'MAX_OPERATIONS': 100,
+}
+
+# Execution of the /graphql/ endpoint under ASGI, which app/asgi.py enables.
+# Requests wait on the event loop and run on a pool of WORKERS threads, so
+# WORKERS bounds the number of database connections.
+GRAPHQL_ASYNC = {
+    'ENABLED': os.environ.get('GRAPHQL_ASYNC') == '1',
+    'WORKERS': int(os.environ.get('GRAPHQL_ASYNC_WORKERS', 8)),
+}
+
+# Subscriptions are served over websockets under ASGI (app.asgi), at PATH,
+# with the graphql-ws protocol. Events are fanned out in-process; set
+# BACKEND to 'app.pubsub.ChannelLayerPubSub' (OPTIONS {'alias': ...}) to
+# relay them between processes through a Channels layer. A connection
+# runs up to MAX_OPERATIONS subscriptions, each ended once QUEUE_SIZE
+# events are pending, and is sent a keep-alive every KEEP_ALIVE seconds.
+GRAPHQL_SUBSCRIPTIONS = {
+    'BACKEND': 'app.pubsub.PubSub',
+    'OPTIONS': {},
+    'PATH': '/graphql/',
+    'MAX_OPERATIONS': 20,
+    'QUEUE_SIZE': 100,
+    'KEEP_ALIVE': 20,
+}
+
+# Startup of a server process (see app.startup). GraphiQL is served on GET
+# /graphql/ in debug unless GRAPHQL_GRAPHIQL=0, and out of debug only with
+# GRAPHQL_GRAPHIQL=1. With WARM_UP, the work of the first request (URLconf,
+# schema, introspection) is done when the WSGI/ASGI application is created.
+GRAPHQL_STARTUP = {
+    'GRAPHIQL': os.environ.get('GRAPHQL_GRAPHIQL', '1' if DEBUG else '0')
+    == '1',
+    'WARM_UP': os.environ.get('GRAPHQL_WARM_UP') == '1',
+}
+
+# Identical operations in flight are executed once, their result shared
+# (see app.single_flight). A request waits up to TIMEOUT seconds for an
+# identical one before executing itself.
+GRAPHQL_SINGLE_FLIGHT = {
+    'ENABLED': True,
+    'TIMEOUT': 5.0,
+}
+
+# Verified JWTs are remembered per process (up to TOKENS of them) until
+# they expire. Their users are loaded on every request, or kept in CACHE
+# for TIMEOUT seconds or until they are saved or deleted. CACHE must be
+# shared by every process (e.g. memcached), for all of them to see a
+# disabled or deleted user: a process-local cache is refused at startup.
+GRAPHQL_JWT_CACHE = {
+    'TOKENS': 10000,
+    'CACHE': os.environ.get('GRAPHQL_JWT_USER_CACHE') or None,
+    'TIMEOUT': 300,
 }
 
 AUTHENTICATION_BACKENDS = [
-    'graphql_jwt.backends.JSONWebTokenBackend',
+    'app.auth.JSONWebTokenBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
\ No newline at end of file
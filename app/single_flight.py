@@ -0,0 +1,181 @@
+'''Coalescing of identical operations in flight (single-flight)
+
+When identical requests arrive together, e.g. as a popular track is
+shared, the first one (the leader) executes and the others (the
+followers) wait for it and share its result, instead of running the same
+SQL. Requests are coalesced twice:
+
+- on the event loop of AsyncGraphQLView, before they take a worker
+  thread, when they have the same method, path, query string, body and
+  viewer. Followers share the response of the leader when it only ran
+  Query operations and wrote nothing, and execute themselves otherwise.
+- in GraphQLView, on any thread, when Query operations have the same
+  document, variables, operation name and viewer. Requests that already
+  wrote (e.g. earlier in a batch) are not coalesced, to read their
+  writes.
+
+The viewer is identified as for the response cache (see
+app.response_cache.get_viewer), so that only requests with the same
+permissions share results. A follower waits up to TIMEOUT seconds, then
+executes itself (the fallback), as it does when the leader fails. Waits
+are observed into graphql_single_flight_seconds, by outcome.
+'''
+from __future__ import annotations
+from functools import lru_cache
+from hashlib import sha256
+from threading import Event, Lock
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+import asyncio
+import json
+import time
+from django.conf import settings
+from django.http import HttpRequest
+from graphql.backend.base import GraphQLDocument
+from app.response_cache import get_viewer, normalized_hash
+from app.tracing import get_metrics
+
+T = TypeVar('T')
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_SINGLE_FLIGHT', {})
+
+
+class Flight(Generic[T]):
+    '''An execution in flight, that followers wait for'''
+
+    def __init__(self) -> None:
+        self.done: Event = Event()
+        # The result once the leader succeeded, empty until then
+        self.results: List[T] = []
+
+
+class SingleFlight:
+    '''The executions in flight of a process, by key
+
+    Threads wait on flights, and coroutines on futures of their event
+    loop: run() and run_async() do not coalesce with each other.
+    '''
+
+    def __init__(self, timeout: float = 5.0) -> None:
+        self.timeout: float = timeout
+        self.lock: Lock = Lock()
+        self.flights: Dict[str, Flight] = {}
+        self.futures: Dict[str, asyncio.Future] = {}
+
+    def observe(self, outcome: str, start: float) -> None:
+        get_metrics().observe(
+            'graphql_single_flight_seconds',
+            (('outcome', outcome),),
+            time.perf_counter() - start,
+        )
+
+    def run(self, key: str, function: Callable[[], T]) -> Tuple[T, bool]:
+        '''Call `function`, unless a call under `key` is in flight
+
+        Returns the result, and whether it is that of another call.
+        '''
+        with self.lock:
+            flight: Optional[Flight] = self.flights.get(key)
+            leader: bool = flight is None
+            if flight is None:
+                flight = self.flights[key] = Flight()
+        if leader:
+            try:
+                result: T = function()
+                flight.results.append(result)
+                return result, False
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+        start: float = time.perf_counter()
+        if flight.done.wait(self.timeout) and flight.results:
+            self.observe('shared', start)
+            return flight.results[0], True
+        self.observe('fallback', start)
+        return function(), False
+
+    async def run_async(
+        self, key: str, function: Callable[[], Awaitable[Tuple[T, bool]]]
+    ) -> Tuple[T, bool]:
+        '''Await `function`, unless a call under `key` is in flight
+
+        `function` returns its result and whether it may be shared.
+        Returns the result, and whether it is that of another call.
+        '''
+        future: Optional[asyncio.Future] = self.futures.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.futures[key] = future
+            try:
+                result: T
+                shareable: bool
+                result, shareable = await function()
+                if shareable:
+                    future.set_result(result)
+                return result, False
+            finally:
+                del self.futures[key]
+                if not future.done():
+                    future.set_exception(LookupError(key))
+                # Followers get the exception, not the event loop's logger
+                future.exception()
+        start: float = time.perf_counter()
+        try:
+            shared: T = await asyncio.wait_for(
+                asyncio.shield(future), self.timeout
+            )
+        except (LookupError, asyncio.TimeoutError):
+            self.observe('fallback', start)
+            return (await function())[0], False
+        self.observe('shared', start)
+        return shared, True
+
+
+@lru_cache(maxsize=None)
+def get_single_flight() -> SingleFlight:
+    return SingleFlight(get_config().get('TIMEOUT', 5.0))
+
+
+def operation_key(
+    document: GraphQLDocument,
+    variables: Optional[Dict[str, Any]],
+    operation_name: Optional[str],
+    request: HttpRequest,
+) -> str:
+    payload: str = json.dumps(
+        [
+            normalized_hash(document),
+            variables or {},
+            operation_name,
+            get_viewer(request),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return 'operation:' + sha256(payload.encode()).hexdigest()
+
+
+def request_key(request: HttpRequest) -> str:
+    digest: Any = sha256()
+    for part in (
+        request.method,
+        request.path,
+        request.META.get('QUERY_STRING', ''),
+        request.content_type,
+        get_viewer(request),
+    ):
+        digest.update(f'{part}\0'.encode())
+    digest.update(request.body)
+    return 'request:' + digest.hexdigest()
@@ -0,0 +1,81 @@
+'''Startup timing and warm-up of a server process
+
+The clock starts when app.settings is imported, which every entry point
+does first. Each phase is recorded once, as the seconds elapsed since,
+logged and observed into the graphql_startup_seconds metric:
+
+- application: the WSGI or ASGI application is created
+- urls: the URLconf, and so the views, is imported
+- schema: the GraphQL schema is built
+- warm_up: the warm-up is done (see GRAPHQL_STARTUP['WARM_UP'])
+- first_response: the first response is sent
+
+This module is imported by the settings, so it only imports the standard
+library up front.
+'''
+from __future__ import annotations
+from typing import Any, Dict, Tuple
+import logging
+import time
+
+STARTED: float = time.perf_counter()
+PHASES: Dict[str, float] = {}
+SECONDS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def get_config() -> Dict[str, Any]:
+    from django.conf import settings
+
+    return getattr(settings, 'GRAPHQL_STARTUP', {})
+
+
+def mark(phase: str) -> None:
+    '''Record the time `phase` took to be reached, the first time only'''
+    if phase in PHASES:
+        return
+    elapsed: float = time.perf_counter() - STARTED
+    PHASES[phase] = elapsed
+    logger.info('%s after %.0fms', phase, elapsed * 1000)
+    from app.tracing import get_metrics
+
+    get_metrics().observe(
+        'graphql_startup_seconds', (('phase', phase),), elapsed, SECONDS
+    )
+
+
+def first_response(sender: Any, **kwargs: Any) -> None:
+    from django.core.signals import request_finished
+
+    mark('first_response')
+    request_finished.disconnect(first_response)
+
+
+def warm_up() -> None:
+    '''Do the work of the first request before it comes
+
+    Imports the URLconf, builds the schema, and parses and executes the
+    standard introspection query, whose result /graphql/ then serves
+    from memory.
+    '''
+    from django.urls import get_resolver
+    from graphene_django.settings import graphene_settings
+    from graphql.backend.base import GraphQLDocument
+    from graphql.utils.introspection_query import introspection_query
+    from app.persisted import get_document_backend
+    from app.response_cache import get_introspection
+
+    get_resolver().url_patterns
+    document: GraphQLDocument = get_document_backend().document_from_string(
+        graphene_settings.SCHEMA, introspection_query
+    )
+    get_introspection(document, None)
+    mark('warm_up')
+
+
+def application_ready() -> None:
+    '''Called by app.wsgi and app.asgi once the application is created'''
+    mark('application')
+    if get_config().get('WARM_UP', False):
+        warm_up()
@@ -0,0 +1,441 @@
+'''GraphQL subscriptions over WebSockets
+
+app.asgi serves them with the graphql-ws protocol of
+subscriptions-transport-ws, the one of Apollo Client and GraphiQL.
+'''
+from __future__ import annotations
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+import asyncio
+import json
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import close_old_connections
+from graphql import GraphQLError, validate
+from graphql.backend.base import GraphQLDocument
+from graphql.error import format_error
+from graphql.execution import ExecutionResult
+from graphql.execution.executor import collect_fields, execute_fields
+from graphql.execution.executors.sync import SyncExecutor
+from graphql.execution.utils import ExecutionContext
+from graphql.pyutils.default_ordered_dict import DefaultOrderedDict
+from graphql.type.definition import GraphQLObjectType
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.settings import graphene_settings
+from promise import Promise
+from app.auth import get_user_by_token
+from app.cost import check_limits
+from app.persisted import get_document_backend
+from app.pubsub import Event, get_config, get_pubsub
+from app.views import get_executor
+
+PROTOCOL: str = 'graphql-ws'
+
+Message = Dict[str, Any]
+
+
+def run_sync(function: Callable[..., Any], *args: Any) -> Any:
+    '''Call `function` on a worker thread of the GraphQL executor'''
+    close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+class Context:
+    '''The info.context of subscription resolvers, new for every event'''
+
+    def __init__(self, user: User) -> None:
+        self.user: User = user
+
+
+class Operation:
+    '''A started subscription, listening to a pub/sub channel'''
+
+    def __init__(
+        self,
+        id: str,
+        channel: str,
+        document: GraphQLDocument,
+        variables: Dict[str, Any],
+        operation_name: Optional[str],
+        queue_size: int,
+    ) -> None:
+        self.id: str = id
+        self.channel: str = channel
+        self.document: GraphQLDocument = document
+        self.variables: Dict[str, Any] = variables
+        self.operation_name: Optional[str] = operation_name
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def key(self) -> Tuple[str, str, Optional[str]]:
+        return (
+            self.document.document_string,
+            json.dumps(self.variables, sort_keys=True),
+            self.operation_name,
+        )
+
+    def deliver(self, event: Event) -> None:
+        '''Queue `event`, on the event loop; a full queue ends with None'''
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+            return
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    def execute(self, event: Event, user: User) -> ExecutionResult:
+        '''Execute the selection of the document on the event payload'''
+        schema: Any = self.document.schema
+        context: ExecutionContext = ExecutionContext(
+            schema,
+            self.document.document_ast,
+            event.payload,
+            Context(user),
+            self.variables,
+            self.operation_name,
+            SyncExecutor(),
+            None,
+            True,
+        )
+
+        def execute(_: Any) -> Any:
+            root: GraphQLObjectType = schema.get_subscription_type()
+            return execute_fields(
+                context,
+                root,
+                event.payload,
+                collect_fields(
+                    context,
+                    root,
+                    context.operation.selection_set,
+                    DefaultOrderedDict(list),
+                    set(),
+                ),
+                [],
+                None,
+            )
+
+        def on_rejected(error: Exception) -> None:
+            context.errors.append(error)
+
+        data: Any = (
+            Promise.resolve(None).then(execute).catch(on_rejected).get()
+        )
+        return ExecutionResult(data=data, errors=context.errors or None)
+
+    def respond(self, event: Event, user: User) -> str:
+        '''The JSON payload of the data message of `event`'''
+        result: ExecutionResult = self.execute(event, user)
+        response: Dict[str, Any] = {'data': result.data}
+        if result.errors:
+            response['errors'] = [
+                format_error(error) for error in result.errors
+            ]
+        return json.dumps(response)
+
+
+class ChannelListener:
+    '''The operations of an event loop subscribed to a pub/sub channel
+
+    Called by the pub/sub once per event, from any thread, it wakes the
+    loop up once to queue the event for all of them.
+    '''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, channel: str) -> None:
+        self.loop: asyncio.AbstractEventLoop = loop
+        self.channel: str = channel
+        self.operations: Set[Operation] = set()
+
+    def __call__(self, event: Event) -> None:
+        self.loop.call_soon_threadsafe(self.deliver, event)
+
+    def deliver(self, event: Event) -> None:
+        for operation in list(self.operations):
+            operation.deliver(event)
+
+
+LISTENERS: Dict[Tuple[asyncio.AbstractEventLoop, str], ChannelListener] = {}
+
+
+async def listen(operation: Operation) -> None:
+    key: Tuple[asyncio.AbstractEventLoop, str] = (
+        asyncio.get_running_loop(),
+        operation.channel,
+    )
+    listener: Optional[ChannelListener] = LISTENERS.get(key)
+    if listener is not None:
+        listener.operations.add(operation)
+        return
+    listener = LISTENERS[key] = ChannelListener(*key)
+    listener.operations.add(operation)
+    await get_pubsub().subscribe(operation.channel, listener)
+
+
+async def unlisten(operation: Operation) -> None:
+    key: Tuple[asyncio.AbstractEventLoop, str] = (
+        asyncio.get_running_loop(),
+        operation.channel,
+    )
+    listener: Optional[ChannelListener] = LISTENERS.get(key)
+    if listener is None:
+        return
+    listener.operations.discard(operation)
+    if not listener.operations:
+        del LISTENERS[key]
+        await get_pubsub().unsubscribe(operation.channel, listener)
+
+
+Prepared = Tuple[str, GraphQLDocument, Dict[str, Any], Optional[str]]
+
+
+def prepare(payload: Dict[str, Any]) -> Prepared:
+    '''The channel, document, variables and operation name of a start
+
+    Raises a GraphQLError for the operations that cannot be subscribed to.
+    '''
+    query: Any = payload.get('query')
+    variables: Any = payload.get('variables') or {}
+    operation_name: Optional[str] = payload.get('operationName')
+    if not isinstance(query, str):
+        raise GraphQLError('Must provide query string.')
+    if not isinstance(variables, dict):
+        raise GraphQLError('Variables are invalid JSON.')
+    schema: Any = graphene_settings.SCHEMA
+    document: GraphQLDocument = get_document_backend().document_from_string(
+        schema, query
+    )
+    errors: Any = validate(schema, document.document_ast)
+    if errors:
+        raise errors[0]
+    if document.get_operation_type(operation_name) != 'subscription':
+        raise GraphQLError('Only subscriptions are served over websockets.')
+    check_limits(document, variables, operation_name)
+    context: ExecutionContext = ExecutionContext(
+        schema,
+        document.document_ast,
+        None,
+        None,
+        variables,
+        operation_name,
+        SyncExecutor(),
+        None,
+        True,
+    )
+    root: GraphQLObjectType = schema.get_subscription_type()
+    fields: DefaultOrderedDict = collect_fields(
+        context,
+        root,
+        context.operation.selection_set,
+        DefaultOrderedDict(list),
+        set(),
+    )
+    if len(fields) != 1:
+        raise GraphQLError('Subscriptions must select exactly one field.')
+    field_ast: Any = next(iter(fields.values()))[0]
+    name: str = field_ast.name.value
+    subscribe: Callable[..., str] = getattr(
+        root.graphene_type, f'subscribe_{to_snake_case(name)}'
+    )
+    channel: str = subscribe(
+        **context.get_argument_values(root.fields[name], field_ast)
+    )
+    return channel, document, variables, operation_name
+
+
+class Connection:
+    '''One websocket, and the subscriptions it started
+
+    An idle connection only holds a few coroutines. Every event is
+    executed on the GraphQL executor threads, once per distinct
+    operation and user of the process: the subscribers sharing them
+    share the result.
+    '''
+
+    def __init__(
+        self,
+        scope: Dict[str, Any],
+        receive: Callable[[], Awaitable[Message]],
+        send: Callable[[Message], Awaitable[None]],
+    ) -> None:
+        self.scope: Dict[str, Any] = scope
+        self.receive: Callable[[], Awaitable[Message]] = receive
+        self.send_message: Callable[[Message], Awaitable[None]] = send
+        self.config: Dict[str, Any] = get_config()
+        self.user: User = AnonymousUser()
+        self.operations: Dict[str, Operation] = {}
+        self.lock: asyncio.Lock = asyncio.Lock()
+        self.keep_alive: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        message: Message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if self.scope['path'] != self.config.get(
+            'PATH', '/graphql/'
+        ) or PROTOCOL not in self.scope.get('subprotocols', ()):
+            await self.send_message({'type': 'websocket.close'})
+            return
+        await self.send_message(
+            {'type': 'websocket.accept', 'subprotocol': PROTOCOL}
+        )
+        try:
+            while True:
+                message = await self.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if not await self.handle(message.get('text') or ''):
+                    await self.send_message({'type': 'websocket.close'})
+                    break
+        finally:
+            if self.keep_alive is not None:
+                self.keep_alive.cancel()
+            for id in list(self.operations):
+                await self.stop(id)
+
+    async def send(self, message: Message) -> None:
+        await self.send_text(json.dumps(message))
+
+    async def send_text(self, text: str) -> None:
+        async with self.lock:
+            await self.send_message({'type': 'websocket.send', 'text': text})
+
+    async def execute(self, function: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), partial(run_sync, function, *args)
+        )
+
+    async def handle(self, text: str) -> bool:
+        '''Handle a client message, False once the socket must be closed'''
+        try:
+            message: Any = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            await self.send(
+                {
+                    'type': 'connection_error',
+                    'payload': {'message': 'Invalid message'},
+                }
+            )
+            return True
+        type: Any = message.get('type')
+        id: Any = message.get('id')
+        payload: Any = message.get('payload') or {}
+        if type == 'connection_init':
+            return await self.init(payload)
+        if type == 'start':
+            await self.start(str(id), payload)
+        elif type == 'stop':
+            await self.stop(str(id))
+            await self.send({'type': 'complete', 'id': id})
+        elif type == 'connection_terminate':
+            return False
+        return True
+
+    async def init(self, payload: Dict[str, Any]) -> bool:
+        '''Authenticate the JWT of the connection params, if any
+
+        It is passed as an Authorization header would be, since browsers
+        cannot set the headers of a websocket.
+        '''
+        authorization: Any = payload.get('Authorization')
+        if isinstance(authorization, str):
+            prefix, _, token = authorization.partition(' ')
+            try:
+                if (
+                    prefix.lower()
+                    != jwt_settings.JWT_AUTH_HEADER_PREFIX.lower()
+                ):
+                    raise JSONWebTokenError('Invalid authorization header')
+                self.user = (
+                    await self.execute(get_user_by_token, token)
+                    or AnonymousUser()
+                )
+            except JSONWebTokenError as error:
+                await self.send(
+                    {
+                        'type': 'connection_error',
+                        'payload': {'message': str(error)},
+                    }
+                )
+                return False
+        await self.send({'type': 'connection_ack'})
+        interval: float = self.config.get('KEEP_ALIVE', 0)
+        if interval and self.keep_alive is None:
+            await self.send({'type': 'ka'})
+            self.keep_alive = asyncio.ensure_future(self.ping(interval))
+        return True
+
+    async def ping(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.send({'type': 'ka'})
+
+    async def start(self, id: str, payload: Dict[str, Any]) -> None:
+        await self.stop(id)
+        try:
+            if len(self.operations) >= self.config.get('MAX_OPERATIONS', 20):
+                raise GraphQLError(
+                    'Too many subscriptions on this connection.'
+                )
+            prepared: Prepared = await self.execute(prepare, payload)
+        except GraphQLError as error:
+            await self.send(
+                {'type': 'error', 'id': id, 'payload': format_error(error)}
+            )
+            return
+        operation: Operation = Operation(
+            id, *prepared, self.config.get('QUEUE_SIZE', 100)
+        )
+        self.operations[id] = operation
+        operation.task = asyncio.ensure_future(self.pump(operation))
+        await listen(operation)
+
+    async def stop(self, id: str) -> None:
+        operation: Optional[Operation] = self.operations.pop(id, None)
+        if operation is None:
+            return
+        await unlisten(operation)
+        if operation.task is not None:
+            operation.task.cancel()
+
+    async def pump(self, operation: Operation) -> None:
+        '''Execute the operation on its events, one at a time'''
+        key: Tuple[Any, ...] = (*operation.key, self.user.pk)
+        while True:
+            event: Optional[Event] = await operation.queue.get()
+            if event is None:
+                await self.send(
+                    {
+                        'type': 'error',
+                        'id': operation.id,
+                        'payload': {'message': 'Too many pending events.'},
+                    }
+                )
+                asyncio.ensure_future(self.stop(operation.id))
+                return
+            if key not in event.results:
+                event.results[key] = asyncio.ensure_future(
+                    self.execute(operation.respond, event, self.user)
+                )
+            # Shielded: cancelling this subscription must not cancel the
+            # execution the other subscribers of the event wait for.
+            payload: str = await asyncio.shield(event.results[key])
+            await self.send_text(
+                '{"type": "data", "id": %s, "payload": %s}'
+                % (json.dumps(operation.id), payload)
+            )
+
+
+async def websocket_application(
+    scope: Dict[str, Any],
+    receive: Callable[[], Awaitable[Message]],
+    send: Callable[[Message], Awaitable[None]],
+) -> None:
+    '''The ASGI application of the subscription websockets'''
+    await Connection(scope, receive, send).run()
@@ -0,0 +1,894 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Event, Thread, Timer
+from typing import Any, Dict, List, Optional, Tuple
+from unittest import mock
+import asyncio
+import json
+import time
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from graphene_django.settings import graphene_settings
+from graphql.backend.base import GraphQLDocument
+from graphql.utils.introspection_query import introspection_query
+from graphql_jwt.shortcuts import get_token
+from app.auth import check_user_cache, get_token_cache
+from app.db import ReplicaPool, ReplicaRouter, configure_connection
+from app.persisted import (
+    PersistedQueries,
+    get_document_backend,
+    get_persisted_queries,
+    query_hash,
+)
+from app.pubsub import get_pubsub
+from app.response_cache import get_memo, is_introspection
+from app.single_flight import SingleFlight
+from app.startup import PHASES, warm_up
+from app.subscriptions import Operation, websocket_application
+from app.tracing import Metrics
+from app.views import AsyncGraphQLView, GraphQLView
+from tracks.models import Track
+
+QUERY: str = 'query { tracks { edges { node { id } } } }'
+
+
+class PersistedQueryTest(TestCase):
+    def post(
+        self, query: Optional[str], digest: Optional[str] = None
+    ) -> Dict[str, Any]:
+        body: Dict[str, Any] = {'query': query}
+        if digest is not None:
+            body['extensions'] = {
+                'persistedQuery': {'version': 1, 'sha256Hash': digest}
+            }
+        return self.client.post(
+            '/graphql/', json.dumps(body), content_type='application/json'
+        ).json()
+
+    def setUp(self) -> None:
+        caches['graphql'].clear()
+
+    def tearDown(self) -> None:
+        get_persisted_queries.cache_clear()
+
+    def test_hash_is_registered_then_accepted_alone(self) -> None:
+        digest: str = query_hash(QUERY)
+        self.assertEqual(
+            self.post(None, digest)['errors'][0]['message'],
+            'PersistedQueryNotFound',
+        )
+        self.assertNotIn('errors', self.post(QUERY, digest))
+        self.assertEqual(
+            self.post(None, digest)['data'], {'tracks': {'edges': []}}
+        )
+
+    def test_mismatching_hash_is_rejected(self) -> None:
+        self.assertEqual(
+            self.post(QUERY, query_hash('query { me { id } }'))['errors'][0][
+                'message'
+            ],
+            'provided sha does not match query',
+        )
+
+    def test_allow_list_rejects_unknown_queries(self) -> None:
+        persisted: PersistedQueries = get_persisted_queries()
+        persisted.allow_list = {query_hash(QUERY): QUERY}
+        self.assertNotIn('errors', self.post(None, query_hash(QUERY)))
+        self.assertNotIn('errors', self.post(QUERY))
+        self.assertEqual(
+            self.post('query { me { id } }')['errors'][0]['message'],
+            'PersistedQueryNotFound',
+        )
+
+    def test_documents_are_parsed_once(self) -> None:
+        self.post(QUERY)
+        document: Any = get_document_backend().documents.get(query_hash(QUERY))
+        self.assertIsNotNone(document)
+        self.post(QUERY)
+        self.assertIs(
+            get_document_backend().documents.get(query_hash(QUERY)), document
+        )
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self) -> None:
+        caches['graphql'].clear()
+
+    def post(self, query: str, **headers: str) -> Dict[str, Any]:
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query}),
+            content_type='application/json',
+            **headers,
+        ).json()
+
+    def test_queries_are_served_from_cache_until_a_write(self) -> None:
+        Track.objects.create(title='a', description='', url='http://a')
+        first: Dict[str, Any] = self.post(QUERY)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.post(QUERY), first)
+        Track.objects.create(title='b', description='', url='http://b')
+        self.assertEqual(len(self.post(QUERY)['data']['tracks']['edges']), 2)
+
+    def test_writes_only_invalidate_their_group(self) -> None:
+        self.post(QUERY)
+        get_user_model().objects.create(username='someone')
+        with self.assertNumQueries(0):
+            self.post(QUERY)
+
+    def test_viewers_do_not_share_entries(self) -> None:
+        users: List[User] = [
+            get_user_model().objects.create(username=name)
+            for name in ('alice', 'bob')
+        ]
+        for user in users:
+            me: Dict[str, Any] = self.post(
+                'query { me { username } }',
+                HTTP_AUTHORIZATION=f'JWT {get_token(user)}',
+            )
+            self.assertEqual(me['data']['me']['username'], user.username)
+
+    def test_mutations_bypass_the_cache(self) -> None:
+        track: Track = Track.objects.create(
+            title='a', description='', url='http://a'
+        )
+        mutation: str = (
+            'mutation { createLike(trackId: %d) { track { likeCount } } }'
+            % track.pk
+        )
+        for count, name in ((1, 'alice'), (2, 'bob')):
+            user: User = get_user_model().objects.create(username=name)
+            data: Dict[str, Any] = self.post(
+                mutation, HTTP_AUTHORIZATION=f'JWT {get_token(user)}'
+            )
+            self.assertEqual(
+                data['data']['createLike']['track']['likeCount'], count
+            )
+
+    @override_settings(GRAPHQL_RESPONSE_CACHE={'ENABLED': False})
+    def test_cache_can_be_disabled(self) -> None:
+        self.post(QUERY)
+        with self.assertNumQueries(1):
+            self.post(QUERY)
+
+
+class QueryLimitTest(TestCase):
+    def post(self, query: str, **variables: Any) -> HttpResponse:
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json',
+        )
+
+    def setUp(self) -> None:
+        caches['graphql'].clear()
+
+    def test_cost_is_returned_in_extensions(self) -> None:
+        response: HttpResponse = self.post(
+            'query Tracks($first: Int) { tracks(first: $first) { edges '
+            '{ node { title likes { user { username } } } } } '
+            '__schema { types { name } } }',
+            first=5,
+        )
+        self.assertEqual(
+            response.json()['extensions'],
+            {'cost': {'depth': 6, 'cost': 5 * (1 + 20 * 2)}},
+        )
+
+    def test_nested_cycles_are_rejected_before_execution(self) -> None:
+        with self.assertNumQueries(0):
+            response: HttpResponse = self.post(
+                'query { tracks { edges { node { likes { user { likes '
+                '{ track { likes { user { username } } } } } } } } } }'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['errors'][0]['message'],
+            'Query cost 336820 exceeds the limit of 10000',
+        )
+
+    def test_lists_are_weighted_by_first(self) -> None:
+        for first, cost in ((None, 20 * 2), (2, 2 * 2), (100, 100 * 2)):
+            response: HttpResponse = self.post(
+                'query($first: Int) { topTracks(first: $first) '
+                '{ title postedBy { username } } }',
+                first=first,
+            )
+            self.assertEqual(
+                response.json()['extensions']['cost']['cost'], cost
+            )
+        with override_settings(GRAPHQL_QUERY_LIMITS={'MAX_COST': 199}):
+            self.assertEqual(
+                self.post(
+                    'query { trendingTracks(first: 100) { title '
+                    'postedBy { username } } }'
+                ).json()['errors'][0]['message'],
+                'Query cost 200 exceeds the limit of 199',
+            )
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={'MAX_DEPTH': 3})
+    def test_depth_limit(self) -> None:
+        self.assertEqual(
+            self.post('query { tracks { edges { node { id } } } }').json()[
+                'errors'
+            ][0]['message'],
+            'Query depth 4 exceeds the limit of 3',
+        )
+
+
+class TracingTest(TestCase):
+    def setUp(self) -> None:
+        caches['graphql'].clear()
+        user: User = get_user_model().objects.create(username='user')
+        Track.objects.create(title='title', url='', posted_by=user)
+
+    def post(self) -> Dict[str, Any]:
+        return self.client.post(
+            '/graphql/',
+            json.dumps(
+                {
+                    'query': 'query Tracks { tracks { edges { node '
+                    '{ title likes { id } } } } }'
+                }
+            ),
+            content_type='application/json',
+        ).json()
+
+    def test_unsampled_operations_are_not_traced(self) -> None:
+        self.assertNotIn('tracing', self.post()['extensions'])
+
+    @override_settings(
+        GRAPHQL_TRACING={'SAMPLE_RATE': 1.0, 'EXTENSIONS': True},
+        GRAPHQL_RESPONSE_CACHE={'ENABLED': False},
+    )
+    def test_sampled_operations_are_traced_and_aggregated(self) -> None:
+        tracing: Dict[str, Any] = self.post()['extensions']['tracing']
+        self.assertEqual(tracing['sql']['count'], 2)
+        self.assertEqual(
+            [
+                resolver['path']
+                for resolver in tracing['execution']['resolvers']
+                if resolver['fieldName'] in ('tracks', 'likes')
+            ],
+            [['tracks'], ['tracks', 'edges', 0, 'node', 'likes']],
+        )
+        metrics: str = self.client.get('/metrics/').content.decode()
+        self.assertIn(
+            'graphql_operation_sql_queries_bucket'
+            '{operation="Tracks",le="2"}',
+            metrics,
+        )
+        self.assertIn(
+            'graphql_resolver_duration_seconds_count{field="Query.tracks"}',
+            metrics,
+        )
+
+    def test_operation_names_are_bounded(self) -> None:
+        metrics: Metrics = Metrics()
+        self.assertEqual(
+            [
+                metrics.operation(name, 2)
+                for name in ('A', 'B', 'C', 'A', 'D', 'B')
+            ],
+            ['A', 'B', 'other', 'A', 'other', 'B'],
+        )
+
+
+# A single process: a LocMemCache is as good as a shared user cache
+@override_settings(
+    GRAPHQL_RESPONSE_CACHE={'ENABLED': False},
+    GRAPHQL_JWT_CACHE={'CACHE': 'default'},
+)
+class JSONWebTokenCacheTest(TestCase):
+    def setUp(self) -> None:
+        caches['default'].clear()
+        get_token_cache.cache_clear()
+        self.user: User = get_user_model().objects.create(username='user')
+        self.headers: Dict[str, str] = {
+            'HTTP_AUTHORIZATION': f'JWT {get_token(self.user)}'
+        }
+
+    def me(self) -> Dict[str, Any]:
+        return self.client.post(
+            '/graphql/',
+            json.dumps(
+                {'query': 'query { me { firstName } other: me { id } }'}
+            ),
+            content_type='application/json',
+            **self.headers,
+        ).json()
+
+    def test_tokens_are_verified_once(self) -> None:
+        with self.assertNumQueries(1):
+            self.me()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me()['data']['me'], {'firstName': ''})
+
+    def test_users_are_loaded_without_a_user_cache(self) -> None:
+        with override_settings(GRAPHQL_JWT_CACHE={}):
+            self.me()
+            with self.assertNumQueries(1):
+                self.assertEqual(self.me()['data']['me'], {'firstName': ''})
+            check_user_cache()
+        with self.assertRaises(ImproperlyConfigured):
+            check_user_cache()
+
+    def test_saved_users_are_reloaded(self) -> None:
+        self.me()
+        self.user.first_name = 'first'
+        self.user.save()
+        self.assertEqual(self.me()['data']['me'], {'firstName': 'first'})
+
+    def test_deleted_and_disabled_users_are_rejected(self) -> None:
+        self.me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me()['errors'][0]['message'], 'User is disabled')
+        self.user.delete()
+        self.assertEqual(
+            self.me()['errors'][0]['message'], 'Anonymous user not allowed'
+        )
+
+
+class SQLitePragmaTest(TestCase):
+    def busy_timeout(self) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self) -> None:
+        default: int = self.busy_timeout()
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': default + 1}):
+            configure_connection(type(connection), connection)
+        self.assertEqual(self.busy_timeout(), default + 1)
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': default}):
+            configure_connection(type(connection), connection)
+
+
+class ReplicaRouterTest(TestCase):
+    def test_replicas_are_round_robin_and_health_checked(self) -> None:
+        pool: ReplicaPool = ReplicaPool(
+            ['a', 'b', 'c'], check_interval=60, retry_after=60
+        )
+
+        def check(replica: str) -> None:
+            if replica == 'b':
+                raise DatabaseError('unreachable')
+
+        with mock.patch.object(pool, 'check', side_effect=check) as probe:
+            self.assertEqual(
+                [pool.choose() for _ in range(4)], ['a', 'c', 'a', 'c']
+            )
+        self.assertEqual(
+            [call.args[0] for call in probe.call_args_list], ['a', 'b', 'c']
+        )
+
+    def test_requests_read_from_the_primary_once_they_write(self) -> None:
+        user: User = get_user_model().objects.create(username='user')
+        track: Track = Track.objects.create(
+            title='title', url='', posted_by=user
+        )
+        reads: List[Optional[str]] = []
+        db_for_read: Any = ReplicaRouter.db_for_read
+
+        def record(router: ReplicaRouter, model: type, **hints: Any) -> Any:
+            alias: Optional[str] = db_for_read(router, model, **hints)
+            if model is Track:
+                reads.append(alias)
+            return alias
+
+        query: Dict[str, Any] = {
+            'query': 'query($id: Int!) { track(trackId: $id) { likeCount } }',
+            'variables': {'id': track.pk},
+        }
+        mutation: Dict[str, Any] = {
+            'query': 'mutation($id: Int!) '
+            '{ createLike(trackId: $id) { track { id } } }',
+            'variables': {'id': track.pk},
+        }
+        # The primary stands in for the replica: reads routed to it are
+        # recorded as 'default', reads left to the primary as None
+        with mock.patch(
+            'app.db.get_replica_pool', return_value=ReplicaPool(['default'])
+        ), mock.patch.object(ReplicaRouter, 'db_for_read', record):
+            response: HttpResponse = self.client.post(
+                '/graphql/',
+                json.dumps([query, mutation, query]),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'JWT {get_token(user)}',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[2]['data']['track']['likeCount'], 1)
+        self.assertEqual(reads[0], 'default')
+        self.assertEqual(set(reads[1:]), {None})
+
+
+class BatchRequestTest(TestCase):
+    LIKE: str = (
+        'mutation($trackId: Int!) { createLike(trackId: $trackId) '
+        '{ track { likeCount postedBy { username } } } }'
+    )
+
+    def setUp(self) -> None:
+        caches['graphql'].clear()
+        self.user: User = get_user_model().objects.create(username='user')
+        self.tracks: List[Track] = [
+            Track.objects.create(title=title, url='', posted_by=self.user)
+            for title in ('first', 'second')
+        ]
+
+    def post(self, operations: List[Dict[str, Any]]) -> HttpResponse:
+        return self.client.post(
+            '/graphql/',
+            json.dumps(operations),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}',
+        )
+
+    def test_operations_are_executed_in_order(self) -> None:
+        response: HttpResponse = self.post(
+            [
+                {
+                    'id': 'like',
+                    'query': self.LIKE,
+                    'variables': {'trackId': self.tracks[0].pk},
+                },
+                {
+                    'id': 'count',
+                    'query': 'query($trackId: Int!) '
+                    '{ track(trackId: $trackId) { likeCount } }',
+                    'variables': {'trackId': self.tracks[0].pk},
+                },
+                {'id': 'invalid', 'query': '{ nope }'},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        results: List[Dict[str, Any]] = response.json()
+        self.assertEqual(
+            [(result['id'], result['status']) for result in results],
+            [('like', 200), ('count', 200), ('invalid', 400)],
+        )
+        self.assertEqual(
+            results[0]['data']['createLike']['track']['likeCount'], 1
+        )
+        self.assertEqual(results[1]['data'], {'track': {'likeCount': 1}})
+
+    def test_mutations_clear_the_shared_loaders(self) -> None:
+        operations: List[Dict[str, Any]] = [
+            {'query': self.LIKE, 'variables': {'trackId': track.pk}}
+            for track in self.tracks
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response: HttpResponse = self.post(operations)
+        self.assertEqual(response.status_code, 200)
+        # postedBy is loaded by the user DataLoader of each mutation
+        self.assertEqual(
+            sum(
+                '"auth_user"."id" IN' in query['sql']
+                for query in queries.captured_queries
+            ),
+            2,
+        )
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={'MAX_BATCH_SIZE': 2})
+    def test_batch_size_is_limited(self) -> None:
+        response: HttpResponse = self.post([{'query': QUERY}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['errors'][0]['message'],
+            'Batches are limited to 2 operations, got 3',
+        )
+
+
+class StartupTest(TestCase):
+    def post(self, query: str) -> Dict[str, Any]:
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query}),
+            content_type='application/json',
+        ).json()
+
+    def get_document(self, query: str) -> GraphQLDocument:
+        return get_document_backend().document_from_string(
+            graphene_settings.SCHEMA, query
+        )
+
+    def test_introspection_is_executed_once(self) -> None:
+        data: Dict[str, Any] = self.post(introspection_query)['data']
+        document: GraphQLDocument = self.get_document(introspection_query)
+        self.assertEqual(get_memo(document).introspection_results[''], data)
+        with mock.patch.object(document, 'execute') as execute:
+            self.assertEqual(self.post(introspection_query)['data'], data)
+        execute.assert_not_called()
+
+    def test_only_introspection_fields_are_memoized(self) -> None:
+        for query, expected in (
+            ('{ __typename }', True),
+            ('{ __type(name: "TrackType") { name } }', True),
+            ('{ __typename tracks { edges { node { id } } } }', False),
+            ('query A { __typename } query B { me { id } }', False),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    is_introspection(self.get_document(query), None), expected
+                )
+        self.assertTrue(
+            is_introspection(
+                self.get_document(
+                    'query A { __typename } query B { me { id } }'
+                ),
+                'A',
+            )
+        )
+
+    def test_warm_up(self) -> None:
+        warm_up()
+        self.assertLessEqual(PHASES['urls'], PHASES['warm_up'])
+        self.assertLessEqual(PHASES['schema'], PHASES['warm_up'])
+        self.assertIn(
+            '',
+            get_memo(
+                self.get_document(introspection_query)
+            ).introspection_results,
+        )
+        self.assertIn(
+            'graphql_startup_seconds_count{phase="warm_up"} 1',
+            self.client.get('/metrics/').content.decode(),
+        )
+
+
+class AsyncGraphQLViewTest(TransactionTestCase):
+    def setUp(self) -> None:
+        caches['graphql'].clear()
+        self.view = AsyncGraphQLView.as_async_view()
+        self.factory: RequestFactory = RequestFactory()
+
+    async def post(self, query: str, **headers: str) -> HttpResponse:
+        return await self.view(
+            self.factory.post(
+                '/graphql/',
+                json.dumps({'query': query}),
+                content_type='application/json',
+                **headers,
+            )
+        )
+
+    def test_concurrent_requests_are_executed(self) -> None:
+        user: User = get_user_model().objects.create(username='user')
+        Track.objects.create(title='title', url='', posted_by=user)
+
+        async def run() -> List[HttpResponse]:
+            return await asyncio.gather(
+                *(
+                    self.post(
+                        'query { tracks { edges { node '
+                        '{ title postedBy { username } } } } }'
+                    )
+                    for _ in range(4)
+                )
+            )
+
+        for response in async_to_sync(run)():
+            self.assertEqual(
+                json.loads(response.content)['data']['tracks']['edges'],
+                [
+                    {
+                        'node': {
+                            'title': 'title',
+                            'postedBy': {'username': 'user'},
+                        }
+                    }
+                ],
+            )
+
+    def test_identical_queries_are_executed_once(self) -> None:
+        async def run(query: str, **headers: str) -> List[HttpResponse]:
+            return await asyncio.gather(
+                *(self.post(query, **headers) for _ in range(4))
+            )
+
+        with mock.patch.object(
+            AsyncGraphQLView,
+            'execute_operation',
+            autospec=True,
+            side_effect=GraphQLView.execute_operation,
+        ) as execute:
+            responses: List[HttpResponse] = async_to_sync(run)(QUERY)
+            self.assertEqual(execute.call_count, 1)
+            self.assertEqual(
+                len({response.content for response in responses}), 1
+            )
+            self.assertEqual(
+                json.loads(responses[0].content)['data'],
+                {'tracks': {'edges': []}},
+            )
+            user: User = get_user_model().objects.create(username='user')
+            track: Track = Track.objects.create(
+                title='title', url='', posted_by=user
+            )
+            # SQLite locks its tables: the mutations write one at a time
+            with ThreadPoolExecutor(1) as executor, mock.patch(
+                'app.views.get_executor', return_value=executor
+            ):
+                responses = async_to_sync(run)(
+                    'mutation { createLike(trackId: %d) '
+                    '{ track { likeCount } } }' % track.pk,
+                    HTTP_AUTHORIZATION=f'JWT {get_token(user)}',
+                )
+            self.assertEqual(execute.call_count, 5)
+            for response in responses:
+                result: Dict[str, Any] = json.loads(response.content)
+                self.assertNotIn('errors', result)
+                self.assertEqual(
+                    result['data'],
+                    {'createLike': {'track': {'likeCount': 1}}},
+                )
+            self.assertEqual(track.likes.count(), 1)
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self) -> None:
+        self.flights: SingleFlight = SingleFlight(timeout=5)
+        self.calls: int = 0
+        self.release: Event = Event()
+
+    def call(self) -> int:
+        self.calls += 1
+        self.release.wait(5)
+        return self.calls
+
+    def lead(self) -> Thread:
+        leader: Thread = Thread(
+            target=self.flights.run, args=('key', self.call)
+        )
+        leader.start()
+        while 'key' not in self.flights.flights:
+            time.sleep(0.001)
+        return leader
+
+    def test_threads_share_one_call(self) -> None:
+        leader: Thread = self.lead()
+        results: List[Tuple[int, bool]] = []
+        followers: List[Thread] = [
+            Thread(
+                target=lambda: results.append(
+                    self.flights.run('key', self.call)
+                )
+            )
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        time.sleep(0.05)
+        self.release.set()
+        for thread in (leader, *followers):
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [(1, True)] * 3)
+
+    def test_followers_fall_back_after_the_timeout(self) -> None:
+        self.flights.timeout = 0.01
+        leader: Thread = self.lead()
+        Timer(0.05, self.release.set).start()
+        self.assertEqual(self.flights.run('key', self.call)[1], False)
+        leader.join()
+        self.assertEqual(self.calls, 2)
+
+    def test_coroutines_share_shareable_results(self) -> None:
+        async def call(shareable: bool) -> Tuple[int, bool]:
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return self.calls, shareable
+
+        async def run(shareable: bool) -> List[Tuple[int, bool]]:
+            return await asyncio.gather(
+                *(
+                    self.flights.run_async('key', partial(call, shareable))
+                    for _ in range(3)
+                )
+            )
+
+        self.assertEqual(
+            async_to_sync(run)(True), [(1, False), (1, True), (1, True)]
+        )
+        self.calls = 0
+        self.assertEqual(
+            [shared for _, shared in async_to_sync(run)(False)], [False] * 3
+        )
+        self.assertEqual(self.calls, 3)
+
+
+class WebSocketClient:
+    '''An in-memory websocket to app.subscriptions'''
+
+    def __init__(self) -> None:
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task: asyncio.Future = asyncio.ensure_future(
+            websocket_application(
+                {
+                    'type': 'websocket',
+                    'path': '/graphql/',
+                    'subprotocols': ['graphql-ws'],
+                },
+                self.inbox.get,
+                self.outbox.put,
+            )
+        )
+
+    async def connect(self, **payload: Any) -> Dict[str, Any]:
+        await self.inbox.put({'type': 'websocket.connect'})
+        assert (await self.outbox.get())['type'] == 'websocket.accept'
+        await self.send({'type': 'connection_init', 'payload': payload})
+        return await self.receive()
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        await self.inbox.put(
+            {'type': 'websocket.receive', 'text': json.dumps(message)}
+        )
+
+    async def receive(self) -> Dict[str, Any]:
+        while True:
+            message: Dict[str, Any] = await asyncio.wait_for(
+                self.outbox.get(), 5
+            )
+            if 'text' not in message:
+                return message
+            content: Dict[str, Any] = json.loads(message['text'])
+            if content['type'] != 'ka':
+                return content
+
+    async def subscribe(self, id: str, query: str, **variables: Any) -> None:
+        await self.send(
+            {
+                'type': 'start',
+                'id': id,
+                'payload': {'query': query, 'variables': variables},
+            }
+        )
+        # Messages are handled in order: once this stop is complete, the
+        # subscription has started or failed.
+        await self.send({'type': 'stop', 'id': 'sync'})
+        message: Dict[str, Any] = await self.receive()
+        if message != {'type': 'complete', 'id': 'sync'}:
+            raise AssertionError(message)
+
+    async def close(self) -> None:
+        await self.inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+        await self.task
+
+
+class SubscriptionTest(TransactionTestCase):
+    def setUp(self) -> None:
+        caches['graphql'].clear()
+        caches['default'].clear()
+        get_token_cache.cache_clear()
+        self.user: User = get_user_model().objects.create(username='user')
+
+    def mutate(self, query: str) -> None:
+        response: HttpResponse = self.client.post(
+            '/graphql/',
+            json.dumps({'query': query}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}',
+        )
+        self.assertNotIn('errors', response.json())
+
+    def test_events_are_pushed_to_subscribers(self) -> None:
+        track: Track = Track.objects.create(
+            title='liked', url='', posted_by=self.user
+        )
+        created: str = (
+            'subscription { trackCreated { title postedBy { username } } }'
+        )
+
+        async def run() -> None:
+            first: WebSocketClient = WebSocketClient()
+            second: WebSocketClient = WebSocketClient()
+            self.assertEqual(await first.connect(), {'type': 'connection_ack'})
+            self.assertEqual(
+                await second.connect(
+                    Authorization=f'JWT {get_token(self.user)}'
+                ),
+                {'type': 'connection_ack'},
+            )
+            await first.subscribe('1', created)
+            await second.subscribe('1', created)
+            await second.subscribe(
+                '2',
+                'subscription($trackId: Int!) { trackLiked(trackId: $trackId) '
+                '{ likeCount } }',
+                trackId=track.pk,
+            )
+            await sync_to_async(self.mutate)(
+                'mutation { createTrack(title: "new", description: "", '
+                'url: "http://example.com") { track { id } } }'
+            )
+            data: Dict[str, Any] = {
+                'type': 'data',
+                'id': '1',
+                'payload': {
+                    'data': {
+                        'trackCreated': {
+                            'title': 'new',
+                            'postedBy': {'username': 'user'},
+                        }
+                    }
+                },
+            }
+            self.assertEqual(await first.receive(), data)
+            self.assertEqual(await second.receive(), data)
+            await sync_to_async(self.mutate)(
+                f'mutation {{ createLike(trackId: {track.pk}) '
+                '{ track { id } } }'
+            )
+            self.assertEqual(
+                await second.receive(),
+                {
+                    'type': 'data',
+                    'id': '2',
+                    'payload': {'data': {'trackLiked': {'likeCount': 1}}},
+                },
+            )
+            await first.close()
+            await second.close()
+
+        with mock.patch.object(
+            Operation, 'execute', autospec=True, side_effect=Operation.execute
+        ) as execute:
+            async_to_sync(run)()
+        # The anonymous and the authenticated trackCreated, and trackLiked
+        self.assertEqual(execute.call_count, 3)
+        self.assertEqual(get_pubsub().listeners, {})
+
+    def test_invalid_operations_are_rejected(self) -> None:
+        async def run() -> None:
+            client: WebSocketClient = WebSocketClient()
+            await client.connect()
+            await client.send(
+                {'type': 'start', 'id': '1', 'payload': {'query': QUERY}}
+            )
+            self.assertEqual(
+                (await client.receive())['payload']['message'],
+                'Only subscriptions are served over websockets.',
+            )
+            await client.send(
+                {
+                    'type': 'start',
+                    'id': '2',
+                    'payload': {
+                        'query': 'subscription { trackCreated { id } '
+                        'trackLiked(trackId: 1) { id } }'
+                    },
+                }
+            )
+            self.assertEqual(
+                (await client.receive())['payload']['message'],
+                'Subscriptions must select exactly one field.',
+            )
+            await client.close()
+
+            client = WebSocketClient()
+            message: Dict[str, Any] = await client.connect(
+                Authorization='JWT invalid'
+            )
+            self.assertEqual(message['type'], 'connection_error')
+            self.assertEqual(
+                await client.receive(), {'type': 'websocket.close'}
+            )
+            await client.task
+
+        async_to_sync(run)()
@@ -0,0 +1,269 @@
+from __future__ import annotations
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from threading import Lock
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+import random
+import time
+from django.conf import settings
+from django.db import connections
+from graphql.execution.base import ResolveInfo
+from promise import Promise, is_thenable
+
+SECONDS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+QUERIES: Tuple[float, ...] = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+MAX_OPERATIONS: int = 100
+OTHER: str = 'other'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_TRACING', {})
+
+
+class Histogram:
+    '''Cumulative bucket counts of the observed values, Prometheus-style'''
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: Labels) -> Iterator[str]:
+        cumulative: int = 0
+        bound: Any
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield (
+                f'{name}_bucket{format_labels(labels + (("le", str(bound)),))}'
+                f' {cumulative}'
+            )
+        yield f'{name}_sum{format_labels(labels)} {self.sum}'
+        yield f'{name}_count{format_labels(labels)} {self.count}'
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels
+    )
+
+
+class Metrics:
+    '''The histograms of a process, rendered for the /metrics/ endpoint'''
+
+    def __init__(self) -> None:
+        self.lock: Lock = Lock()
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.operations: Set[str] = set()
+
+    def operation(self, name: str, limit: int) -> str:
+        '''The label of the operation `name`
+
+        Clients choose operation names: past `limit` distinct ones, the new
+        names are labelled OTHER, for the series not to grow without bound.
+        '''
+        with self.lock:
+            if name in self.operations:
+                return name
+            if len(self.operations) >= limit:
+                return OTHER
+            self.operations.add(name)
+            return name
+
+    def observe(
+        self,
+        name: str,
+        labels: Labels,
+        value: float,
+        buckets: Tuple[float, ...] = SECONDS,
+    ) -> None:
+        with self.lock:
+            series: Dict[Labels, Histogram] = self.histograms.setdefault(
+                name, {}
+            )
+            if labels not in series:
+                series[labels] = Histogram(buckets)
+            series[labels].observe(value)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self.lock:
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in sorted(series.items()):
+                    lines.extend(histogram.render(name, labels))
+        return '\n'.join(lines) + '\n'
+
+
+@lru_cache(maxsize=None)
+def get_metrics() -> Metrics:
+    return Metrics()
+
+
+class Trace:
+    '''Timings of the resolvers and SQL queries of one operation'''
+
+    def __init__(self) -> None:
+        self.start_time: datetime = datetime.now(timezone.utc)
+        self.start: int = time.perf_counter_ns()
+        self.duration: int = 0
+        self.operation_name: Optional[str] = None
+        self.resolvers: List[Dict[str, Any]] = []
+        self.sql_count: int = 0
+        self.sql_duration: int = 0
+
+    def execute_wrapper(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,
+        context: Dict[str, Any],
+    ) -> Any:
+        start: int = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_duration += time.perf_counter_ns() - start
+
+    @contextmanager
+    def capture_sql(self) -> Iterator[None]:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(self.execute_wrapper)
+                )
+            yield
+
+    def record(self, info: ResolveInfo, start: int) -> None:
+        end: int = time.perf_counter_ns()
+        if self.operation_name is None and info.operation.name is not None:
+            self.operation_name = info.operation.name.value
+        self.resolvers.append(
+            {
+                'path': list(info.path or ()),
+                'parentType': str(info.parent_type),
+                'fieldName': info.field_name,
+                'returnType': str(info.return_type),
+                'startOffset': start - self.start,
+                'duration': end - start,
+            }
+        )
+
+    def finish(self, operation_name: Optional[str]) -> None:
+        '''Stop the clock and aggregate the trace into the metrics'''
+        self.duration = time.perf_counter_ns() - self.start
+        metrics: Metrics = get_metrics()
+        operation: Labels = (
+            (
+                'operation',
+                metrics.operation(
+                    operation_name or self.operation_name or '',
+                    get_config().get('MAX_OPERATIONS', MAX_OPERATIONS),
+                ),
+            ),
+        )
+        metrics.observe(
+            'graphql_operation_duration_seconds',
+            operation,
+            self.duration / 1e9,
+        )
+        metrics.observe(
+            'graphql_operation_sql_queries', operation, self.sql_count, QUERIES
+        )
+        metrics.observe(
+            'graphql_operation_sql_duration_seconds',
+            operation,
+            self.sql_duration / 1e9,
+        )
+        for resolver in self.resolvers:
+            metrics.observe(
+                'graphql_resolver_duration_seconds',
+                (
+                    (
+                        'field',
+                        f'{resolver["parentType"]}.{resolver["fieldName"]}',
+                    ),
+                ),
+                resolver['duration'] / 1e9,
+            )
+
+    def to_extension(self) -> Dict[str, Any]:
+        '''The trace in the Apollo tracing format, plus the SQL totals'''
+        return {
+            'version': 1,
+            'startTime': self.start_time.isoformat(),
+            'endTime': (
+                self.start_time + timedelta(microseconds=self.duration / 1000)
+            ).isoformat(),
+            'duration': self.duration,
+            'execution': {'resolvers': self.resolvers},
+            'sql': {'count': self.sql_count, 'duration': self.sql_duration},
+        }
+
+
+def start_trace() -> Optional[Trace]:
+    '''A new trace if this operation is sampled, else None'''
+    rate: float = get_config().get('SAMPLE_RATE', 0.0)
+    if rate <= 0.0 or random.random() >= rate:
+        return None
+    return Trace()
+
+
+class TracingMiddleware:
+    '''Times every resolver of the operation into a Trace
+
+    The view only adds it to the middleware of sampled operations.
+    '''
+
+    def __init__(self, trace: Trace) -> None:
+        self.trace: Trace = trace
+
+    def resolve(
+        self, next: Callable[..., Any], root: Any, info: ResolveInfo, **args
+    ) -> Any:
+        start: int = time.perf_counter_ns()
+        result: Any = next(root, info, **args)
+        if is_thenable(result):
+
+            def done(value: Any) -> Any:
+                self.trace.record(info, start)
+                return value
+
+            return Promise.resolve(result).then(done)
+        self.trace.record(info, start)
+        return result
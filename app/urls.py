@@ -13,12 +13,35 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
-from django.urls import path
+from django.conf import settings
+from django.urls import include, path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+from app.startup import get_config as get_startup_config, mark
+from app.tracing import get_config as get_tracing_config
+from app.views import (
+    AsyncGraphQLView,
+    GraphQLView,
+    get_async_config,
+    metrics,
+)
+
+graphiql = get_startup_config().get('GRAPHIQL', False)
+if get_async_config().get('ENABLED', False):
+    graphql_view = AsyncGraphQLView.as_async_view(graphiql=graphiql)
+else:
+    graphql_view = csrf_exempt(GraphQLView.as_view(graphiql=graphiql))
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', graphql_view),
+    path('export/', include('tracks.urls')),
 ]
+
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+
+if get_tracing_config().get('METRICS', False):
+    urlpatterns.append(path('metrics/', metrics))
+
+mark('urls')
@@ -0,0 +1,407 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest
+from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError
+from graphql import GraphQLError
+from graphql.backend.base import GraphQLDocument
+from graphql.execution import ExecutionResult
+from graphql_jwt.exceptions import JSONWebTokenError
+from app.auth import authenticate_request
+from app.cost import (
+    QueryCost,
+    QueryTooComplexError,
+    check_limits,
+    get_config as get_limits_config,
+)
+from app.db import has_written, replica_reads, request_routing
+from app.persisted import (
+    CachedDocumentBackend,
+    get_document_backend,
+    get_persisted_queries,
+)
+from app.response_cache import (
+    ResponseCache,
+    get_introspection,
+    get_response_cache,
+    get_viewer,
+    is_introspection,
+)
+from app.single_flight import (
+    get_config as get_single_flight_config,
+    get_single_flight,
+    operation_key,
+    request_key,
+)
+from app.tracing import (
+    Trace,
+    TracingMiddleware,
+    get_config as get_tracing_config,
+    get_metrics,
+    start_trace,
+)
+
+
+def get_extensions(
+    request: HttpRequest, data: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    extensions: Any = request.GET.get('extensions') or data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise GraphQLError('Extensions are invalid JSON.')
+    return extensions if isinstance(extensions, dict) else None
+
+
+class GraphQLView(BaseGraphQLView):
+    '''The /graphql/ endpoint
+
+    The JWT of the request is authenticated once, before execution.
+    Documents are parsed and validated once per distinct query text, and
+    clients can send Apollo persisted query hashes instead of the query
+    (see the GRAPHQL_PERSISTED_QUERIES setting). The data of successful
+    Query operations is cached (see GRAPHQL_RESPONSE_CACHE), and that of
+    introspection operations kept in memory. Operations over the
+    GRAPHQL_QUERY_LIMITS are rejected before execution, and the cost of
+    the others is returned in the response extensions. A sample of the
+    operations is traced (see GRAPHQL_TRACING).
+
+    A JSON array of operations is executed as a batch, in order, sharing
+    the request: the user is authenticated once and the DataLoaders are
+    reused, until a mutation clears them.
+
+    Query operations read from a replica, unless the request already
+    wrote (see DATABASE_REPLICAS). Identical Query operations in flight
+    are executed once (see GRAPHQL_SINGLE_FLIGHT).
+    '''
+
+    def dispatch(
+        self, request: HttpRequest, *args: Any, **kwargs: Any
+    ) -> HttpResponse:
+        with request_routing():
+            # Whether the response may be shared with identical requests
+            request.graphql_shareable = True
+            response: HttpResponse = super().dispatch(request, *args, **kwargs)
+            if has_written():
+                request.graphql_shareable = False
+            return response
+
+    def get_backend(self, request: HttpRequest) -> CachedDocumentBackend:
+        return get_document_backend()
+
+    def execute_graphql_request(
+        self,
+        request: HttpRequest,
+        data: Dict[str, Any],
+        query: Optional[str],
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        show_graphiql: bool = False,
+    ) -> Optional[ExecutionResult]:
+        trace: Optional[Trace] = start_trace()
+        if trace is None:
+            return self.execute_operation(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        request.graphql_trace = trace
+        try:
+            with trace.capture_sql():
+                result: Optional[ExecutionResult] = self.execute_operation(
+                    request,
+                    data,
+                    query,
+                    variables,
+                    operation_name,
+                    show_graphiql,
+                )
+        finally:
+            del request.graphql_trace
+        trace.finish(operation_name)
+        if result is not None and get_tracing_config().get('EXTENSIONS'):
+            result.extensions['tracing'] = trace.to_extension()
+        return result
+
+    def execute_operation(
+        self,
+        request: HttpRequest,
+        data: Dict[str, Any],
+        query: Optional[str],
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        show_graphiql: bool = False,
+    ) -> Optional[ExecutionResult]:
+        try:
+            authenticate_request(request)
+        except JSONWebTokenError as error:
+            return ExecutionResult(errors=[error])
+        if query or not show_graphiql:
+            try:
+                query = get_persisted_queries().get_query(
+                    query, get_extensions(request, data)
+                )
+            except GraphQLError as error:
+                return ExecutionResult(errors=[error], invalid=True)
+        document: Optional[GraphQLDocument] = self.get_document(request, query)
+        cost: Optional[QueryCost] = None
+        if (
+            document is None
+            or document.get_operation_type(operation_name) != 'query'
+        ):
+            request.graphql_shareable = False
+        if document is not None:
+            try:
+                cost = check_limits(document, variables, operation_name)
+            except QueryTooComplexError as error:
+                return ExecutionResult(errors=[error], invalid=True)
+        with replica_reads(
+            document is not None
+            and document.get_operation_type(operation_name) == 'query'
+        ):
+            result: Optional[ExecutionResult] = self.execute_cached(
+                request,
+                data,
+                document,
+                query,
+                variables,
+                operation_name,
+                show_graphiql,
+            )
+        if result is not None and cost is not None:
+            result.extensions['cost'] = cost._asdict()
+        if (
+            self.batch
+            and document is not None
+            and document.get_operation_type(operation_name) == 'mutation'
+        ):
+            loaders: Any = getattr(request, 'loaders', None)
+            if loaders is not None:
+                loaders.clear()
+        return result
+
+    def execute_cached(
+        self,
+        request: HttpRequest,
+        data: Dict[str, Any],
+        document: Optional[GraphQLDocument],
+        query: Optional[str],
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        show_graphiql: bool = False,
+    ) -> Optional[ExecutionResult]:
+        if (
+            document is not None
+            and not variables
+            and is_introspection(document, operation_name)
+        ):
+            return get_introspection(document, operation_name)
+        execute: Callable[[], Optional[ExecutionResult]] = partial(
+            super().execute_graphql_request,
+            request,
+            data,
+            query,
+            variables,
+            operation_name,
+            show_graphiql,
+        )
+        if (
+            document is None
+            or document.get_operation_type(operation_name) != 'query'
+        ):
+            return execute()
+        response_cache: Optional[ResponseCache] = get_response_cache()
+        if response_cache is None:
+            return self.execute_shared(
+                operation_key(document, variables, operation_name, request),
+                execute,
+            )
+        key: str = response_cache.get_key(
+            document, variables, operation_name, get_viewer(request)
+        )
+        cached: Optional[Dict[str, Any]] = response_cache.get(key)
+        if cached is not None:
+            return ExecutionResult(data=cached)
+        result: Optional[ExecutionResult] = self.execute_shared(key, execute)
+        if (
+            result is not None
+            and not result.errors
+            and not result.invalid
+            and result.data is not None
+        ):
+            response_cache.set(key, result.data)
+        return result
+
+    def execute_shared(
+        self, key: str, execute: Callable[[], Optional[ExecutionResult]]
+    ) -> Optional[ExecutionResult]:
+        '''Execute a Query operation, or wait for an identical one'''
+        if has_written() or not get_single_flight_config().get('ENABLED'):
+            return execute()
+        result: Optional[ExecutionResult]
+        shared: bool
+        result, shared = get_single_flight().run(key, execute)
+        if shared and result is not None:
+            # The extensions of each response are its own
+            return ExecutionResult(
+                data=result.data, errors=result.errors, invalid=result.invalid
+            )
+        return result
+
+    def parse_body(self, request: HttpRequest) -> Any:
+        if self.get_content_type(request) == 'application/json':
+            self.batch = request.body.lstrip().startswith(b'[')
+        if not self.batch:
+            return super().parse_body(request)
+        data: List[Any] = super().parse_body(request)
+        if not all(isinstance(entry, dict) for entry in data):
+            raise HttpError(
+                HttpResponseBadRequest('Batch entries must be JSON objects.')
+            )
+        max_size: Optional[int] = get_limits_config().get('MAX_BATCH_SIZE')
+        if max_size is not None and len(data) > max_size:
+            raise HttpError(
+                HttpResponseBadRequest(
+                    f'Batches are limited to {max_size} operations, '
+                    f'got {len(data)}'
+                )
+            )
+        return data
+
+    def get_middleware(self, request: HttpRequest) -> List[Any]:
+        trace: Optional[Trace] = getattr(request, 'graphql_trace', None)
+        if trace is None:
+            return self.middleware
+        return [*(self.middleware or []), TracingMiddleware(trace)]
+
+    def get_response(
+        self,
+        request: HttpRequest,
+        data: Dict[str, Any],
+        show_graphiql: bool = False,
+    ) -> Tuple[Optional[str], int]:
+        '''Same as the base view, plus the result extensions'''
+        query, variables, operation_name, id = self.get_graphql_params(
+            request, data
+        )
+        execution_result: Optional[
+            ExecutionResult
+        ] = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if not execution_result:
+            return None, 200
+        status_code: int = 200
+        response: Dict[str, Any] = {}
+        if execution_result.errors:
+            response['errors'] = [
+                self.format_error(error) for error in execution_result.errors
+            ]
+        if execution_result.invalid:
+            status_code = 400
+        else:
+            response['data'] = execution_result.data
+        if execution_result.extensions:
+            response['extensions'] = execution_result.extensions
+        if self.batch:
+            response['id'] = id
+            response['status'] = status_code
+        return (
+            self.json_encode(request, response, pretty=show_graphiql),
+            status_code,
+        )
+
+    def get_document(
+        self, request: HttpRequest, query: Optional[str]
+    ) -> Optional[GraphQLDocument]:
+        '''The parsed document, or None to let execution report the error'''
+        if not query:
+            return None
+        try:
+            return self.get_backend(request).document_from_string(
+                self.schema, query
+            )
+        except Exception:
+            return None
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    '''The /metrics/ endpoint, in the Prometheus text format'''
+    return HttpResponse(
+        get_metrics().render(), content_type='text/plain; version=0.0.4'
+    )
+
+
+def get_async_config() -> Dict[str, Any]:
+    return getattr(settings, 'GRAPHQL_ASYNC', {})
+
+
+@lru_cache(maxsize=None)
+def get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        get_async_config().get('WORKERS', 8), thread_name_prefix='graphql'
+    )
+
+
+class AsyncGraphQLView(GraphQLView):
+    '''The /graphql/ endpoint when served over ASGI
+
+    The ORM of Django 3.1 is synchronous, so requests are executed on a
+    bounded pool of GRAPHQL_ASYNC['WORKERS'] threads, each keeping its
+    own database connection. A request waiting for a worker only holds a
+    coroutine on the event loop. Without this, Django runs sync views
+    under ASGI one at a time on a single shared thread.
+    '''
+
+    @classmethod
+    def as_async_view(
+        cls, **initkwargs: Any
+    ) -> Callable[..., Awaitable[HttpResponse]]:
+        async def view(
+            request: HttpRequest, *args: Any, **kwargs: Any
+        ) -> HttpResponse:
+            self: AsyncGraphQLView = cls(**initkwargs)
+            self.setup(request, *args, **kwargs)
+
+            async def execute() -> Tuple[HttpResponse, bool]:
+                response: HttpResponse = (
+                    await asyncio.get_running_loop().run_in_executor(
+                        get_executor(),
+                        partial(self.run, request, *args, **kwargs),
+                    )
+                )
+                return response, getattr(request, 'graphql_shareable', False)
+
+            if not get_single_flight_config().get('ENABLED'):
+                return (await execute())[0]
+            response: HttpResponse
+            shared: bool
+            response, shared = await get_single_flight().run_async(
+                request_key(request), execute
+            )
+            if shared:
+                # Middleware may change the response of each request
+                copy: HttpResponse = HttpResponse(
+                    response.content, status=response.status_code
+                )
+                for header, value in response.items():
+                    copy[header] = value
+                return copy
+            return response
+
+        # csrf_exempt would wrap the coroutine function into a sync one
+        view.csrf_exempt = True  # type: ignore
+        view.view_class = cls  # type: ignore
+        view.view_initkwargs = initkwargs  # type: ignore
+        return view
+
+    def run(self, request: HttpRequest, *args: Any, **kwargs: Any) -> Any:
+        close_old_connections()
+        try:
+            return self.dispatch(request, *args, **kwargs)
+        finally:
+            close_old_connections()
@@ -0,0 +1,217 @@
+'''Compare the ASGI and WSGI /graphql/ endpoints under concurrent load
+
+    python -m benchmarks.asgi --clients 64 --requests 2000
+
+Each server runs in its own process against the same database, serving
+--clients clients that send requests back to back. The WSGI server uses
+a thread per concurrent request, like a threaded WSGI server; the ASGI
+server runs every request on one event loop and executes them on
+--workers threads (GRAPHQL_ASYNC['WORKERS']).
+'''
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.common import percentile, setup_django
+
+QUERY: str = (
+    'query { tracks(first: 20) { edges { node { title '
+    'postedBy { username } likes { user { username } } } } } }'
+)
+
+
+def seed(tracks: int) -> None:
+    from django.contrib.auth.models import User
+    from tracks.models import Like, Track
+
+    User.objects.bulk_create(
+        User(username=f'user{index}') for index in range(10)
+    )
+    users: List[User] = list(User.objects.all())
+    Track.objects.bulk_create(
+        Track(title=f'track {index}', url='', posted_by=users[index % 10])
+        for index in range(tracks)
+    )
+    Like.objects.bulk_create(
+        Like(user=user, track=track)
+        for track in Track.objects.all()[:100]
+        for user in users[:3]
+    )
+    Track.objects.refresh_like_counts()
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        'requests_per_s': len(samples) / elapsed,
+        'mean_ms': statistics.mean(samples),
+        'p50_ms': percentile(samples, 0.50),
+        'p99_ms': percentile(samples, 0.99),
+    }
+
+
+def run_wsgi(body: bytes, clients: int, requests: int) -> Dict[str, float]:
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler: WSGIHandler = WSGIHandler()
+    statuses: List[str] = []
+
+    def start_response(status: str, headers: Any) -> None:
+        statuses.append(status)
+
+    def call() -> float:
+        start: float = time.perf_counter()
+        b''.join(
+            handler(
+                {
+                    'REQUEST_METHOD': 'POST',
+                    'PATH_INFO': '/graphql/',
+                    'CONTENT_TYPE': 'application/json',
+                    'CONTENT_LENGTH': str(len(body)),
+                    'SERVER_NAME': 'localhost',
+                    'SERVER_PORT': '80',
+                    'wsgi.url_scheme': 'http',
+                    'wsgi.input': BytesIO(body),
+                },
+                start_response,
+            )
+        )
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(clients) as executor:
+        start: float = time.perf_counter()
+        samples: List[float] = list(
+            executor.map(lambda _: call(), range(requests))
+        )
+        elapsed: float = time.perf_counter() - start
+    assert set(statuses) == {'200 OK'}, set(statuses)
+    return summarize(samples, elapsed)
+
+
+def run_asgi(body: bytes, clients: int, requests: int) -> Dict[str, float]:
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler: ASGIHandler = ASGIHandler()
+    statuses: List[int] = []
+
+    async def call() -> float:
+        start: float = time.perf_counter()
+
+        async def receive() -> Dict[str, Any]:
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        await handler(
+            {
+                'type': 'http',
+                'method': 'POST',
+                'path': '/graphql/',
+                'query_string': b'',
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'host', b'localhost'),
+                ],
+                'server': ('localhost', 80),
+            },
+            receive,
+            send,
+        )
+        return (time.perf_counter() - start) * 1000
+
+    async def client(count: int, samples: List[float]) -> None:
+        for _ in range(count):
+            samples.append(await call())
+
+    async def main() -> List[float]:
+        samples: List[float] = []
+        await asyncio.gather(
+            *(client(requests // clients, samples) for _ in range(clients))
+        )
+        return samples
+
+    start: float = time.perf_counter()
+    samples: List[float] = asyncio.run(main())
+    elapsed: float = time.perf_counter() - start
+    assert set(statuses) == {200}, set(statuses)
+    return summarize(samples, elapsed)
+
+
+SERVERS: Dict[str, Callable[[bytes, int, int], Dict[str, float]]] = {
+    'wsgi': run_wsgi,
+    'asgi': run_asgi,
+}
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--database', type=Path)
+    parser.add_argument('--server', choices=sorted(SERVERS))
+    args = parser.parse_args()
+    database: Path = args.database or Path(tempfile.mkdtemp()) / 'bench.db'
+    if args.server is not None:
+        setup_django(database)
+        from django.conf import settings
+
+        # Measure execution, not the response cache
+        settings.GRAPHQL_RESPONSE_CACHE['ENABLED'] = False
+        body: bytes = json.dumps({'query': QUERY}).encode()
+        print(
+            json.dumps(
+                SERVERS[args.server](
+                    body,
+                    args.clients,
+                    args.requests // args.clients * args.clients,
+                )
+            )
+        )
+        return
+    setup_django(database)
+    seed(args.tracks)
+    results: Dict[str, Any] = {}
+    for server in sorted(SERVERS):
+        output: str = subprocess.run(
+            [
+                sys.executable,
+                '-m',
+                'benchmarks.asgi',
+                '--server',
+                server,
+                '--database',
+                str(database),
+                '--clients',
+                str(args.clients),
+                '--requests',
+                str(args.requests),
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            env={
+                **os.environ,
+                'GRAPHQL_ASYNC': '1' if server == 'asgi' else '0',
+                'GRAPHQL_ASYNC_WORKERS': str(args.workers),
+            },
+        ).stdout.decode()
+        results[server] = json.loads(output.splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
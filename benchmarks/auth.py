@@ -0,0 +1,102 @@
+'''Measure the JWT authentication overhead of a /graphql/ request
+
+    python -m benchmarks.auth --repeat 500
+
+Compares graphql_jwt's field middleware and backend to the view-level
+authentication and cached backend of app.auth, against the same request
+executed without a token.
+'''
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import json
+import tempfile
+from benchmarks.common import measure, setup_django
+
+QUERY: str = (
+    'query { tracks(first: 20) { edges { node { title url '
+    'postedBy { username } } } } }'
+)
+
+MODES: Dict[str, Tuple[List[str], List[str]]] = {
+    'none': ([], []),
+    'graphql_jwt': (
+        ['graphql_jwt.middleware.JSONWebTokenMiddleware'],
+        ['graphql_jwt.backends.JSONWebTokenBackend'],
+    ),
+    'cached': ([], ['app.auth.JSONWebTokenBackend']),
+}
+
+
+def seed(tracks: int) -> Any:
+    from django.contrib.auth.models import User
+    from tracks.models import Track
+
+    user: User = User.objects.create(username='user')
+    Track.objects.bulk_create(
+        Track(title=f'track {index}', url='', posted_by=user)
+        for index in range(tracks)
+    )
+    return user
+
+
+def make_request(
+    middleware: List[str], backend: List[str], token: str
+) -> Callable[[], Any]:
+    from django.conf import settings
+    from django.test import RequestFactory
+    from django.utils.module_loading import import_string
+    from app.views import GraphQLView
+
+    settings.AUTHENTICATION_BACKENDS = backend + [
+        'django.contrib.auth.backends.ModelBackend'
+    ]
+    view: Callable[..., Any] = GraphQLView.as_view(
+        middleware=[import_string(path)() for path in middleware]
+    )
+    factory: RequestFactory = RequestFactory()
+    body: str = json.dumps({'query': QUERY})
+    headers: Dict[str, str] = {}
+    if backend:
+        headers['HTTP_AUTHORIZATION'] = f'JWT {token}'
+
+    def request() -> None:
+        response: Any = view(
+            factory.post(
+                '/graphql/', body, content_type='application/json', **headers
+            )
+        )
+        assert response.status_code == 200, response.content
+
+    return request
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--database', type=Path)
+    args = parser.parse_args()
+    database: Path = args.database or Path(tempfile.mkdtemp()) / 'bench.db'
+    setup_django(database)
+    from django.conf import settings
+    from graphql_jwt.shortcuts import get_token
+
+    settings.GRAPHQL_RESPONSE_CACHE['ENABLED'] = False
+    token: str = get_token(seed(args.tracks))
+    results: Dict[str, Dict[str, float]] = {}
+    for mode, (middleware, backend) in MODES.items():
+        request: Callable[[], Any] = make_request(middleware, backend, token)
+        request()
+        results[mode] = measure(request, args.repeat)
+    for mode in ('graphql_jwt', 'cached'):
+        results[mode]['overhead_p50_ms'] = (
+            results[mode]['p50_ms'] - results['none']['p50_ms']
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+import os
+import statistics
+import sys
+import time
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+
+
+def setup_django(database: Path) -> None:
+    '''Configure Django against a throwaway SQLite database and migrate it'''
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered: List[float] = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(function: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    '''Time `repeat` calls of `function`, in milliseconds'''
+    samples: List[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'mean_ms': statistics.mean(samples),
+        'p50_ms': percentile(samples, 0.50),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+    }
@@ -0,0 +1,162 @@
+'''Hammer createLike and tracks from many threads under each DB profile
+
+    python -m benchmarks.concurrency --threads 16 --requests 4000
+
+Each DJANGO_DB_PROFILE runs in its own process on its own SQLite file,
+through Django's WSGI handler, with the response cache off.
+'''
+from __future__ import annotations
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.common import percentile, setup_django
+
+PROFILES: Tuple[str, ...] = ('development', 'sqlite')
+TRACKS: str = (
+    'query { tracks(first: 20) { edges { node { title likeCount '
+    'postedBy { username } } } } }'
+)
+CREATE_LIKE: str = (
+    'mutation($trackId: Int!) '
+    '{ createLike(trackId: $trackId) { track { likeCount } } }'
+)
+
+
+def seed(users: int, tracks: int) -> List[str]:
+    '''Create the users and tracks, and return a token per user'''
+    from django.contrib.auth.models import User
+    from graphql_jwt.shortcuts import get_token
+    from tracks.models import Track
+
+    User.objects.bulk_create(
+        User(username=f'user{index}') for index in range(users)
+    )
+    everyone: List[User] = list(User.objects.all())
+    Track.objects.bulk_create(
+        Track(
+            title=f'track {index}',
+            url='http://example.com',
+            posted_by=everyone[index % users],
+        )
+        for index in range(tracks)
+    )
+    return [get_token(user) for user in everyone]
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    setup_django(args.database)
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+
+    settings.GRAPHQL_RESPONSE_CACHE['ENABLED'] = False
+    tokens: List[str] = seed(args.users, args.tracks)
+    handler: WSGIHandler = WSGIHandler()
+    rng: random.Random = random.Random(42)
+    plan: List[Tuple[str, bytes, str]] = []
+    for _ in range(args.requests):
+        if rng.random() < args.write_ratio:
+            body: Dict[str, Any] = {
+                'query': CREATE_LIKE,
+                'variables': {'trackId': rng.randint(1, args.tracks)},
+            }
+            plan.append(
+                ('createLike', json.dumps(body).encode(), rng.choice(tokens))
+            )
+        else:
+            plan.append(('tracks', json.dumps({'query': TRACKS}).encode(), ''))
+
+    def call(kind: str, body: bytes, token: str) -> Tuple[str, float, bool]:
+        environ: Dict[str, Any] = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/graphql/',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(body),
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'JWT {token}'
+        start: float = time.perf_counter()
+        content: bytes = b''.join(
+            handler(environ, lambda status, headers: None)
+        )
+        elapsed: float = (time.perf_counter() - start) * 1000
+        return kind, elapsed, b'"errors"' in content
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    start: float = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        for kind, elapsed, failed in executor.map(
+            lambda item: call(*item), plan
+        ):
+            samples[kind].append(elapsed)
+            errors[kind] += failed
+    total: float = time.perf_counter() - start
+    return {
+        'requests_per_s': args.requests / total,
+        **{
+            kind: {
+                'p50_ms': percentile(values, 0.50),
+                'p99_ms': percentile(values, 0.99),
+                'errors': errors[kind],
+            }
+            for kind, values in sorted(samples.items())
+        },
+    }
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tracks', type=int, default=1000)
+    parser.add_argument('--database', type=Path)
+    parser.add_argument('--profile', choices=PROFILES)
+    args = parser.parse_args()
+    if args.profile is not None:
+        print(json.dumps(run(args)))
+        return
+    directory: Path = Path(tempfile.mkdtemp())
+    results: Dict[str, Any] = {}
+    for profile in PROFILES:
+        output: str = subprocess.run(
+            [
+                sys.executable,
+                '-m',
+                'benchmarks.concurrency',
+                '--profile',
+                profile,
+                '--database',
+                str(directory / f'{profile}.db'),
+                *(
+                    f'--{name.replace("_", "-")}={value}'
+                    for name, value in vars(args).items()
+                    if name not in ('profile', 'database')
+                ),
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            env={**os.environ, 'DJANGO_DB_PROFILE': profile},
+        ).stdout.decode()
+        results[profile] = json.loads(output.splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
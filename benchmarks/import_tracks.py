@@ -0,0 +1,69 @@
+'''Measure the throughput of the import_tracks command
+
+    python -m benchmarks.import_tracks --rows 100000
+
+Generates an NDJSON file of tracks posted and liked by --users users,
+imports it into a fresh SQLite database, then imports it again to measure
+the duplicate detection.
+'''
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict
+import argparse
+import json
+import random
+import tempfile
+import time
+from benchmarks.common import setup_django
+
+
+def generate(path: Path, rows: int, users: int) -> None:
+    rng: random.Random = random.Random(42)
+    with open(path, 'w') as file:
+        for index in range(rows):
+            row: Dict[str, Any] = {
+                'title': f'track {index}',
+                'description': f'description {index}',
+                'url': f'http://example.com/{index}',
+                'posted_by': f'user{rng.randrange(users)}',
+                'liked_by': [
+                    f'user{user}'
+                    for user in rng.sample(range(users), rng.randint(0, 3))
+                ],
+            }
+            file.write(json.dumps(row) + '\n')
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--database', type=Path)
+    args = parser.parse_args()
+    directory: Path = Path(tempfile.mkdtemp())
+    setup_django(args.database or directory / 'bench.db')
+    from tracks.importer import ImportStats, TrackImporter, read_ndjson
+
+    source: Path = directory / 'tracks.ndjson'
+    generate(source, args.rows, args.users)
+    results: Dict[str, Dict[str, float]] = {}
+    for run in ('first', 'again'):
+        start: float = time.perf_counter()
+        with open(source) as file:
+            stats: ImportStats = TrackImporter(
+                create_users=True, chunk_size=args.chunk_size
+            ).run(read_ndjson(file))
+        elapsed: float = time.perf_counter() - start
+        results[run] = {
+            'rows_per_s': stats.rows / elapsed,
+            'tracks': stats.tracks,
+            'duplicates': stats.duplicates,
+            'likes': stats.likes,
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
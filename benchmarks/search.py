@@ -0,0 +1,120 @@
+'''Compare the FTS5 and icontains search paths of Query.tracks
+
+    python -m benchmarks.search --tracks 1000000
+'''
+from __future__ import annotations
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import json
+import random
+import tempfile
+import time
+from benchmarks.common import measure, setup_django
+
+SYLLABLES: List[str] = (
+    'ba be bi bo da de di do ka ke ki ko la le li lo ma me mi mo na ne ni '
+    'no ra re ri ro sa se si so ta te ti to va ve vi vo'
+).split()
+
+
+def vocabulary(rng: random.Random, size: int) -> List[str]:
+    words: Dict[str, None] = {}
+    while len(words) < size:
+        words[''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))] = None
+    return list(words)
+
+
+class Corpus:
+    '''Random text whose word frequencies follow a Zipf distribution'''
+
+    def __init__(self, size: int = 20000, seed: int = 42) -> None:
+        self.rng: random.Random = random.Random(seed)
+        self.words: List[str] = vocabulary(self.rng, size)
+        self.cum_weights: List[float] = list(
+            accumulate(1 / rank for rank in range(1, size + 1))
+        )
+
+    def sentence(self, size: int) -> str:
+        return ' '.join(
+            self.rng.choices(self.words, cum_weights=self.cum_weights, k=size)
+        )
+
+    def terms(self) -> List[str]:
+        '''A frequent, a mid-frequency, a rare, a prefix and a 2-word search'''
+        return [
+            self.words[5],
+            self.words[500],
+            self.words[10000],
+            self.words[50][:3],
+            f'{self.words[20]} {self.words[300]}',
+        ]
+
+
+def seed(corpus: Corpus, count: int, chunk_size: int = 10000) -> None:
+    from django.db import connection, transaction
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, count, chunk_size):
+            cursor.executemany(
+                'INSERT INTO tracks_track '
+                '(title, description, url, created_at) '
+                "VALUES (%s, %s, %s, datetime('now'))",
+                [
+                    (
+                        corpus.sentence(3),
+                        corpus.sentence(30),
+                        'http://example.com',
+                    )
+                    for _ in range(min(chunk_size, count - start))
+                ],
+            )
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database', type=Path)
+    args = parser.parse_args()
+    database: Path = args.database or Path(tempfile.mkdtemp()) / 'bench.db'
+    setup_django(database)
+    from app.pagination import paginate
+    from tracks.models import Track
+    from tracks.schema import TrackConnection
+    from tracks.search import (
+        ContainsSearchBackend,
+        FTS5SearchBackend,
+        SearchBackend,
+    )
+
+    corpus: Corpus = Corpus()
+    if not Track.objects.exists():
+        start: float = time.perf_counter()
+        seed(corpus, args.tracks)
+        print(
+            f'seeded {args.tracks} tracks in '
+            f'{time.perf_counter() - start:.1f}s'
+        )
+    results: Dict[str, Dict[str, Any]] = {}
+    backend: SearchBackend
+    for backend in (ContainsSearchBackend(), FTS5SearchBackend()):
+        for term in corpus.terms():
+            results[f'{type(backend).__name__} {term!r}'] = measure(
+                lambda: paginate(
+                    backend.search(
+                        Track.objects.only('id', 'title', 'created_at'), term
+                    ),
+                    TrackConnection,
+                    backend.ordering,
+                    first=20,
+                ),
+                args.repeat,
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''Measure the time from process start to the first /graphql/ response
+
+    python -m benchmarks.startup --runs 10
+
+Starts fresh Python processes that import app.wsgi and send it one
+request, under each configuration: the debug defaults (admin and
+GraphiQL), without them, and without them plus GRAPHQL_WARM_UP. Reports
+the wall time until the response, the app.startup phases (timed from
+the import of the settings) and the time of the request itself, which
+the warm-up moves before the process is ready: e.g. before gunicorn
+--preload forks its workers.
+'''
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.common import ROOT, percentile, setup_django
+
+CHILD: str = '''
+import json, sys, time
+from io import BytesIO
+from app.wsgi import application
+from app.startup import PHASES
+body = json.dumps({'query': sys.argv[1]}).encode()
+start = time.perf_counter()
+b''.join(application({
+    'REQUEST_METHOD': 'POST',
+    'PATH_INFO': '/graphql/',
+    'CONTENT_TYPE': 'application/json',
+    'CONTENT_LENGTH': str(len(body)),
+    'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80',
+    'wsgi.url_scheme': 'http',
+    'wsgi.input': BytesIO(body),
+}, lambda status, headers: None))
+PHASES['request'] = time.perf_counter() - start
+print(json.dumps(PHASES), flush=True)
+'''
+QUERY: str = '{ tracks(first: 20) { edges { node { title } } } }'
+CONFIGURATIONS: Dict[str, Dict[str, str]] = {
+    'debug': {'DJANGO_ADMIN': '1', 'GRAPHQL_GRAPHIQL': '1'},
+    'lean': {'DJANGO_ADMIN': '0', 'GRAPHQL_GRAPHIQL': '0'},
+    'lean_warm_up': {
+        'DJANGO_ADMIN': '0',
+        'GRAPHQL_GRAPHIQL': '0',
+        'GRAPHQL_WARM_UP': '1',
+    },
+}
+
+
+def start(database: Path, environment: Dict[str, str]) -> Dict[str, float]:
+    '''Run one process, and return its timings in milliseconds'''
+    began: float = time.perf_counter()
+    process: subprocess.Popen = subprocess.Popen(
+        [sys.executable, '-c', CHILD, QUERY],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        env={
+            **os.environ,
+            'DJANGO_DB_PROFILE': 'sqlite',
+            'SQLITE_PATH': str(database),
+            **environment,
+        },
+    )
+    line: bytes = process.stdout.readline()
+    elapsed: float = (time.perf_counter() - began) * 1000
+    process.wait()
+    phases: Dict[str, float] = json.loads(line)
+    return {
+        'first_response_ms': elapsed,
+        **{f'{phase}_ms': value * 1000 for phase, value in phases.items()},
+    }
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database', type=Path)
+    args = parser.parse_args()
+    database: Path = args.database or Path(tempfile.mkdtemp()) / 'bench.db'
+    setup_django(database)
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, environment in CONFIGURATIONS.items():
+        runs: List[Dict[str, float]] = [
+            start(database, environment) for _ in range(args.runs)
+        ]
+        results[name] = {
+            key: statistics.median(run[key] for run in runs) for key in runs[0]
+        }
+        results[name]['first_response_p95_ms'] = percentile(
+            [run['first_response_ms'] for run in runs], 0.95
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+'''Measure the fan-out of a subscription event to idle websockets
+
+    python -m benchmarks.subscriptions --connections 5000
+
+Opens in-memory graphql-ws connections to app.subscriptions, all
+subscribed to trackCreated, then publishes tracks and times how long
+every connection takes to receive each of them.
+'''
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import tracemalloc
+from benchmarks.common import percentile, setup_django
+
+SUBSCRIPTION: str = 'subscription { trackCreated { title url } }'
+
+
+class Counter:
+    '''Counts the data messages received by all the clients'''
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.target: int = 0
+        self.done: asyncio.Event = asyncio.Event()
+
+    def expect(self, count: int) -> None:
+        self.count = 0
+        self.target = count
+        self.done.clear()
+
+    def add(self) -> None:
+        self.count += 1
+        if self.count == self.target:
+            self.done.set()
+
+
+class Client:
+    def __init__(self, application: Any, counter: Counter) -> None:
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.counter: Counter = counter
+        self.task: asyncio.Future = asyncio.ensure_future(
+            application(
+                {
+                    'type': 'websocket',
+                    'path': '/graphql/',
+                    'subprotocols': ['graphql-ws'],
+                },
+                self.inbox.get,
+                self.send_message,
+            )
+        )
+
+    async def send_message(self, message: Dict[str, Any]) -> None:
+        if message.get('text', '').startswith('{"type": "data"'):
+            self.counter.add()
+        else:
+            self.outbox.put_nowait(message)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self.inbox.put_nowait(
+            {'type': 'websocket.receive', 'text': json.dumps(message)}
+        )
+
+    async def receive(self, type: str) -> Dict[str, Any]:
+        while True:
+            message: Dict[str, Any] = await self.outbox.get()
+            if 'text' in message:
+                content: Dict[str, Any] = json.loads(message['text'])
+                if content['type'] == type:
+                    return content
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from asgiref.sync import sync_to_async
+    from django.contrib.auth.models import User
+    from app.pubsub import get_pubsub
+    from app.subscriptions import websocket_application
+    from tracks.models import Track
+
+    user: User = await sync_to_async(User.objects.create)(username='user')
+    tracemalloc.start()
+    before: int = tracemalloc.get_traced_memory()[0]
+    counter: Counter = Counter()
+    clients: List[Client] = []
+    for _ in range(args.connections):
+        client: Client = Client(websocket_application, counter)
+        client.inbox.put_nowait({'type': 'websocket.connect'})
+        client.send({'type': 'connection_init', 'payload': {}})
+        client.send(
+            {'type': 'start', 'id': '1', 'payload': {'query': SUBSCRIPTION}}
+        )
+        client.send({'type': 'stop', 'id': 'sync'})
+        clients.append(client)
+    await asyncio.gather(*(client.receive('complete') for client in clients))
+    per_connection: float = (
+        tracemalloc.get_traced_memory()[0] - before
+    ) / args.connections
+    tracemalloc.stop()
+    samples: List[float] = []
+    for index in range(args.events):
+        track: Track = await sync_to_async(Track.objects.create)(
+            title=f'track {index}', url='http://example.com', posted_by=user
+        )
+        counter.expect(len(clients))
+        start: float = time.perf_counter()
+        get_pubsub().publish('track_created', {'track_id': track.pk})
+        await counter.done.wait()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'connections': args.connections,
+        'kib_per_connection': per_connection / 1024,
+        'fan_out_p50_ms': percentile(samples, 0.50),
+        'fan_out_max_ms': max(samples),
+    }
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connections', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--database', type=Path)
+    args = parser.parse_args()
+    setup_django(args.database or Path(tempfile.mkdtemp()) / 'bench.db')
+    from django.conf import settings
+
+    settings.GRAPHQL_SUBSCRIPTIONS['KEEP_ALIVE'] = 0
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+'''Run a mixed workload against /graphql/ and report it per operation
+
+    python -m benchmarks.workload --output run.json
+    python -m benchmarks.workload --baseline run.json
+
+Seeds --users users, --tracks tracks, --likes likes and --follows
+followed users per user, then sends
+--requests requests drawn from --mix through Django's test client, with
+the response cache off. Every operation reports its throughput, latency
+percentiles and SQL queries. With --baseline, the run fails when the
+p95 latency of an operation grows by more than --tolerance, or when it
+runs more queries than in the baseline.
+'''
+from __future__ import annotations
+from collections import defaultdict
+from io import StringIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from benchmarks.common import percentile, setup_django
+from benchmarks.search import Corpus
+
+MIX: str = 'search=3,tracks=2,feed=3,me=1,createLike=2'
+SEARCH: str = (
+    'query($search: String!) { tracks(search: $search, first: 20) '
+    '{ edges { node { title postedBy { username } } } } }'
+)
+TRACKS: str = (
+    'query { tracks(first: 20) { edges { node { title url likeCount '
+    'postedBy { username } likes { user { username } } } } } }'
+)
+FEED: str = (
+    'query { feed(first: 20) { edges { node { title likeCount '
+    'postedBy { username } } } } }'
+)
+ME: str = (
+    'query { me { username trackSet { title } likes { track { title } } } }'
+)
+CREATE_LIKE: str = (
+    'mutation($trackId: Int!) '
+    '{ createLike(trackId: $trackId) { track { likeCount } } }'
+)
+
+Request = Tuple[str, Dict[str, Any], str]
+
+
+def seed(
+    corpus: Corpus, users: int, tracks: int, likes: int, follows: int
+) -> List[str]:
+    '''Create the dataset, and return a token per user'''
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from graphql_jwt.shortcuts import get_token
+    from tracks.models import Follow, Like, Track
+
+    User.objects.bulk_create(
+        User(username=f'user{index}') for index in range(users)
+    )
+    everyone: List[User] = list(User.objects.all())
+    Track.objects.bulk_create(
+        (
+            Track(
+                title=corpus.sentence(3),
+                description=corpus.sentence(30),
+                url=f'http://example.com/{index}',
+                posted_by=everyone[index % users],
+            )
+            for index in range(tracks)
+        ),
+        batch_size=1000,
+    )
+    pairs: Dict[Tuple[int, int], None] = {}
+    likes = min(likes, users * tracks)
+    while len(pairs) < likes:
+        pairs[corpus.rng.randrange(users), corpus.rng.randrange(tracks)] = None
+    track_ids: List[int] = list(Track.objects.values_list('id', flat=True))
+    Like.objects.bulk_create(
+        (
+            Like(user=everyone[user], track_id=track_ids[track])
+            for user, track in pairs
+        ),
+        batch_size=1000,
+    )
+    Track.objects.refresh_like_counts()
+    Follow.objects.bulk_create(
+        (
+            Follow(follower=follower, followed=followed)
+            for follower in everyone
+            for followed in corpus.rng.sample(everyone, min(follows, users))
+            if followed != follower
+        ),
+        batch_size=1000,
+    )
+    call_command('rebuild_feed', stdout=StringIO())
+    return [get_token(user) for user in everyone]
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights: Dict[str, int] = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+def plan(
+    args: argparse.Namespace, corpus: Corpus, tokens: List[str]
+) -> List[Request]:
+    '''Draw the requests, as (operation, body, token) tuples'''
+    operations: Dict[str, Callable[[], Request]] = {
+        'search': lambda: (
+            'search',
+            {
+                'query': SEARCH,
+                'variables': {'search': corpus.rng.choice(corpus.terms())},
+            },
+            '',
+        ),
+        'tracks': lambda: ('tracks', {'query': TRACKS}, ''),
+        'feed': lambda: ('feed', {'query': FEED}, corpus.rng.choice(tokens)),
+        'me': lambda: ('me', {'query': ME}, corpus.rng.choice(tokens)),
+        'createLike': lambda: (
+            'createLike',
+            {
+                'query': CREATE_LIKE,
+                'variables': {'trackId': corpus.rng.randint(1, args.tracks)},
+            },
+            corpus.rng.choice(tokens),
+        ),
+    }
+    weights: Dict[str, int] = parse_mix(args.mix)
+    unknown: List[str] = sorted(set(weights) - set(operations))
+    if unknown:
+        raise SystemExit(f'unknown operations in --mix: {", ".join(unknown)}')
+    names: List[str] = corpus.rng.choices(
+        list(weights), list(weights.values()), k=args.requests
+    )
+    return [operations[name]() for name in names]
+
+
+def run(requests: List[Request]) -> Dict[str, Any]:
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client: Client = Client(SERVER_NAME='localhost')
+    samples: Dict[str, List[float]] = defaultdict(list)
+    queries: Dict[str, List[int]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    start: float = time.perf_counter()
+    for operation, body, token in requests:
+        headers: Dict[str, str] = {}
+        if token:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {token}'
+        with CaptureQueriesContext(connection) as captured:
+            began: float = time.perf_counter()
+            response: Any = client.post(
+                '/graphql/',
+                json.dumps(body),
+                content_type='application/json',
+                **headers,
+            )
+            samples[operation].append((time.perf_counter() - began) * 1000)
+        queries[operation].append(len(captured))
+        if response.status_code != 200 or 'errors' in response.json():
+            errors[operation] += 1
+    elapsed: float = time.perf_counter() - start
+    return {
+        'requests': len(requests),
+        'requests_per_s': len(requests) / elapsed,
+        'operations': {
+            operation: {
+                'count': len(values),
+                'errors': errors[operation],
+                'ops_per_s': len(values) / (sum(values) / 1000),
+                'mean_ms': statistics.mean(values),
+                'p50_ms': percentile(values, 0.50),
+                'p95_ms': percentile(values, 0.95),
+                'p99_ms': percentile(values, 0.99),
+                'queries_mean': statistics.mean(queries[operation]),
+                'queries_max': max(queries[operation]),
+            }
+            for operation, values in sorted(samples.items())
+        },
+    }
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    '''List the regressions of `results` against `baseline`'''
+    regressions: List[str] = []
+    for operation, before in baseline['operations'].items():
+        after: Dict[str, Any] = results['operations'].get(operation)
+        if after is None:
+            continue
+        if after['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{operation}: p95 {after["p95_ms"]:.1f}ms, '
+                f'was {before["p95_ms"]:.1f}ms'
+            )
+        if after['queries_max'] > before['queries_max']:
+            regressions.append(
+                f'{operation}: {after["queries_max"]} queries, '
+                f'was {before["queries_max"]}'
+            )
+        if after['errors'] > before['errors']:
+            regressions.append(
+                f'{operation}: {after["errors"]} errors, '
+                f'was {before["errors"]}'
+            )
+    return regressions
+
+
+def main() -> None:
+    '''Main function'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tracks', type=int, default=5000)
+    parser.add_argument('--likes', type=int, default=20000)
+    parser.add_argument('--follows', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--mix', default=MIX, help=f'defaults to {MIX}')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=Path, help='write the JSON there')
+    parser.add_argument('--baseline', type=Path, help='JSON of a former run')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--database', type=Path)
+    args = parser.parse_args()
+    setup_django(args.database or Path(tempfile.mkdtemp()) / 'bench.db')
+    from django.conf import settings
+
+    settings.GRAPHQL_RESPONSE_CACHE['ENABLED'] = False
+    corpus: Corpus = Corpus(seed=args.seed)
+    tokens: List[str] = seed(
+        corpus, args.users, args.tracks, args.likes, args.follows
+    )
+    requests: List[Request] = plan(args, corpus, tokens)
+    run(requests[: len(requests) // 10])  # Warm up
+    results: Dict[str, Any] = {
+        'parameters': {
+            name: value
+            for name, value in vars(args).items()
+            if name not in ('output', 'baseline', 'database')
+        },
+        **run(requests),
+    }
+    output: str = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.write_text(output + '\n')
+    if args.baseline is not None:
+        regressions: List[str] = compare(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
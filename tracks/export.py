@@ -0,0 +1,87 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from tracks.models import Like, Track
+
+CHUNK_SIZE: int = 2000
+
+EXPORTS: Dict[str, Tuple[type, Tuple[str, ...]]] = {
+    'tracks': (
+        Track,
+        (
+            'id',
+            'title',
+            'description',
+            'url',
+            'created_at',
+            'posted_by_id',
+            'like_count',
+        ),
+    ),
+    'likes': (Like, ('id', 'user_id', 'track_id')),
+}
+
+
+def iter_rows(
+    name: str, after: Optional[int] = None, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Dict[str, Any]]:
+    '''Stream the rows of an export in id order, after the `after` id
+
+    The rows are fetched `chunk_size` at a time through a server-side
+    cursor where the database has them, so memory does not grow with the
+    table. The id of the last row received is the cursor to resume from.
+    '''
+    model: type
+    fields: Tuple[str, ...]
+    model, fields = EXPORTS[name]
+    queryset = model.objects.order_by('id').values(*fields)
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def to_ndjson(
+    rows: Iterable[Dict[str, Any]], fields: Tuple[str, ...], header: bool
+) -> Iterator[str]:
+    encoder: DjangoJSONEncoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+class Echo:
+    '''A file whose write returns the line instead of storing it'''
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def to_csv(
+    rows: Iterable[Dict[str, Any]], fields: Tuple[str, ...], header: bool
+) -> Iterator[str]:
+    writer: Any = csv.writer(Echo())
+    if header:
+        yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+FORMATS: Dict[str, Tuple[Callable[..., Iterator[str]], str]] = {
+    'ndjson': (to_ndjson, 'application/x-ndjson'),
+    'csv': (to_csv, 'text/csv'),
+}
+
+
+def export(
+    name: str,
+    format: str,
+    after: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[str]:
+    '''The lines of the `name` export, in `format`
+
+    A resumed CSV export has no header, as it continues a previous one.
+    '''
+    return FORMATS[format][0](
+        iter_rows(name, after, chunk_size), EXPORTS[name][1], after is None
+    )
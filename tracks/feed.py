@@ -0,0 +1,170 @@
+'''The feed of a user: the tracks posted or liked by the users they follow
+
+Feeds are materialized as FeedEntry rows, newest first on the
+(user, created_at) index, so reading a page never joins likes or
+follows. An entry is dated by the post or like that brought the track
+into the feed, the earliest one if several did: a like today of an old
+track is at the top of the feed. Every post or like updates the feeds
+in the same transaction, with an INSERT ... SELECT over the rows it
+touched, and so does tracks.importer for every chunk it imports. Follows
+and rebuild() recompute feeds from scratch, e.g. after rows were written
+to the database directly.
+'''
+from __future__ import annotations
+from typing import Any, List, Sequence, Tuple
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from app.response_cache import invalidate
+from tracks.models import FeedEntry, Follow, Like, Track
+
+ORDERING: Tuple[str, ...] = ('-created_at', '-track_id')
+
+
+def _sources() -> Tuple[str, str]:
+    '''SELECTs of the (user, track, created_at) entries of every feed
+
+    The first one finds the tracks posted by the followed users, dated
+    as posted, the second one the tracks they liked, dated as liked.
+    Conditions may use the `f` (follow), `t` (track) and, in the second
+    one, `l` (like) aliases.
+    '''
+    follow, track, like = (
+        connection.ops.quote_name(model._meta.db_table)
+        for model in (Follow, Track, Like)
+    )
+    select: str = 'SELECT f.follower_id AS user_id, t.id AS track_id'
+    return (
+        f'{select}, t.created_at AS created_at FROM {follow} f '
+        f'JOIN {track} t ON t.posted_by_id = f.followed_id',
+        f'{select}, l.created_at AS created_at FROM {follow} f '
+        f'JOIN {like} l ON l.user_id = f.followed_id '
+        f'JOIN {track} t ON t.id = l.track_id',
+    )
+
+
+def _fill(source: str, condition: str, params: Sequence[Any]) -> int:
+    '''INSERT the entries selected by `source` and `condition`
+
+    Entries already in the feed are skipped.
+    '''
+    ops: Any = connection.ops
+    sql: str = '%s %s (user_id, track_id, created_at) %s WHERE %s %s' % (
+        ops.insert_statement(ignore_conflicts=True),
+        ops.quote_name(FeedEntry._meta.db_table),
+        source,
+        condition,
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return max(cursor.rowcount, 0)
+
+
+def _fill_all(condition: str, params: Sequence[Any]) -> int:
+    '''INSERT the entries of both sources matching `condition`
+
+    A track both posted and liked, or liked by several followed users, is
+    dated by the earliest of them. The feeds must not have these entries.
+    '''
+    sql: str = (
+        'INSERT INTO %s (user_id, track_id, created_at) '
+        'SELECT user_id, track_id, MIN(created_at) FROM (%s) s '
+        'GROUP BY user_id, track_id'
+    ) % (
+        connection.ops.quote_name(FeedEntry._meta.db_table),
+        ' UNION ALL '.join(
+            f'{source} WHERE {condition}' for source in _sources()
+        ),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, *params])
+        return max(cursor.rowcount, 0)
+
+
+def _placeholders(values: Sequence[Any]) -> str:
+    return ', '.join(['%s'] * len(values))
+
+
+def add_tracks(tracks: Sequence[Track]) -> int:
+    '''Add new tracks to the feeds of the followers of their posters'''
+    if not tracks:
+        return 0
+    ids: List[int] = [track.pk for track in tracks]
+    added: int = _fill(_sources()[0], f't.id IN ({_placeholders(ids)})', ids)
+    invalidate(FeedEntry)
+    return added
+
+
+def add_likes(user: User, tracks: Sequence[Track]) -> int:
+    '''Add the tracks `user` liked to the feeds of their followers'''
+    if not tracks:
+        return 0
+    ids: List[int] = [track.pk for track in tracks]
+    added: int = _fill(
+        _sources()[1],
+        f'l.user_id = %s AND l.track_id IN ({_placeholders(ids)})',
+        [user.pk, *ids],
+    )
+    invalidate(FeedEntry)
+    return added
+
+
+def add_likes_of(tracks: Sequence[Track]) -> int:
+    '''Add the liked tracks to the feeds of the followers of their likers'''
+    if not tracks:
+        return 0
+    ids: List[int] = [track.pk for track in tracks]
+    added: int = _fill(
+        _sources()[1], f'l.track_id IN ({_placeholders(ids)})', ids
+    )
+    invalidate(FeedEntry)
+    return added
+
+
+def follow(follower: User, followed: User) -> bool:
+    '''Follow `followed`, adding their tracks and likes to the feed
+
+    Returns whether `follower` did not follow them yet.
+    '''
+    with transaction.atomic():
+        created: bool
+        _, created = Follow.objects.get_or_create(
+            follower=follower, followed=followed
+        )
+        if created:
+            # Entries already in the feed may be dated earlier by them
+            rebuild(follower.pk, follower.pk + 1)
+    return created
+
+
+def unfollow(follower: User, followed: User) -> bool:
+    '''Stop following `followed`, and recompute the feed without them
+
+    Returns whether `follower` did follow them.
+    '''
+    with transaction.atomic():
+        deleted: int
+        deleted, _ = Follow.objects.filter(
+            follower=follower, followed=followed
+        ).delete()
+        if deleted:
+            rebuild(follower.pk, follower.pk + 1)
+    return bool(deleted)
+
+
+def rebuild(start: int, stop: int) -> int:
+    '''Recompute the feeds of the users whose id is in [start, stop)'''
+    with transaction.atomic():
+        # Raw, as a QuerySet.delete() would fetch every entry to send
+        # the post_delete signals
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM %s WHERE user_id >= %%s AND user_id < %%s'
+                % connection.ops.quote_name(FeedEntry._meta.db_table),
+                [start, stop],
+            )
+        added: int = _fill_all(
+            'f.follower_id >= %s AND f.follower_id < %s', [start, stop]
+        )
+    invalidate(FeedEntry)
+    return added
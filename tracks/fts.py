@@ -0,0 +1,85 @@
+'''DDL of the SQLite FTS5 index behind tracks.search.FTS5SearchBackend
+
+Kept out of the migrations so that any migration rebuilding tracks_track
+(which on SQLite drops its triggers) can reinstall them.
+'''
+from typing import List
+
+TABLE: str = 'tracks_track_fts'
+
+TRIGGERS: List[str] = [
+    f'''
+    CREATE TRIGGER {TABLE}_insert AFTER INSERT ON tracks_track
+    BEGIN
+        INSERT INTO {TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER {TABLE}_delete AFTER DELETE ON tracks_track
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER {TABLE}_update
+    AFTER UPDATE OF title, description ON tracks_track
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    ''',
+]
+
+
+def has_fts5(schema_editor) -> bool:
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def has_index(schema_editor) -> bool:
+    return (
+        schema_editor.connection.vendor == 'sqlite'
+        and TABLE in schema_editor.connection.introspection.table_names()
+    )
+
+
+def create_index(schema_editor) -> None:
+    if not has_fts5(schema_editor):
+        return
+    schema_editor.execute(
+        f'''
+        CREATE VIRTUAL TABLE {TABLE} USING fts5(
+            title, description, content='tracks_track', content_rowid='id'
+        )
+        '''
+    )
+    install_triggers(schema_editor)
+
+
+def install_triggers(schema_editor) -> None:
+    '''(Re)create the sync triggers and rebuild the index from tracks_track'''
+    if not has_index(schema_editor):
+        return
+    drop_triggers(schema_editor)
+    for trigger in TRIGGERS:
+        schema_editor.execute(trigger)
+    schema_editor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def drop_triggers(schema_editor) -> None:
+    for event in ('update', 'delete', 'insert'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {TABLE}_{event}')
+
+
+def drop_index(schema_editor) -> None:
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    drop_triggers(schema_editor)
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
@@ -0,0 +1,318 @@
+from __future__ import annotations
+from itertools import islice
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+import csv
+import json
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Model
+from django.utils import timezone
+from app.response_cache import invalidate
+from tracks import feed
+from tracks.models import Like, Track, validate_track
+
+CHUNK_SIZE: int = 5000
+LOOKUP_SIZE: int = 500
+
+Key = Tuple[str, str, str, int]
+Record = Tuple[int, Any]
+
+
+class Row(NamedTuple):
+    line: int
+    title: str
+    description: str
+    url: str
+    posted_by: str
+    liked_by: Tuple[str, ...]
+
+
+class RowError(NamedTuple):
+    line: int
+    message: str
+
+
+def read_ndjson(file: IO[str]) -> Iterator[Record]:
+    '''(line number, parsed object) for every non-empty line'''
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError as error:
+            yield line, RowError(line, f'Invalid JSON: {error}')
+
+
+def read_csv(file: IO[str]) -> Iterator[Record]:
+    '''(line number, row) for every row, liked_by being space-separated'''
+    reader: csv.DictReader = csv.DictReader(file)
+    for row in reader:
+        if row.get('liked_by') is not None:
+            row['liked_by'] = row['liked_by'].split()
+        yield reader.line_num, row
+
+
+READERS: Dict[str, Callable[[IO[str]], Iterator[Record]]] = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator: Iterator[Any] = iter(iterable)
+    while True:
+        chunk: List[Any] = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportStats:
+    def __init__(self) -> None:
+        self.rows: int = 0
+        self.tracks: int = 0
+        self.duplicates: int = 0
+        self.likes: int = 0
+        self.errors: List[RowError] = []
+
+
+class TrackImporter:
+    '''Imports tracks and their likes, a chunk per transaction
+
+    Rows are objects with title, description, url, posted_by and an
+    optional liked_by list, users being referred to by username. A track
+    identical to an existing one of the same user (title, description
+    and url) is a duplicate: it is not created again, but its likes are
+    still added. The new tracks and likes are added to the feeds of the
+    followers of their users with each chunk.
+    '''
+
+    def __init__(
+        self, create_users: bool = False, chunk_size: int = CHUNK_SIZE
+    ) -> None:
+        self.create_users: bool = create_users
+        self.chunk_size: int = chunk_size
+        self.user_ids: Dict[str, int] = {}
+        self.unknown_users: Set[str] = set()
+        self.stats: ImportStats = ImportStats()
+
+    def run(
+        self,
+        records: Iterable[Record],
+        progress: Optional[Callable[[ImportStats], None]] = None,
+    ) -> ImportStats:
+        try:
+            for chunk in chunked(records, self.chunk_size):
+                self.import_chunk(chunk)
+                if progress is not None:
+                    progress(self.stats)
+        finally:
+            # bulk_create bypasses the signals the response cache relies on
+            invalidate(Track)
+            invalidate(Like)
+        return self.stats
+
+    def parse(self, line: int, record: Any) -> Row:
+        if isinstance(record, RowError):
+            raise ValidationError(record.message)
+        if not isinstance(record, dict):
+            raise ValidationError('Rows must be objects')
+        values: Dict[str, Any] = {
+            name: record.get(name) or ''
+            for name in ('title', 'description', 'url', 'posted_by')
+        }
+        missing: List[str] = [
+            name
+            for name in ('title', 'url', 'posted_by')
+            if not isinstance(values[name], str) or not values[name]
+        ]
+        if missing:
+            raise ValidationError(
+                {name: ['This field is required.'] for name in missing}
+            )
+        validate_track(
+            title=values['title'],
+            description=values['description'],
+            url=values['url'],
+        )
+        liked_by: Any = record.get('liked_by') or ()
+        if not isinstance(liked_by, (list, tuple)) or not all(
+            isinstance(username, str) for username in liked_by
+        ):
+            raise ValidationError({'liked_by': ['Expected usernames.']})
+        return Row(line, liked_by=tuple(liked_by), **values)
+
+    def resolve_users(self, usernames: Set[str]) -> None:
+        '''Fill the username to id cache with the unknown `usernames`'''
+        User: Type[Model] = get_user_model()
+        missing: List[str] = sorted(
+            usernames - self.user_ids.keys() - self.unknown_users
+        )
+        for batch in chunked(missing, LOOKUP_SIZE):
+            self.user_ids.update(
+                User._default_manager.filter(username__in=batch).values_list(
+                    'username', 'id'
+                )
+            )
+        missing = [name for name in missing if name not in self.user_ids]
+        if missing and self.create_users:
+            password: str = make_password(None)
+            User._default_manager.bulk_create(
+                (User(username=name, password=password) for name in missing),
+                ignore_conflicts=True,
+            )
+            invalidate(User)
+            for batch in chunked(missing, LOOKUP_SIZE):
+                self.user_ids.update(
+                    User._default_manager.filter(
+                        username__in=batch
+                    ).values_list('username', 'id')
+                )
+        self.unknown_users.update(
+            name for name in missing if name not in self.user_ids
+        )
+
+    def get_tracks(self, keys: Set[Key]) -> Dict[Key, int]:
+        '''The ids of the tracks matching `keys` that exist'''
+        found: Dict[Key, int] = {}
+        urls: List[str] = sorted({key[2] for key in keys})
+        for batch in chunked(urls, LOOKUP_SIZE):
+            for pk, title, description, url, posted_by in Track.objects.filter(
+                url__in=batch
+            ).values_list('id', 'title', 'description', 'url', 'posted_by_id'):
+                key: Key = (title, description, url, posted_by)
+                if key in keys:
+                    found[key] = pk
+        return found
+
+    def import_chunk(self, records: List[Record]) -> None:
+        rows: List[Row] = []
+        for line, record in records:
+            try:
+                rows.append(self.parse(line, record))
+            except ValidationError as error:
+                self.stats.errors.append(RowError(line, format_error(error)))
+        self.stats.rows += len(records)
+        self.resolve_users(
+            {row.posted_by for row in rows}
+            | {name for row in rows for name in row.liked_by}
+        )
+        keyed: List[Tuple[Key, Row]] = []
+        for row in rows:
+            unknown: List[str] = [
+                name
+                for name in (row.posted_by, *row.liked_by)
+                if name in self.unknown_users
+            ]
+            if unknown:
+                self.stats.errors.append(
+                    RowError(row.line, f'Unknown users: {", ".join(unknown)}')
+                )
+                continue
+            keyed.append(
+                (
+                    (
+                        row.title,
+                        row.description,
+                        row.url,
+                        self.user_ids[row.posted_by],
+                    ),
+                    row,
+                )
+            )
+        keys: Set[Key] = {key for key, _ in keyed}
+        with transaction.atomic():
+            existing: Dict[Key, int] = self.get_tracks(keys)
+            new: List[Key] = [key for key in keys if key not in existing]
+            created_at: Any = Track._meta.get_field(
+                'created_at'
+            ).get_db_prep_value(timezone.now(), connection, prepared=False)
+            insert(
+                Track,
+                (
+                    'title',
+                    'description',
+                    'url',
+                    'posted_by',
+                    'created_at',
+                    'like_count',
+                ),
+                (key + (created_at, 0) for key in new),
+            )
+            self.stats.tracks += len(new)
+            self.stats.duplicates += len(keyed) - len(new)
+            if not new and not any(row.liked_by for _, row in keyed):
+                return
+            existing = self.get_tracks(keys)
+            for batch in chunked([existing[key] for key in new], LOOKUP_SIZE):
+                feed.add_tracks([Track(pk=pk) for pk in batch])
+            likes: Set[Tuple[int, int]] = {
+                (self.user_ids[name], existing[key])
+                for key, row in keyed
+                for name in row.liked_by
+            }
+            if not likes:
+                return
+            # Likes that already exist are ignored, and not counted
+            self.stats.likes += insert(
+                Like,
+                ('user', 'track', 'created_at'),
+                (like + (created_at,) for like in likes),
+                ignore_conflicts=True,
+            )
+            for batch in chunked({track for _, track in likes}, LOOKUP_SIZE):
+                Track.objects.filter(pk__in=batch).refresh_like_counts()
+                feed.add_likes_of([Track(pk=pk) for pk in batch])
+
+
+def insert(
+    model: Type[Model],
+    fields: Tuple[str, ...],
+    rows: Iterable[Tuple[Any, ...]],
+    ignore_conflicts: bool = False,
+) -> int:
+    '''INSERT the `rows` with executemany, without building any instance
+
+    Values must already be prepared for the database, and every column
+    without a database default given: field defaults and signals are
+    Python-side and skipped. Returns the number of rows inserted, those
+    ignored as conflicting excluded.
+    '''
+    ops: Any = connection.ops
+    columns: str = ', '.join(
+        ops.quote_name(model._meta.get_field(name).column) for name in fields
+    )
+    sql: str = '%s %s (%s) VALUES (%s) %s' % (
+        ops.insert_statement(ignore_conflicts=ignore_conflicts),
+        ops.quote_name(model._meta.db_table),
+        columns,
+        ', '.join(['%s'] * len(fields)),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+        return cursor.rowcount
+
+
+def format_error(error: ValidationError) -> str:
+    if not hasattr(error, 'error_dict'):
+        return ' '.join(error.messages)
+    return ' '.join(
+        f'{field}: {" ".join(messages)}'
+        for field, messages in error.message_dict.items()
+    )
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from collections import defaultdict
+from typing import Any, DefaultDict, Dict, Iterator, List, Optional
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import User
+from promise import Promise
+from promise.dataloader import DataLoader
+from tracks.models import Like, Track
+
+
+class UserLoader(DataLoader):
+    def batch_load_fn(self, keys: List[int]) -> Promise[List[Optional[User]]]:
+        users: Dict[int, User] = get_user_model().objects.in_bulk(keys)
+        return Promise.resolve([users.get(key) for key in keys])
+
+
+class TrackLoader(DataLoader):
+    def batch_load_fn(self, keys: List[int]) -> Promise[List[Optional[Track]]]:
+        tracks: Dict[int, Track] = Track.objects.in_bulk(keys)
+        return Promise.resolve([tracks.get(key) for key in keys])
+
+
+class LikesByTrackLoader(DataLoader):
+    def batch_load_fn(self, keys: List[int]) -> Promise[List[List[Like]]]:
+        likes: DefaultDict[int, List[Like]] = defaultdict(list)
+        for like in Like.objects.filter(track_id__in=keys).order_by('pk'):
+            likes[like.track_id].append(like)
+        return Promise.resolve([likes[key] for key in keys])
+
+
+class Loaders:
+    '''The DataLoaders shared by every resolver of a single request'''
+
+    def __init__(self) -> None:
+        self.user: UserLoader = UserLoader()
+        self.track: TrackLoader = TrackLoader()
+        self.likes_by_track: LikesByTrackLoader = LikesByTrackLoader()
+
+    def __iter__(self) -> Iterator[DataLoader]:
+        return iter((self.user, self.track, self.likes_by_track))
+
+    def clear(self) -> None:
+        for loader in self:
+            loader.clear_all()
+
+
+def get_loaders(context: Any) -> Loaders:
+    '''Return the loaders attached to the request, creating them if needed'''
+    if context is None:
+        return Loaders()
+    loaders: Optional[Loaders] = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
@@ -0,0 +1,18 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from tracks import trending
+
+
+class Command(BaseCommand):
+    help = 'Score the new likes and rank the trending tracks, e.g. from cron'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='score every like again, e.g. after deleting likes',
+        )
+
+    def handle(self, *args: Any, full: bool, **options: Any) -> None:
+        read: int = trending.refresh(full=full)
+        self.stdout.write(f'Ranked trending tracks from {read} new likes')
@@ -0,0 +1,44 @@
+from typing import Any, Optional
+from django.core.management.base import BaseCommand, CommandParser
+from tracks.export import CHUNK_SIZE, EXPORTS, FORMATS, export
+
+
+class Command(BaseCommand):
+    help = 'Stream the tracks or likes as NDJSON or CSV'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS), default='ndjson'
+        )
+        parser.add_argument(
+            '--after',
+            type=int,
+            help='id of the last row of a previous export, to resume it',
+        )
+        parser.add_argument(
+            '--output', help='file to write to, instead of stdout'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='number of rows fetched at a time',
+        )
+
+    def handle(
+        self,
+        *args: Any,
+        name: str,
+        format: str,
+        after: Optional[int],
+        output: Optional[str],
+        chunk_size: int,
+        **options: Any,
+    ) -> None:
+        if output is None:
+            for line in export(name, format, after, chunk_size):
+                self.stdout.write(line, ending='')
+            return
+        with open(output, 'a' if after else 'w', newline='') as file:
+            file.writelines(export(name, format, after, chunk_size))
@@ -0,0 +1,72 @@
+from typing import IO, Any, Optional
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandParser
+from tracks.importer import (
+    CHUNK_SIZE,
+    READERS,
+    ImportStats,
+    RowError,
+    TrackImporter,
+)
+
+
+class Command(BaseCommand):
+    help = 'Import tracks, with their likes, from NDJSON or CSV'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', help='file to read, or - for stdin')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='defaults to the extension of the file, or ndjson',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='number of rows written per transaction',
+        )
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help='create the unknown users, without a usable password',
+        )
+
+    def handle(
+        self,
+        *args: Any,
+        path: str,
+        format: Optional[str],
+        chunk_size: int,
+        create_users: bool,
+        **options: Any,
+    ) -> None:
+        if format is None:
+            format = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+        importer: TrackImporter = TrackImporter(create_users, chunk_size)
+        start: float = time.perf_counter()
+
+        def progress(stats: ImportStats) -> None:
+            elapsed: float = time.perf_counter() - start
+            self.stderr.write(
+                f'{stats.rows} rows, {stats.rows / elapsed:.0f} rows/s'
+            )
+
+        file: IO[str]
+        if path == '-':
+            stats: ImportStats = importer.run(
+                READERS[format](sys.stdin), progress
+            )
+        else:
+            with open(path, newline='') as file:
+                stats = importer.run(READERS[format](file), progress)
+        error: RowError
+        for error in sorted(stats.errors):
+            self.stderr.write(f'line {error.line}: {error.message}')
+        elapsed: float = time.perf_counter() - start
+        self.stdout.write(
+            f'{stats.tracks} tracks created, {stats.duplicates} duplicates, '
+            f'{stats.likes} likes, {len(stats.errors)} errors '
+            f'in {elapsed:.1f}s ({stats.rows / elapsed:.0f} rows/s)'
+        )
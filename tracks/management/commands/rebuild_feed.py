@@ -0,0 +1,26 @@
+from typing import Any
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Max
+from tracks import feed
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized feed of every user'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='number of user ids rebuilt per transaction',
+        )
+
+    def handle(self, *args: Any, batch_size: int, **options: Any) -> None:
+        last_id: int = get_user_model().objects.aggregate(last_id=Max('id'))[
+            'last_id'
+        ]
+        added: int = 0
+        for start in range(0, (last_id or 0) + 1, batch_size):
+            added += feed.rebuild(start, start + batch_size)
+        self.stdout.write(f'Rebuilt feeds with {added} entries')
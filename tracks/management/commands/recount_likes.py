@@ -0,0 +1,29 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.db.models import Max
+from app.response_cache import invalidate
+from tracks.models import Track
+
+
+class Command(BaseCommand):
+    help = 'Recompute Track.like_count from the Like table'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='number of track ids updated per transaction',
+        )
+
+    def handle(self, *args: Any, batch_size: int, **options: Any) -> None:
+        last_id: int = Track.objects.aggregate(last_id=Max('id'))['last_id']
+        updated: int = 0
+        for start in range(0, (last_id or 0) + 1, batch_size):
+            with transaction.atomic():
+                updated += Track.objects.filter(
+                    id__gte=start, id__lt=start + batch_size
+                ).refresh_like_counts()
+        invalidate(Track)
+        self.stdout.write(f'Recounted likes of {updated} tracks')
@@ -0,0 +1,21 @@
+from django.db import migrations
+from tracks import fts
+
+
+def create_fts(apps, schema_editor):
+    fts.create_index(schema_editor)
+
+
+def drop_fts(apps, schema_editor):
+    fts.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0004_auto_20200902_1104'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
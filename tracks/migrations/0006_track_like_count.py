@@ -0,0 +1,47 @@
+# Generated by Django 3.1.1 on 2026-10-18 07:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from tracks import fts
+
+
+def count_likes(apps, schema_editor):
+    Like = apps.get_model('tracks', 'Like')
+    Track = apps.get_model('tracks', 'Track')
+    likes = (
+        Like.objects.filter(track=OuterRef('pk'))
+        .order_by()
+        .values('track')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Track.objects.update(like_count=Coalesce(Subquery(likes), 0))
+
+
+def install_fts_triggers(apps, schema_editor):
+    # Adding the column rebuilt tracks_track, dropping the FTS5 triggers
+    fts.install_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0005_track_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(
+                fields=['-like_count', '-id'], name='track_like_count_idx'
+            ),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+        migrations.RunPython(install_fts_triggers, migrations.RunPython.noop),
+    ]
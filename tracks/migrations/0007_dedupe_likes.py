@@ -0,0 +1,58 @@
+from django.db import migrations, transaction
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def dedupe_likes(apps, schema_editor):
+    '''Keep the oldest like of each (user, track), a batch at a time'''
+    Like = apps.get_model('tracks', 'Like')
+    Track = apps.get_model('tracks', 'Track')
+    while True:
+        with transaction.atomic():
+            groups = list(
+                Like.objects.values('user_id', 'track_id')
+                .annotate(count=Count('id'), keep=Min('id'))
+                .filter(count__gt=1)
+                .order_by('user_id', 'track_id')[:BATCH_SIZE]
+            )
+            if not groups:
+                return
+            keep = {
+                (group['user_id'], group['track_id']): group['keep']
+                for group in groups
+            }
+            duplicates = [
+                pk
+                for pk, user_id, track_id in Like.objects.filter(
+                    user_id__in={user_id for user_id, _ in keep},
+                    track_id__in={track_id for _, track_id in keep},
+                ).values_list('id', 'user_id', 'track_id')
+                if keep.get((user_id, track_id), pk) != pk
+            ]
+            Like.objects.filter(pk__in=duplicates).delete()
+            likes = (
+                Like.objects.filter(track=OuterRef('pk'))
+                .order_by()
+                .values('track')
+                .annotate(count=Count('pk'))
+                .values('count')
+            )
+            Track.objects.filter(
+                pk__in={track_id for _, track_id in keep}
+            ).update(like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own, so that large tables are not locked
+    # for the whole deduplication
+    atomic = False
+
+    dependencies = [
+        ('tracks', '0006_track_like_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_likes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.1 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0007_dedupe_likes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(
+                fields=['created_at', 'id'], name='track_created_at_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(
+                fields=['posted_by', 'created_at'],
+                name='track_posted_by_created_idx',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'track'), name='like_user_track_unique'
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.1 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0008_like_unique_track_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['url'], name='track_url_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.1.1 on 2026-10-18 08:11
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_created_at(apps, schema_editor):
+    '''Date the existing likes as their track, not as this migration
+
+    Otherwise every past like would count as brand new in the first
+    trending run.
+    '''
+    Like = apps.get_model('tracks', 'Like')
+    Track = apps.get_model('tracks', 'Track')
+    Like.objects.update(
+        created_at=Subquery(
+            Track.objects.filter(pk=OuterRef('track')).values('created_at')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0010_follow_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField()),
+                ('last_like_id', models.BigIntegerField()),
+                ('track_ids', models.BinaryField()),
+                ('scores', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingTrack',
+            fields=[
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='tracks.track')),
+                ('rank', models.PositiveIntegerField(unique=True)),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,25 @@
-from django.db import models
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Set, Tuple
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import User
+from app.response_cache import invalidate
+
+
+class TrackQuerySet(models.QuerySet):
+    def refresh_like_counts(self) -> int:
+        '''Recompute like_count from the Like table for these tracks'''
+        likes = (
+            Like.objects.filter(track=OuterRef('pk'))
+            .order_by()
+            .values('track')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return self.update(like_count=Coalesce(Subquery(likes), 0))
 
 
 class Track(models.Model):
@@ -10,6 +30,99 @@ class Track(models.Model):
     posted_by: models.ForeignKey = models.ForeignKey(
         get_user_model(), null=True, on_delete=models.CASCADE
     )
+    like_count: models.PositiveIntegerField = models.PositiveIntegerField(
+        default=0, editable=False
+    )
+
+    objects: TrackQuerySet = TrackQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-like_count', '-id'], name='track_like_count_idx'
+            ),
+            models.Index(
+                fields=['created_at', 'id'], name='track_created_at_idx'
+            ),
+            models.Index(
+                fields=['posted_by', 'created_at'],
+                name='track_posted_by_created_idx',
+            ),
+            models.Index(fields=['url'], name='track_url_idx'),
+        ]
+
+
+def validate_track(**values: Any) -> None:
+    '''Run the validators of the given Track fields, without any query'''
+    errors: Dict[str, List[str]] = {}
+    for name, value in values.items():
+        try:
+            Track._meta.get_field(name).run_validators(value)
+        except ValidationError as error:
+            errors[name] = error.messages
+    if errors:
+        raise ValidationError(errors)
+
+
+class LikeManager(models.Manager):
+    def add(self, user: User, track: Track) -> Tuple[Like, bool]:
+        '''Like the track once, bumping its counter only on a new like
+
+        The unique constraint settles concurrent likes of the same track by
+        the same user: only the INSERT that succeeds bumps the counter.
+        Returns the like, and whether it was inserted.
+        '''
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    like: Like = self.create(user=user, track=track)
+            except IntegrityError:
+                return self.get(user=user, track=track), False
+            Track.objects.filter(pk=track.pk).update(
+                like_count=F('like_count') + 1
+            )
+        return like, True
+
+    def add_many(self, user: User, tracks: Iterable[Track]) -> List[Like]:
+        '''Like every track in one transaction, then recount the tracks
+
+        Tracks the user already likes are skipped. As in add(), the unique
+        constraint settles concurrent likes: each like is inserted in a
+        savepoint, and only those whose INSERT succeeds are new. Returns
+        the new likes.
+        '''
+        tracks = list(tracks)
+        likes: List[Like] = []
+        with transaction.atomic():
+            liked: Set[int] = set(
+                self.filter(user=user, track__in=tracks).values_list(
+                    'track', flat=True
+                )
+            )
+            for track in {track.pk: track for track in tracks}.values():
+                if track.pk in liked:
+                    continue
+                try:
+                    with transaction.atomic():
+                        likes.append(self.create(user=user, track=track))
+                except IntegrityError:
+                    pass
+            Track.objects.filter(
+                pk__in={like.track_id for like in likes}
+            ).refresh_like_counts()
+        invalidate(Like)
+        return likes
+
+    def remove(self, user: User, track: Track) -> int:
+        '''Delete the user's likes of the track, keeping the counter exact'''
+        with transaction.atomic():
+            deleted: int
+            deleted, _ = self.filter(user=user, track=track).delete()
+            if deleted:
+                Track.objects.filter(pk=track.pk).update(
+                    like_count=F('like_count') - deleted
+                )
+        return deleted
 
 
 class Like(models.Model):
@@ -19,3 +132,93 @@ class Like(models.Model):
     track: models.ForeignKey = models.ForeignKey(
         Track, related_name='likes', on_delete=models.CASCADE
     )
+    created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
+
+    objects: LikeManager = LikeManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'track'], name='like_user_track_unique'
+            ),
+        ]
+
+
+class Follow(models.Model):
+    follower: models.ForeignKey = models.ForeignKey(
+        get_user_model(), related_name='following', on_delete=models.CASCADE
+    )
+    followed: models.ForeignKey = models.ForeignKey(
+        get_user_model(), related_name='followers', on_delete=models.CASCADE
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'followed'], name='follow_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['followed', 'follower'], name='follow_followed_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    '''A track in the feed of a user, materialized by tracks.feed
+
+    `created_at` copies the time of the post or like that added the track
+    to the feed, so that a page of the feed is read from the
+    (user, created_at) index alone.
+    '''
+
+    user: models.ForeignKey = models.ForeignKey(
+        get_user_model(), related_name='feed', on_delete=models.CASCADE
+    )
+    track: models.ForeignKey = models.ForeignKey(
+        Track, related_name='feed_entries', on_delete=models.CASCADE
+    )
+    created_at: models.DateTimeField = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'track'], name='feed_entry_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-track'],
+                name='feed_entry_user_created_idx',
+            ),
+        ]
+
+
+class TrendingTrack(models.Model):
+    '''A track of the trending top, ranked by tracks.trending'''
+
+    track: models.OneToOneField = models.OneToOneField(
+        Track,
+        primary_key=True,
+        related_name='trending',
+        on_delete=models.CASCADE,
+    )
+    rank: models.PositiveIntegerField = models.PositiveIntegerField(
+        unique=True
+    )
+    score: models.FloatField = models.FloatField()
+
+
+class TrendingState(models.Model):
+    '''Where tracks.trending left off, in a single row
+
+    `track_ids` (int64, sorted) and `scores` (float64) hold the decayed
+    scores at `computed_at` of the tracks scored, and `last_like_id` the
+    last like added.
+    '''
+
+    computed_at: models.DateTimeField = models.DateTimeField()
+    last_like_id: models.BigIntegerField = models.BigIntegerField()
+    track_ids: models.BinaryField = models.BinaryField()
+    scores: models.BinaryField = models.BinaryField()
@@ -1,23 +1,51 @@
 from __future__ import annotations
-from typing import Optional
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
-from django.db.models import Q
-from django.db.models.manager import BaseManager
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch, Q, QuerySet
 from graphql import GraphQLError
 from graphql.execution.base import ExecutionResult, ResolveInfo
 from graphene_django import DjangoObjectType
+from promise import Promise
 import graphene
-from tracks.models import Like, Track
+from app.optimizer import is_loaded, optimize
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from app.pubsub import publish
+from app.response_cache import invalidate
+from tracks import feed, write_behind
+from tracks.loaders import get_loaders
+from tracks.models import FeedEntry, Like, Track, validate_track
+from tracks.search import SearchBackend, get_search_backend
 from users.schema import UserType
 
+MAX_BATCH_SIZE: int = 100
+TRACK_CREATED: str = 'track_created'
+TRACK_LIKED: str = 'track_liked'
+
 
 class TrackType(DjangoObjectType):
+    likes: graphene.List = graphene.List(
+        graphene.NonNull(lambda: LikeType), required=True
+    )
+
     class Meta:
         model: type = Track
         description: str = (
             'The documentation for the TrackType in GraphQL goes here'
         )
 
+    def resolve_posted_by(self, info: ResolveInfo) -> Promise[Optional[User]]:
+        if self.posted_by_id is None or is_loaded(self, 'posted_by'):
+            return Promise.resolve(self.posted_by)
+        return get_loaders(info.context).user.load(self.posted_by_id)
+
+    def resolve_likes(self, info: ResolveInfo) -> Promise[List[Like]]:
+        if is_loaded(self, 'likes'):
+            return Promise.resolve(list(self.likes.all()))
+        return get_loaders(info.context).likes_by_track.load(self.pk)
+
 
 class LikeType(DjangoObjectType):
     class Meta:
@@ -26,26 +54,132 @@ class LikeType(DjangoObjectType):
             'The documentation for the LikeType in GraphQL goes here'
         )
 
+    def resolve_user(self, info: ResolveInfo) -> Promise[User]:
+        if is_loaded(self, 'user'):
+            return Promise.resolve(self.user)
+        return get_loaders(info.context).user.load(self.user_id)
+
+    def resolve_track(self, info: ResolveInfo) -> Promise[Track]:
+        if is_loaded(self, 'track'):
+            return Promise.resolve(self.track)
+        return get_loaders(info.context).track.load(self.track_id)
+
+
+class TrackConnection(graphene.relay.Connection):
+    class Meta:
+        node: type = TrackType
+
+
+class LikeConnection(graphene.relay.Connection):
+    class Meta:
+        node: type = LikeType
+
 
 class Query(graphene.ObjectType):
-    tracks: graphene.List = graphene.List(TrackType, search=graphene.String())
-    likes: graphene.List = graphene.List(LikeType)
+    tracks: graphene.Field = graphene.Field(
+        TrackConnection,
+        search=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+    likes: graphene.Field = graphene.Field(
+        LikeConnection, first=graphene.Int(), after=graphene.String()
+    )
     track: graphene.Field = graphene.Field(TrackType, track_id=graphene.Int())
+    top_tracks: graphene.List = graphene.List(
+        graphene.NonNull(TrackType), first=graphene.Int()
+    )
+    trending_tracks: graphene.List = graphene.List(
+        graphene.NonNull(TrackType),
+        first=graphene.Int(),
+        description='tracks ranked on their likes weighted by recency, as '
+        'of the last run of compute_trending',
+    )
+    feed: graphene.Field = graphene.Field(
+        TrackConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        description='tracks posted or liked by the followed users, newest '
+        'first',
+    )
 
     def resolve_tracks(
-        self, info: ResolveInfo, search: Optional[str] = None
-    ) -> BaseManager[Track]:
+        self,
+        info: ResolveInfo,
+        search: Optional[str] = None,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> TrackConnection:
+        ordering: Tuple[str, ...] = ('created_at', 'id')
+        tracks: QuerySet[Track] = optimize(
+            Track.objects.all(), info, ('edges', 'node'), ordering
+        )
         if search is not None:
-            return Track.objects.filter(
-                Q(title__icontains=search) | Q(description__icontains=search)
-            )
-        return Track.objects.all()
+            backend: SearchBackend = get_search_backend()
+            tracks = backend.search(tracks, search)
+            ordering = backend.ordering
+        return paginate(tracks, TrackConnection, ordering, first, after)
 
-    def resolve_likes(self, info: ResolveInfo) -> BaseManager[Like]:
-        return Like.objects.all()
+    def resolve_likes(
+        self,
+        info: ResolveInfo,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> LikeConnection:
+        likes: QuerySet[Like] = optimize(
+            Like.objects.all(), info, ('edges', 'node')
+        )
+        return paginate(likes, LikeConnection, ('id',), first, after)
 
     def resolve_track(self, info: ResolveInfo, track_id: int) -> Track:
-        return Track.objects.get(pk=track_id)
+        return optimize(Track.objects.all(), info).get(pk=track_id)
+
+    def resolve_top_tracks(
+        self, info: ResolveInfo, first: int = DEFAULT_PAGE_SIZE
+    ) -> QuerySet[Track]:
+        if first < 0:
+            raise GraphQLError('`first` must be a positive integer')
+        return optimize(Track.objects.all(), info).order_by(
+            '-like_count', '-id'
+        )[: min(first, MAX_PAGE_SIZE)]
+
+    def resolve_trending_tracks(
+        self, info: ResolveInfo, first: int = DEFAULT_PAGE_SIZE
+    ) -> QuerySet[Track]:
+        if first < 0:
+            raise GraphQLError('`first` must be a positive integer')
+        return (
+            optimize(Track.objects.all(), info)
+            .filter(trending__isnull=False)
+            .order_by('trending__rank')[: min(first, MAX_PAGE_SIZE)]
+        )
+
+    def resolve_feed(
+        self,
+        info: ResolveInfo,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> TrackConnection:
+        if info.context is not None:
+            user: User = info.context.user
+        if user.is_anonymous:
+            raise GraphQLError('Anonymous user not allowed')
+        entries: QuerySet[FeedEntry] = (
+            FeedEntry.objects.filter(user=user)
+            .only('track', 'created_at')
+            .prefetch_related(
+                Prefetch(
+                    'track',
+                    optimize(Track.objects.all(), info, ('edges', 'node')),
+                )
+            )
+        )
+        connection: TrackConnection = paginate(
+            entries, TrackConnection, feed.ORDERING, first, after
+        )
+        for edge in connection.edges:
+            edge.node = edge.node.track
+        return connection
 
 
 class CreateTrack(graphene.Mutation):
@@ -67,9 +201,14 @@ class CreateTrack(graphene.Mutation):
         if user.is_anonymous:
             raise GraphQLError('Anonymous user not allowed to add tracks')
         track: Track
-        track, _ = Track.objects.get_or_create(
-            title=title, description=description, url=url, posted_by=user
-        )
+        created: bool
+        with transaction.atomic():
+            track, created = Track.objects.get_or_create(
+                title=title, description=description, url=url, posted_by=user
+            )
+            if created:
+                feed.add_tracks([track])
+                publish(TRACK_CREATED, {'track_id': track.pk})
         return CreateTrack(track=track)
 
 
@@ -131,12 +270,266 @@ class CreateLike(graphene.Mutation):
         if user.is_anonymous:
             raise GraphQLError('Anonymous user not allowed to like tracks')
         track: Track = Track.objects.get(pk=track_id)
-        Like.objects.create(user=user, track=track)
+        if write_behind.get_config().get('ENABLED', False):
+            # likeCount does not count the like until it is flushed
+            if not write_behind.get_like_buffer().put(user.pk, track.pk):
+                raise GraphQLError('Too many pending likes, retry later')
+            return CreateLike(user=user, track=track)
+        created: bool
+        with transaction.atomic():
+            _, created = Like.objects.add(user, track)
+            track.refresh_from_db(fields=['like_count'])
+            if created:
+                feed.add_likes(user, [track])
+                publish(
+                    f'{TRACK_LIKED}.{track.pk}',
+                    {'track_id': track.pk, 'user_id': user.pk},
+                )
         return CreateLike(user=user, track=track)
 
 
+class TrackInput(graphene.InputObjectType):
+    title = graphene.String(required=True)
+    description = graphene.String(required=True)
+    url = graphene.String(required=True)
+
+
+class BatchError(graphene.ObjectType):
+    index: graphene.Int = graphene.Int(
+        required=True, description='position of the failed item in the input'
+    )
+    message: graphene.String = graphene.String(required=True)
+
+
+def check_batch_size(items: Sequence[Any]) -> None:
+    if len(items) > MAX_BATCH_SIZE:
+        raise GraphQLError(
+            f'Batches are limited to {MAX_BATCH_SIZE} items, got {len(items)}'
+        )
+
+
+class CreateTracks(graphene.Mutation):
+    tracks: graphene.List = graphene.List(
+        TrackType, required=True, description='the tracks, in input order'
+    )
+    errors: graphene.List = graphene.List(
+        graphene.NonNull(BatchError), required=True
+    )
+
+    class Arguments:
+        tracks = graphene.List(graphene.NonNull(TrackInput), required=True)
+
+    class Meta:
+        description: str = 'Create several tracks in one transaction'
+
+    def mutate(
+        self, info: ResolveInfo, tracks: List[TrackInput]
+    ) -> CreateTracks:
+        if info.context is not None:
+            user: User = info.context.user
+        if user.is_anonymous:
+            raise GraphQLError('Anonymous user not allowed to add tracks')
+        check_batch_size(tracks)
+        errors: List[BatchError] = []
+        keys: List[Optional[Tuple[str, str, str]]] = []
+        for index, data in enumerate(tracks):
+            key: Tuple[str, str, str] = (
+                data.title,
+                data.description,
+                data.url,
+            )
+            try:
+                validate_track(
+                    title=data.title,
+                    description=data.description,
+                    url=data.url,
+                )
+            except ValidationError as error:
+                errors.append(
+                    BatchError(
+                        index=index,
+                        message=' '.join(
+                            f'{field}: {" ".join(messages)}'
+                            for field, messages in error.message_dict.items()
+                        ),
+                    )
+                )
+                keys.append(None)
+            else:
+                keys.append(key)
+        valid: Set[Tuple[str, str, str]] = {key for key in keys if key}
+        with transaction.atomic():
+            existing: Dict[Tuple[str, str, str], Track] = _get_tracks(
+                user, valid
+            )
+            missing: Set[Tuple[str, str, str]] = valid - existing.keys()
+            if missing:
+                Track.objects.bulk_create(
+                    Track(
+                        title=title,
+                        description=description,
+                        url=url,
+                        posted_by=user,
+                    )
+                    for title, description, url in missing
+                )
+                existing = _get_tracks(user, valid)
+                created: List[Track] = [
+                    existing[key] for key in missing if key in existing
+                ]
+                feed.add_tracks(created)
+                for track in created:
+                    publish(TRACK_CREATED, {'track_id': track.pk})
+        invalidate(Track)
+        return CreateTracks(
+            tracks=[existing[key] if key else None for key in keys],
+            errors=errors,
+        )
+
+
+def _get_tracks(
+    user: User, keys: Set[Tuple[str, str, str]]
+) -> Dict[Tuple[str, str, str], Track]:
+    if not keys:
+        return {}
+    condition: Q = Q()
+    for title, description, url in keys:
+        condition |= Q(title=title, description=description, url=url)
+    return {
+        (track.title, track.description, track.url): track
+        for track in Track.objects.filter(condition, posted_by=user)
+    }
+
+
+class CreateLikes(graphene.Mutation):
+    user: graphene.Field = graphene.Field(UserType)
+    tracks: graphene.List = graphene.List(
+        TrackType,
+        required=True,
+        description='the liked tracks, in input order',
+    )
+    errors: graphene.List = graphene.List(
+        graphene.NonNull(BatchError), required=True
+    )
+
+    class Arguments:
+        track_ids = graphene.List(
+            graphene.NonNull(graphene.Int), required=True
+        )
+
+    class Meta:
+        description: str = 'Like several tracks in one transaction'
+
+    def mutate(self, info: ResolveInfo, track_ids: List[int]) -> CreateLikes:
+        if info.context is not None:
+            user: User = info.context.user
+        if user.is_anonymous:
+            raise GraphQLError('Anonymous user not allowed to like tracks')
+        check_batch_size(track_ids)
+        tracks: Dict[int, Track] = Track.objects.in_bulk(track_ids)
+        errors: List[BatchError] = [
+            BatchError(index=index, message=f'Track {track_id} does not exist')
+            for index, track_id in enumerate(track_ids)
+            if track_id not in tracks
+        ]
+        liked: List[Track] = [
+            tracks[track_id] for track_id in track_ids if track_id in tracks
+        ]
+        with transaction.atomic():
+            new: List[Like] = Like.objects.add_many(user, liked)
+            feed.add_likes(user, [like.track for like in new])
+            for like in new:
+                publish(
+                    f'{TRACK_LIKED}.{like.track_id}',
+                    {'track_id': like.track_id, 'user_id': user.pk},
+                )
+        tracks = Track.objects.in_bulk(tracks.keys())
+        return CreateLikes(
+            user=user,
+            tracks=[tracks.get(track_id) for track_id in track_ids],
+            errors=errors,
+        )
+
+
+class FollowUser(graphene.Mutation):
+    user: graphene.Field = graphene.Field(UserType)
+
+    class Arguments:
+        user_id = graphene.Int(required=True)
+
+    class Meta:
+        description: str = (
+            'Add the tracks of a user, and their likes, to the feed'
+        )
+
+    def mutate(self, info: ResolveInfo, user_id: int) -> FollowUser:
+        if info.context is not None:
+            user: User = info.context.user
+        if user.is_anonymous:
+            raise GraphQLError('Anonymous user not allowed to follow users')
+        followed: User = get_user_model().objects.get(pk=user_id)
+        if followed == user:
+            raise GraphQLError('Users cannot follow themselves')
+        feed.follow(user, followed)
+        return FollowUser(user=followed)
+
+
+class UnfollowUser(graphene.Mutation):
+    user: graphene.Field = graphene.Field(UserType)
+
+    class Arguments:
+        user_id = graphene.Int(required=True)
+
+    def mutate(self, info: ResolveInfo, user_id: int) -> UnfollowUser:
+        if info.context is not None:
+            user: User = info.context.user
+        if user.is_anonymous:
+            raise GraphQLError('Anonymous user not allowed to follow users')
+        followed: User = get_user_model().objects.get(pk=user_id)
+        feed.unfollow(user, followed)
+        return UnfollowUser(user=followed)
+
+
 class Mutation(graphene.ObjectType):
     create_track: graphene.Field = CreateTrack.Field()
     update_track: graphene.Field = UpdateTrack.Field()
     delete_track: graphene.Field = DeleteTrack.Field()
-    create_like: graphene.Field = CreateLike.Field()
\ No newline at end of file
+    create_like: graphene.Field = CreateLike.Field()
+    create_tracks: graphene.Field = CreateTracks.Field()
+    create_likes: graphene.Field = CreateLikes.Field()
+    follow_user: graphene.Field = FollowUser.Field()
+    unfollow_user: graphene.Field = UnfollowUser.Field()
+
+
+class Subscription(graphene.ObjectType):
+    '''Executed on every published event, the event payload being the root
+
+    `subscribe_<field>(**args)` names the channel a subscription listens to.
+    '''
+
+    track_created: graphene.Field = graphene.Field(
+        TrackType, description='every track created from now on'
+    )
+    track_liked: graphene.Field = graphene.Field(
+        TrackType,
+        track_id=graphene.Int(required=True),
+        description='the track, each time it gets a new like',
+    )
+
+    @staticmethod
+    def subscribe_track_created() -> str:
+        return TRACK_CREATED
+
+    @staticmethod
+    def subscribe_track_liked(track_id: int) -> str:
+        return f'{TRACK_LIKED}.{track_id}'
+
+    def resolve_track_created(
+        self: Dict[str, Any], info: ResolveInfo
+    ) -> Promise[Optional[Track]]:
+        return get_loaders(info.context).track.load(self['track_id'])
+
+    def resolve_track_liked(
+        self: Dict[str, Any], info: ResolveInfo, track_id: int
+    ) -> Promise[Optional[Track]]:
+        return get_loaders(info.context).track.load(self['track_id'])
@@ -0,0 +1,80 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import ClassVar, List, Tuple
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from tracks import fts
+
+
+class SearchBackend:
+    '''Filters a Track queryset on a search string
+
+    `ordering` is the keyset the matches are paginated on, best match
+    first.
+    '''
+
+    ordering: ClassVar[Tuple[str, ...]] = ('created_at', 'id')
+
+    def search(self, queryset: QuerySet, search: str) -> QuerySet:
+        raise NotImplementedError
+
+
+class ContainsSearchBackend(SearchBackend):
+    '''Substring match on title and description, portable but unindexed'''
+
+    def search(self, queryset: QuerySet, search: str) -> QuerySet:
+        return queryset.filter(
+            Q(title__icontains=search) | Q(description__icontains=search)
+        )
+
+
+class FTS5SearchBackend(SearchBackend):
+    '''SQLite FTS5 match on the index kept by the tracks_track_fts triggers
+
+    Every word of the search is prefix-matched, and results are ranked on
+    bm25 (lower is better).
+    '''
+
+    ordering: ClassVar[Tuple[str, ...]] = ('search_rank', 'id')
+    table: ClassVar[str] = fts.TABLE
+
+    @staticmethod
+    def to_match_expression(search: str) -> str:
+        words: List[str] = re.findall(r'\w+', search)
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def search(self, queryset: QuerySet, search: str) -> QuerySet:
+        expression: str = self.to_match_expression(search)
+        if not expression:
+            return queryset.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            )
+        table: str = connection.ops.quote_name(self.table)
+        track_table: str = connection.ops.quote_name(
+            queryset.model._meta.db_table
+        )
+        return queryset.annotate(
+            search_rank=RawSQL(f'bm25({table})', (), FloatField())
+        ).extra(
+            tables=[self.table],
+            where=[f'{table}.rowid = {track_table}.id', f'{table} MATCH %s'],
+            params=[expression],
+        )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> SearchBackend:
+    '''Return the configured backend, FTS5 when its index is available'''
+    path: str = getattr(settings, 'TRACKS_SEARCH_BACKEND', '')
+    if path:
+        return import_string(path)()
+    if (
+        connection.vendor == 'sqlite'
+        and FTS5SearchBackend.table in connection.introspection.table_names()
+    ):
+        return FTS5SearchBackend()
+    return ContainsSearchBackend()
@@ -1,3 +1,950 @@
-from django.test import TestCase
+from __future__ import annotations
+from datetime import timedelta
+from io import StringIO
+import json
+import tempfile
+from typing import Any, Dict, List, Optional
+from unittest import mock
+import asyncio
+from asgiref.sync import async_to_sync
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token
+from promise import Promise
+from promise.dataloader import DataLoader
+from app.auth import get_token_cache
+from app.pagination import DEFAULT_PAGE_SIZE
+from app.tracing import get_metrics
+from tracks.importer import ImportStats, TrackImporter
+from tracks.loaders import Loaders
+from tracks import trending
+from tracks.models import (
+    FeedEntry,
+    Follow,
+    Like,
+    LikeManager,
+    Track,
+    TrendingState,
+    TrendingTrack,
+)
+from tracks.schema import MAX_BATCH_SIZE, TRACK_CREATED, TRACK_LIKED
+from tracks.write_behind import LikeBuffer
 
-# Create your tests here.
+
+class GraphQLTestCase(TestCase):
+    def setUp(self) -> None:
+        self.headers: Dict[str, str] = {}
+        caches['graphql'].clear()
+        caches['default'].clear()
+        get_token_cache.cache_clear()
+
+    def login(self, user: User) -> None:
+        self.headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+
+    def query(self, query: str, **variables: Any) -> Dict[str, Any]:
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json',
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        content: Dict[str, Any] = response.json()
+        self.assertNotIn('errors', content)
+        return content['data']
+
+    def create_tracks(self, count: int) -> List[Track]:
+        users: List[User] = [
+            get_user_model().objects.create(username=f'user{i}')
+            for i in range(3)
+        ]
+        tracks: List[Track] = []
+        for i in range(count):
+            track: Track = Track.objects.create(
+                title=f'title {i}',
+                description=f'description {i}',
+                url='http://example.com',
+                posted_by=users[i % len(users)],
+            )
+            for user in users[: i % len(users) + 1]:
+                Like.objects.add(user, track)
+            tracks.append(track)
+        return tracks
+
+
+class QueryCountTest(GraphQLTestCase):
+    QUERY: str = '''
+        query {
+            tracks {
+                edges {
+                    node {
+                        title
+                        postedBy { username }
+                        likes { user { username } track { id } }
+                    }
+                }
+            }
+        }
+    '''
+
+    def test_query_count_does_not_depend_on_track_count(self) -> None:
+        for count in (2, 10):
+            with self.subTest(count=count):
+                Track.objects.all().delete()
+                get_user_model().objects.all().delete()
+                self.create_tracks(count)
+                with self.assertNumQueries(2):
+                    data: Dict[str, Any] = self.query(self.QUERY)
+                self.assertEqual(len(data['tracks']['edges']), count)
+
+    def test_relations_are_resolved(self) -> None:
+        tracks: List[Track] = self.create_tracks(3)
+        data: Dict[str, Any] = self.query(self.QUERY)
+        for track, edge in zip(tracks, data['tracks']['edges']):
+            result: Dict[str, Any] = edge['node']
+            self.assertEqual(
+                result['postedBy']['username'], track.posted_by.username
+            )
+            self.assertEqual(
+                [like['user']['username'] for like in result['likes']],
+                [like.user.username for like in track.likes.order_by('pk')],
+            )
+            self.assertTrue(
+                all(
+                    int(like['track']['id']) == track.pk
+                    for like in result['likes']
+                )
+            )
+
+
+class DataLoaderTest(GraphQLTestCase):
+    def load_all(self, loader: DataLoader, keys: List[int]) -> List[Any]:
+        return (
+            Promise.resolve(None)
+            .then(lambda _: Promise.all([loader.load(key) for key in keys]))
+            .get()
+        )
+
+    def test_loads_are_batched(self) -> None:
+        tracks: List[Track] = self.create_tracks(5)
+        loaders: Loaders = Loaders()
+        with self.assertNumQueries(2):
+            likes: List[List[Like]] = self.load_all(
+                loaders.likes_by_track, [track.pk for track in tracks]
+            )
+            users: List[User] = self.load_all(
+                loaders.user, [track.posted_by_id for track in tracks]
+            )
+        self.assertEqual(
+            [len(track_likes) for track_likes in likes], [1, 2, 3, 1, 2]
+        )
+        self.assertEqual(users, [track.posted_by for track in tracks])
+
+
+class OptimizerTest(GraphQLTestCase):
+    def test_unrequested_columns_are_not_loaded(self) -> None:
+        self.create_tracks(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.query(
+                'query { tracks { edges { node {'
+                ' title postedBy { username } } } } }'
+            )
+            self.query('query { users { edges { node { username } } } }')
+        sql: str = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('description', sql)
+        self.assertNotIn('password', sql)
+        self.assertEqual(len(queries), 2)
+
+
+class PaginationTest(GraphQLTestCase):
+    QUERY: str = '''
+        query($first: Int, $after: String) {
+            tracks(first: $first, after: $after) {
+                edges { cursor node { id } }
+                pageInfo { hasNextPage hasPreviousPage endCursor }
+            }
+        }
+    '''
+
+    def test_pages_cover_every_track_once(self) -> None:
+        tracks: List[Track] = self.create_tracks(25)
+        ids: List[int] = []
+        after: Optional[str] = None
+        with CaptureQueriesContext(connection) as queries:
+            while True:
+                page: Dict[str, Any] = self.query(
+                    self.QUERY, first=10, after=after
+                )['tracks']
+                ids.extend(int(edge['node']['id']) for edge in page['edges'])
+                self.assertEqual(
+                    page['pageInfo']['hasPreviousPage'], after is not None
+                )
+                if not page['pageInfo']['hasNextPage']:
+                    break
+                after = page['pageInfo']['endCursor']
+        self.assertEqual(ids, [track.pk for track in tracks])
+        self.assertFalse(
+            any('OFFSET' in query['sql'].upper() for query in queries)
+        )
+
+    def test_default_page_size_is_capped(self) -> None:
+        self.create_tracks(DEFAULT_PAGE_SIZE + 5)
+        page: Dict[str, Any] = self.query(self.QUERY)['tracks']
+        self.assertEqual(len(page['edges']), DEFAULT_PAGE_SIZE)
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+
+    def test_invalid_cursor_is_rejected(self) -> None:
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': self.QUERY, 'variables': {'after': 'nope'}}),
+            content_type='application/json',
+        )
+        self.assertEqual(
+            response.json()['errors'][0]['message'], 'Invalid cursor'
+        )
+
+
+class SearchTest(GraphQLTestCase):
+    QUERY: str = '''
+        query($search: String) {
+            tracks(search: $search) { edges { node { title } } }
+        }
+    '''
+
+    def search(self, search: str) -> List[str]:
+        return [
+            edge['node']['title']
+            for edge in self.query(self.QUERY, search=search)['tracks'][
+                'edges'
+            ]
+        ]
+
+    def test_prefix_matches_are_ranked(self) -> None:
+        Track.objects.create(
+            title='Blue', description='a song about the sea', url='http://a'
+        )
+        Track.objects.create(
+            title='Sea of seas', description='the sea, the sea', url='http://b'
+        )
+        Track.objects.create(
+            title='Mountains', description='no water here', url='http://c'
+        )
+        self.assertEqual(self.search('se'), ['Sea of seas', 'Blue'])
+        self.assertEqual(self.search('sea song'), ['Blue'])
+        self.assertEqual(self.search('river'), [])
+
+    def test_index_follows_updates_and_deletes(self) -> None:
+        track: Track = Track.objects.create(
+            title='Old name', description='', url='http://a'
+        )
+        track.title = 'New name'
+        track.save()
+        self.assertEqual(self.search('old'), [])
+        self.assertEqual(self.search('new'), ['New name'])
+        track.delete()
+        self.assertEqual(self.search('new'), [])
+
+    def test_matches_can_be_paginated(self) -> None:
+        self.create_tracks(7)
+        titles: List[str] = []
+        after: Optional[str] = None
+        while True:
+            page: Dict[str, Any] = self.query(
+                '''
+                query($after: String) {
+                    tracks(search: "titl", first: 3, after: $after) {
+                        edges { node { title } }
+                        pageInfo { hasNextPage endCursor }
+                    }
+                }
+                ''',
+                after=after,
+            )['tracks']
+            titles.extend(edge['node']['title'] for edge in page['edges'])
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(sorted(titles), [f'title {i}' for i in range(7)])
+
+
+class LikeCountTest(GraphQLTestCase):
+    def test_create_like_bumps_the_counter(self) -> None:
+        tracks: List[Track] = self.create_tracks(2)
+        track: Track = tracks[0]
+        self.login(tracks[1].posted_by)
+        data: Dict[str, Any] = self.query(
+            '''
+            mutation($trackId: Int!) {
+                createLike(trackId: $trackId) { track { likeCount } }
+            }
+            ''',
+            trackId=track.pk,
+        )
+        self.assertEqual(data['createLike']['track']['likeCount'], 2)
+
+    def test_create_like_is_idempotent(self) -> None:
+        tracks: List[Track] = self.create_tracks(2)
+        track: Track = tracks[0]
+        self.login(tracks[1].posted_by)
+        for _ in range(2):
+            data: Dict[str, Any] = self.query(
+                '''
+                mutation($trackId: Int!) {
+                    createLike(trackId: $trackId) { track { likeCount } }
+                }
+                ''',
+                trackId=track.pk,
+            )
+            self.assertEqual(data['createLike']['track']['likeCount'], 2)
+        self.assertEqual(track.likes.count(), 2)
+
+    def test_top_tracks_are_ordered_by_like_count(self) -> None:
+        tracks: List[Track] = self.create_tracks(3)
+        data: Dict[str, Any] = self.query(
+            'query { topTracks(first: 2) { id likeCount } }'
+        )
+        self.assertEqual(
+            [
+                (int(track['id']), track['likeCount'])
+                for track in data['topTracks']
+            ],
+            [(tracks[2].pk, 3), (tracks[1].pk, 2)],
+        )
+
+    def test_recount_fixes_drift(self) -> None:
+        tracks: List[Track] = self.create_tracks(3)
+        Track.objects.update(like_count=42)
+        call_command('recount_likes', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            list(
+                Track.objects.order_by('pk').values_list(
+                    'like_count', flat=True
+                )
+            ),
+            [track.likes.count() for track in tracks],
+        )
+
+
+class BatchMutationTest(GraphQLTestCase):
+    CREATE_TRACKS: str = '''
+        mutation($tracks: [TrackInput!]!) {
+            createTracks(tracks: $tracks) {
+                tracks { id title }
+                errors { index message }
+            }
+        }
+    '''
+    CREATE_LIKES: str = '''
+        mutation($trackIds: [Int!]!) {
+            createLikes(trackIds: $trackIds) {
+                tracks { id likeCount }
+                errors { index message }
+            }
+        }
+    '''
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user: User = get_user_model().objects.create(username='alice')
+        self.login(self.user)
+
+    def test_create_tracks(self) -> None:
+        existing: Track = Track.objects.create(
+            title='old',
+            description='',
+            url='http://example.com/old',
+            posted_by=self.user,
+        )
+        inputs: List[Dict[str, str]] = [
+            {
+                'title': 'new',
+                'description': '',
+                'url': 'http://example.com/new',
+            },
+            {'title': 'bad', 'description': '', 'url': 'not a url'},
+            {
+                'title': 'old',
+                'description': '',
+                'url': 'http://example.com/old',
+            },
+            {
+                'title': 'new',
+                'description': '',
+                'url': 'http://example.com/new',
+            },
+        ]
+        # Including the INSERT of the new tracks into the feeds
+        with self.assertNumQueries(7), mock.patch(
+            'tracks.schema.publish'
+        ) as publish:
+            result: Dict[str, Any] = self.query(
+                self.CREATE_TRACKS, tracks=inputs
+            )['createTracks']
+        tracks: List[Optional[Dict[str, Any]]] = result['tracks']
+        publish.assert_called_once_with(
+            TRACK_CREATED, {'track_id': int(tracks[0]['id'])}
+        )
+        self.assertEqual(tracks[0], tracks[3])
+        self.assertIsNone(tracks[1])
+        self.assertEqual(int(tracks[2]['id']), existing.pk)
+        self.assertEqual(
+            result['errors'],
+            [{'index': 1, 'message': 'url: Enter a valid URL.'}],
+        )
+        self.assertEqual(Track.objects.count(), 2)
+
+    def test_create_likes(self) -> None:
+        tracks: List[Track] = self.create_tracks(2)
+        track_ids: List[int] = [tracks[0].pk, 0, tracks[1].pk, tracks[0].pk]
+        with mock.patch('tracks.schema.publish') as publish:
+            result: Dict[str, Any] = self.query(
+                self.CREATE_LIKES, trackIds=track_ids
+            )['createLikes']
+            self.query(self.CREATE_LIKES, trackIds=track_ids)
+        self.assertEqual(
+            [call.args[0] for call in publish.call_args_list],
+            [f'{TRACK_LIKED}.{track.pk}' for track in tracks],
+        )
+        self.assertEqual(
+            [track and track['likeCount'] for track in result['tracks']],
+            [2, None, 3, 2],
+        )
+        self.assertEqual(
+            result['errors'],
+            [{'index': 1, 'message': 'Track 0 does not exist'}],
+        )
+
+    def test_concurrent_batch_likes_are_not_published(self) -> None:
+        tracks: List[Track] = self.create_tracks(2)
+        filter: Any = LikeManager.filter
+
+        def filter_concurrently(manager: LikeManager, **lookups: Any) -> Any:
+            if 'track__in' not in lookups:
+                return filter(manager, **lookups)
+            # Another request likes the first track once it was checked
+            manager.bulk_create([Like(user=self.user, track=tracks[0])])
+            return filter(manager, **lookups).exclude(track=tracks[0])
+
+        with mock.patch('tracks.schema.publish') as publish:
+            with mock.patch.object(LikeManager, 'filter', filter_concurrently):
+                self.query(
+                    self.CREATE_LIKES, trackIds=[track.pk for track in tracks]
+                )
+        publish.assert_called_once_with(
+            f'{TRACK_LIKED}.{tracks[1].pk}',
+            {'track_id': tracks[1].pk, 'user_id': self.user.pk},
+        )
+        self.assertEqual(
+            Like.objects.filter(user=self.user, track=tracks[0]).count(), 1
+        )
+
+    def test_repeated_likes_are_not_published(self) -> None:
+        track: Track = self.create_tracks(1)[0]
+        like: str = (
+            'mutation($id: Int!) { createLike(trackId: $id) { track { id } } }'
+        )
+        add: Any = LikeManager.add
+
+        def add_concurrently(
+            manager: LikeManager, user: User, track: Track
+        ) -> Any:
+            # Another user likes the track while this like is inserted
+            add(manager, get_user_model().objects.create(), track)
+            return add(manager, user, track)
+
+        with mock.patch('tracks.schema.publish') as publish:
+            self.query(like, id=track.pk)
+            with mock.patch.object(LikeManager, 'add', add_concurrently):
+                self.query(like, id=track.pk)
+        publish.assert_called_once_with(
+            f'{TRACK_LIKED}.{track.pk}',
+            {'track_id': track.pk, 'user_id': self.user.pk},
+        )
+
+    def test_batch_size_is_bounded(self) -> None:
+        response = self.client.post(
+            '/graphql/',
+            json.dumps(
+                {
+                    'query': self.CREATE_LIKES,
+                    'variables': {'trackIds': list(range(MAX_BATCH_SIZE + 1))},
+                }
+            ),
+            content_type='application/json',
+            **self.headers,
+        )
+        self.assertIn('limited', response.json()['errors'][0]['message'])
+
+
+class ExportTest(GraphQLTestCase):
+    def export(self, path: str) -> List[str]:
+        response = self.client.get(path, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_export_is_staff_only(self) -> None:
+        track: Track = self.create_tracks(1)[0]
+        self.login(track.posted_by)
+        response = self.client.get('/export/tracks.ndjson', **self.headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_tracks_can_be_exported_and_resumed(self) -> None:
+        tracks: List[Track] = self.create_tracks(3)
+        get_user_model().objects.filter(pk=tracks[0].posted_by_id).update(
+            is_staff=True
+        )
+        self.login(tracks[0].posted_by)
+        rows: List[Dict[str, Any]] = [
+            json.loads(line) for line in self.export('/export/tracks.ndjson')
+        ]
+        self.assertEqual(
+            [(row['id'], row['like_count']) for row in rows],
+            [(track.pk, track.likes.count()) for track in tracks],
+        )
+        self.assertEqual(
+            self.export(f'/export/likes.csv?after={tracks[0].likes.get().pk}'),
+            [
+                f'{like.pk},{like.user_id},{like.track_id}'
+                for like in Like.objects.order_by('pk')[1:]
+            ],
+        )
+
+    def test_export_command(self) -> None:
+        tracks: List[Track] = self.create_tracks(2)
+        stdout: StringIO = StringIO()
+        call_command('export_tracks', 'tracks', format='csv', stdout=stdout)
+        lines: List[str] = stdout.getvalue().splitlines()
+        self.assertEqual(
+            lines[0],
+            'id,title,description,url,created_at,posted_by_id,like_count',
+        )
+        self.assertEqual(
+            [line.split(',')[1] for line in lines[1:]],
+            [track.title for track in tracks],
+        )
+
+
+class AsgiExportTest(TransactionTestCase):
+    def test_export_is_streamed_under_asgi(self) -> None:
+        user: User = get_user_model().objects.create(
+            username='staff', is_staff=True
+        )
+        tracks: List[Track] = [
+            Track.objects.create(
+                title=f'track {index}', url='', posted_by=user
+            )
+            for index in range(3)
+        ]
+        messages: List[Dict[str, Any]] = []
+
+        async def send(message: Dict[str, Any]) -> None:
+            messages.append(message)
+
+        async def run() -> None:
+            inbox: asyncio.Queue = asyncio.Queue()
+            inbox.put_nowait({'type': 'http.request', 'body': b''})
+            await ASGIHandler()(
+                {
+                    'type': 'http',
+                    'method': 'GET',
+                    'path': '/export/tracks.ndjson',
+                    'query_string': b'',
+                    'headers': [
+                        (b'host', b'testserver'),
+                        (b'authorization', f'JWT {get_token(user)}'.encode()),
+                    ],
+                },
+                inbox.get,
+                send,
+            )
+
+        async_to_sync(run)()
+        self.assertEqual(messages[0]['status'], 200)
+        lines: List[str] = (
+            b''.join(message.get('body', b'') for message in messages[1:])
+            .decode()
+            .splitlines()
+        )
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines],
+            [track.pk for track in tracks],
+        )
+
+
+class ImportTest(GraphQLTestCase):
+    def test_rows_are_validated_and_deduplicated(self) -> None:
+        track: Track = self.create_tracks(1)[0]
+        rows: List[Any] = [
+            {
+                'title': track.title,
+                'description': track.description,
+                'url': track.url,
+                'posted_by': 'user0',
+                'liked_by': ['user1'],
+            },
+            {'title': 'new', 'url': 'http://a.com', 'posted_by': 'user1'},
+            {'title': 'new', 'url': 'http://a.com', 'posted_by': 'user1'},
+            {'title': 'bad', 'url': 'not a url', 'posted_by': 'user1'},
+            {'title': 'who', 'url': 'http://b.com', 'posted_by': 'nobody'},
+            {'url': 'http://c.com', 'posted_by': 'user1'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            stats: ImportStats = TrackImporter(chunk_size=3).run(
+                enumerate(rows, 1)
+            )
+        self.assertEqual(
+            (stats.rows, stats.tracks, stats.duplicates, stats.likes),
+            (6, 1, 2, 1),
+        )
+        self.assertEqual(
+            sorted(error.line for error in stats.errors), [4, 5, 6]
+        )
+        self.assertEqual(Track.objects.count(), 2)
+        self.assertEqual(Track.objects.get(pk=track.pk).like_count, 2)
+        self.assertEqual(
+            sum('auth_user' in query['sql'] for query in queries), 2
+        )
+
+    def test_existing_likes_are_not_counted(self) -> None:
+        self.create_tracks(1)
+        rows: List[Any] = [
+            {
+                'title': 'new',
+                'url': 'http://a.com',
+                'posted_by': 'user0',
+                'liked_by': ['user0', 'user1'],
+            }
+        ]
+        TrackImporter().run(enumerate(rows, 1))
+        rows[0]['liked_by'].append('user2')
+        stats: ImportStats = TrackImporter().run(enumerate(rows, 1))
+        self.assertEqual(
+            (stats.tracks, stats.duplicates, stats.likes), (0, 1, 1)
+        )
+        self.assertEqual(Track.objects.get(title='new').like_count, 3)
+
+    def test_imports_are_added_to_the_feeds(self) -> None:
+        self.create_tracks(0)
+        follower, followed = (
+            get_user_model().objects.get(username=name)
+            for name in ('user0', 'user1')
+        )
+        Follow.objects.create(follower=follower, followed=followed)
+        rows: List[Any] = [
+            {'title': 'posted', 'url': 'http://a.com', 'posted_by': 'user1'},
+            {
+                'title': 'liked',
+                'url': 'http://b.com',
+                'posted_by': 'user2',
+                'liked_by': ['user1'],
+            },
+            {'title': 'other', 'url': 'http://c.com', 'posted_by': 'user2'},
+        ]
+        TrackImporter().run(enumerate(rows, 1))
+        self.assertCountEqual(
+            FeedEntry.objects.filter(user=follower).values_list(
+                'track__title', flat=True
+            ),
+            ['posted', 'liked'],
+        )
+
+    def test_import_command(self) -> None:
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', newline=''
+        ) as file:
+            file.write(
+                'title,description,url,posted_by,liked_by\r\n'
+                't1,,http://a.com,alice,alice bob\r\n'
+                't2,d2,http://b.com,bob,\r\n'
+            )
+            file.flush()
+            stdout: StringIO = StringIO()
+            call_command(
+                'import_tracks',
+                file.name,
+                create_users=True,
+                stdout=stdout,
+                stderr=StringIO(),
+            )
+        self.assertIn('2 tracks created', stdout.getvalue())
+        self.assertEqual(
+            list(
+                Track.objects.order_by('title').values_list(
+                    'title', 'posted_by__username', 'like_count'
+                )
+            ),
+            [('t1', 'alice', 2), ('t2', 'bob', 0)],
+        )
+        self.assertFalse(
+            get_user_model().objects.get(username='bob').has_usable_password()
+        )
+
+
+class FeedTest(GraphQLTestCase):
+    FEED: str = '''
+        query($after: String) {
+            feed(first: 2, after: $after) {
+                edges { node { title postedBy { username } } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    '''
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.alice, self.bob, self.carol = (
+            get_user_model().objects.create(username=name)
+            for name in ('alice', 'bob', 'carol')
+        )
+
+    def post(self, user: User, title: str) -> int:
+        self.login(user)
+        data: Dict[str, Any] = self.query(
+            '''
+            mutation($title: String!) {
+                createTrack(
+                    title: $title, description: "", url: "http://a.com"
+                ) {
+                    track { id }
+                }
+            }
+            ''',
+            title=title,
+        )
+        return int(data['createTrack']['track']['id'])
+
+    def like(self, user: User, track_id: int) -> None:
+        self.login(user)
+        self.query(
+            'mutation($id: Int!) '
+            '{ createLike(trackId: $id) { track { id } } }',
+            id=track_id,
+        )
+
+    def follow(self, user: User, followed: User, follow: bool = True) -> None:
+        self.login(user)
+        self.query(
+            f'mutation($id: Int!) {{ {"follow" if follow else "unfollow"}'
+            'User(userId: $id) { user { id } } }',
+            id=followed.pk,
+        )
+
+    def get_feed(self, user: User) -> List[str]:
+        self.login(user)
+        titles: List[str] = []
+        after: Optional[str] = None
+        while True:
+            page: Dict[str, Any] = self.query(self.FEED, after=after)['feed']
+            titles += [edge['node']['title'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                return titles
+            after = page['pageInfo']['endCursor']
+
+    def test_feed_follows_posts_and_likes(self) -> None:
+        self.post(self.bob, 'bob 1')
+        carol_1: int = self.post(self.carol, 'carol 1')
+        self.like(self.bob, carol_1)
+        carol_2: int = self.post(self.carol, 'carol 2')
+        self.follow(self.alice, self.bob)
+        self.assertEqual(self.get_feed(self.alice), ['carol 1', 'bob 1'])
+        self.post(self.bob, 'bob 2')
+        self.like(self.bob, carol_2)
+        self.like(self.carol, carol_1)
+        # carol 2 was posted before bob 2, but liked by bob after it
+        self.assertEqual(
+            self.get_feed(self.alice), ['carol 2', 'bob 2', 'carol 1', 'bob 1']
+        )
+        self.assertEqual(self.get_feed(self.carol), [])
+
+    def test_unfollow_and_rebuild(self) -> None:
+        self.post(self.bob, 'bob 1')
+        self.like(self.carol, self.post(self.bob, 'bob 2'))
+        self.post(self.carol, 'carol 1')
+        self.follow(self.alice, self.bob)
+        self.follow(self.alice, self.carol)
+        self.follow(self.bob, self.carol)
+        entries: List[Any] = list(
+            FeedEntry.objects.order_by('pk').values_list(
+                'user', 'track', 'created_at'
+            )
+        )
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feed', batch_size=2, stdout=StringIO())
+        self.assertCountEqual(
+            FeedEntry.objects.values_list('user', 'track', 'created_at'),
+            entries,
+        )
+        self.follow(self.alice, self.carol, follow=False)
+        self.assertEqual(self.get_feed(self.alice), ['bob 2', 'bob 1'])
+        self.assertEqual(self.get_feed(self.bob), ['carol 1', 'bob 2'])
+
+    def test_feed_is_read_from_its_index(self) -> None:
+        for index in range(5):
+            self.post(self.bob, f'bob {index}')
+        self.follow(self.alice, self.bob)
+        self.login(self.alice)
+        with CaptureQueriesContext(connection) as queries:
+            self.query(self.FEED)
+        sql: str = next(
+            query['sql']
+            for query in queries
+            if '"tracks_feedentry"' in query['sql']
+        )
+        self.assertNotIn('JOIN', sql)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan: str = ' '.join(str(row) for row in cursor.fetchall())
+            self.assertIn('feed_entry_user_created_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(TRACKS_TRENDING={'HALF_LIFE': 3600, 'SIZE': 2})
+class TrendingTest(GraphQLTestCase):
+    TRENDING: str = 'query { trendingTracks(first: 5) { title } }'
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.users: List[User] = [
+            get_user_model().objects.create(username=f'user{index}')
+            for index in range(3)
+        ]
+        self.old, self.new, self.other = (
+            Track.objects.create(title=title, url='', posted_by=self.users[0])
+            for title in ('old', 'new', 'other')
+        )
+
+    def like(self, track: Track, *users: User, hours: float = 0) -> None:
+        Like.objects.bulk_create(
+            Like(user=user, track=track) for user in users
+        )
+        Like.objects.filter(track=track, user__in=users).update(
+            created_at=timezone.now() - timedelta(hours=hours)
+        )
+
+    def titles(self) -> List[str]:
+        return [
+            track['title']
+            for track in self.query(self.TRENDING)['trendingTracks']
+        ]
+
+    def scored(self) -> List[int]:
+        return np.frombuffer(
+            TrendingState.objects.get().track_ids, dtype=np.int64
+        ).tolist()
+
+    def test_forgotten_scores_are_not_kept(self) -> None:
+        self.like(self.old, self.users[0], hours=24 * 30)
+        self.like(self.new, self.users[0])
+        self.assertEqual(trending.refresh(), 2)
+        self.assertEqual(self.scored(), [self.new.pk])
+        self.assertEqual(self.titles(), ['new'])
+
+    def test_likes_weigh_less_with_age(self) -> None:
+        self.like(self.old, *self.users, hours=3)
+        self.like(self.new, self.users[0])
+        self.assertEqual(self.titles(), [])
+        out: StringIO = StringIO()
+        call_command('compute_trending', stdout=out)
+        self.assertIn('from 4 new likes', out.getvalue())
+        self.assertEqual(self.titles(), ['new', 'old'])
+        self.assertAlmostEqual(
+            TrendingTrack.objects.get(track=self.old).score, 3 / 8, places=3
+        )
+
+    def test_refresh_reads_only_new_likes(self) -> None:
+        self.like(self.old, *self.users, hours=1)
+        self.like(self.new, self.users[0])
+        self.assertEqual(trending.refresh(), 4)
+        self.like(self.other, *self.users[:2])
+        self.new.delete()
+        self.assertEqual(trending.refresh(), 2)
+        self.assertEqual(self.titles(), ['other', 'old'])
+        scores: List[float] = list(
+            TrendingTrack.objects.order_by('rank').values_list(
+                'score', flat=True
+            )
+        )
+        self.assertEqual(trending.refresh(full=True), 5)
+        for before, after in zip(
+            scores,
+            TrendingTrack.objects.order_by('rank').values_list(
+                'score', flat=True
+            ),
+        ):
+            self.assertAlmostEqual(before, after, places=3)
+
+
+@override_settings(TRACKS_WRITE_BEHIND={'ENABLED': True})
+class WriteBehindTest(GraphQLTestCase):
+    LIKE: str = (
+        'mutation($id: Int!) { createLike(trackId: $id) { track { id } } }'
+    )
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.alice, self.bob = (
+            get_user_model().objects.create(username=name)
+            for name in ('alice', 'bob')
+        )
+        self.track: Track = Track.objects.create(
+            title='title', url='', posted_by=self.alice
+        )
+
+    def like(self, buffer: LikeBuffer, user: User) -> Dict[str, Any]:
+        self.login(user)
+        with mock.patch(
+            'tracks.write_behind.get_like_buffer', return_value=buffer
+        ):
+            response = self.client.post(
+                '/graphql/',
+                json.dumps(
+                    {'query': self.LIKE, 'variables': {'id': self.track.pk}}
+                ),
+                content_type='application/json',
+                **self.headers,
+            )
+        return response.json()
+
+    def test_likes_are_queued_then_inserted_once(self) -> None:
+        buffer: LikeBuffer = LikeBuffer(timeout=0)
+        for user in (self.alice, self.alice, self.bob):
+            self.assertNotIn('errors', self.like(buffer, user))
+        self.assertEqual(buffer.queue.qsize(), 3)
+        self.assertFalse(Like.objects.exists())
+        buffer.stop()
+        self.assertEqual(Like.objects.count(), 2)
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.like_count, 2)
+        self.assertIn('graphql_like_flush_seconds', get_metrics().histograms)
+
+    def test_a_full_queue_fails_the_like(self) -> None:
+        buffer: LikeBuffer = LikeBuffer(max_size=1, timeout=0)
+        self.assertNotIn('errors', self.like(buffer, self.alice))
+        self.assertEqual(
+            self.like(buffer, self.bob)['errors'][0]['message'],
+            'Too many pending likes, retry later',
+        )
+
+    def test_likes_of_deleted_tracks_are_dropped_alone(self) -> None:
+        deleted: Track = Track.objects.create(
+            title='deleted', url='', posted_by=self.alice
+        )
+        buffer: LikeBuffer = LikeBuffer(timeout=0, retries=0)
+        self.assertTrue(buffer.put(self.bob.pk, self.track.pk))
+        self.assertTrue(buffer.put(self.bob.pk, deleted.pk))
+        deleted.delete()
+        buffer.stop()
+        self.assertEqual(
+            list(Like.objects.values_list('user', 'track')),
+            [(self.bob.pk, self.track.pk)],
+        )
+        self.assertFalse(buffer.put(self.bob.pk, self.track.pk))
@@ -0,0 +1,160 @@
+'''Trending tracks: their likes weighted by recency, scored in batches
+
+A like weighs 2 ** (-age / HALF_LIFE), so the score of a track halves
+every HALF_LIFE seconds without new likes. All weights decaying by the
+same factor, the scores at a later time are the former ones scaled by
+2 ** (-elapsed / HALF_LIFE), plus the weights of the newer likes: so
+refresh() only reads the likes added since its last run, by id, in
+chunks of CHUNK_SIZE turned into NumPy arrays. The scores are kept in
+TrendingState, as the ids of the scored tracks and their scores: a score
+decayed below MIN_SCORE is dropped, so the state only grows with the
+tracks liked recently. The SIZE best tracks are written to TrendingTrack,
+which the trendingTracks query reads in rank order.
+
+Deleted likes, and likes committed after a run with a lower id than the
+last one it read, are only accounted for by a full refresh (the --full
+flag of compute_trending).
+'''
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import numpy as np
+from app.response_cache import invalidate
+from tracks.models import Like, Track, TrendingState, TrendingTrack
+
+HALF_LIFE: float = 24 * 3600
+SIZE: int = 100
+CHUNK_SIZE: int = 10000
+MIN_SCORE: float = 0.001
+
+Scores = Tuple[np.ndarray, np.ndarray]
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'TRACKS_TRENDING', {})
+
+
+def likes(
+    after: int, chunk_size: int
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    '''Yield the ids, track ids and timestamps of the likes after `after`
+
+    One array of each per chunk, in id order.
+    '''
+    while True:
+        rows: List[Tuple[int, int, datetime]] = list(
+            Like.objects.filter(pk__gt=after)
+            .order_by('pk')
+            .values_list('pk', 'track_id', 'created_at')[:chunk_size]
+        )
+        if not rows:
+            return
+        ids, tracks, created = zip(*rows)
+        yield (
+            np.array(ids, dtype=np.int64),
+            np.array(tracks, dtype=np.int64),
+            np.array([value.timestamp() for value in created]),
+        )
+        after = ids[-1]
+
+
+def add(
+    scores: Scores,
+    tracks: np.ndarray,
+    created: np.ndarray,
+    now: float,
+    half_life: float,
+) -> Scores:
+    '''Add the weights at `now` of likes of `tracks` to `scores`
+
+    `scores` are the sorted ids of the scored tracks and their scores.
+    '''
+    weights: np.ndarray = np.exp2((np.minimum(created, now) - now) / half_life)
+    ids: np.ndarray
+    positions: np.ndarray
+    ids, positions = np.unique(
+        np.concatenate((scores[0], tracks)), return_inverse=True
+    )
+    return ids, np.bincount(
+        positions,
+        weights=np.concatenate((scores[1], weights)),
+        minlength=len(ids),
+    )
+
+
+def top(scores: Scores, size: int) -> np.ndarray:
+    '''The positions in `scores` of the `size` best tracks, best first'''
+    ids: np.ndarray
+    values: np.ndarray
+    ids, values = scores
+    positions: np.ndarray = np.flatnonzero(values > 0)
+    if len(positions) > size:
+        positions = positions[
+            np.argpartition(-values[positions], size - 1)[:size]
+        ]
+    return positions[np.lexsort((-ids[positions], -values[positions]))]
+
+
+def refresh(full: bool = False) -> int:
+    '''Score the likes added since the last run, and rank the top again
+
+    With `full`, every like is scored from scratch. Returns the number of
+    likes read.
+    '''
+    config: Dict[str, Any] = get_config()
+    half_life: float = config.get('HALF_LIFE', HALF_LIFE)
+    size: int = config.get('SIZE', SIZE)
+    now: datetime = timezone.now()
+    scores: Scores = (np.zeros(0, dtype=np.int64), np.zeros(0))
+    last_like_id: int = 0
+    state: Optional[TrendingState] = TrendingState.objects.first()
+    if state is not None and not full:
+        elapsed: float = (now - state.computed_at).total_seconds()
+        scores = (
+            np.frombuffer(state.track_ids, dtype=np.int64),
+            np.frombuffer(state.scores) * np.exp2(-elapsed / half_life),
+        )
+        last_like_id = state.last_like_id
+    read: int = 0
+    for ids, tracks, created in likes(
+        last_like_id, config.get('CHUNK_SIZE', CHUNK_SIZE)
+    ):
+        scores = add(scores, tracks, created, now.timestamp(), half_life)
+        last_like_id = int(ids[-1])
+        read += len(ids)
+    kept: np.ndarray = scores[1] >= config.get('MIN_SCORE', MIN_SCORE)
+    scores = (scores[0][kept], scores[1][kept])
+    ranked: np.ndarray = top(scores, size)
+    while True:
+        # The likes of deleted tracks are gone, but not their scores
+        existing: Set[int] = set(
+            Track.objects.filter(
+                pk__in=scores[0][ranked].tolist()
+            ).values_list('pk', flat=True)
+        )
+        if len(existing) == len(ranked):
+            break
+        kept = np.ones(len(scores[0]), dtype=bool)
+        kept[ranked] = np.isin(scores[0][ranked], list(existing))
+        scores = (scores[0][kept], scores[1][kept])
+        ranked = top(scores, size)
+    if state is None:
+        state = TrendingState()
+    state.computed_at = now
+    state.last_like_id = last_like_id
+    state.track_ids = scores[0].tobytes()
+    state.scores = scores[1].tobytes()
+    with transaction.atomic():
+        state.save()
+        TrendingTrack.objects.all().delete()
+        TrendingTrack.objects.bulk_create(
+            TrendingTrack(track_id=pk, rank=rank, score=score)
+            for rank, (pk, score) in enumerate(
+                zip(scores[0][ranked].tolist(), scores[1][ranked].tolist()), 1
+            )
+        )
+    invalidate(TrendingTrack)
+    return read
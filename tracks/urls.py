@@ -0,0 +1,6 @@
+from django.urls import path
+from tracks.views import export_view
+
+urlpatterns = [
+    path('<slug:name>.<slug:format>', export_view, name='export'),
+]
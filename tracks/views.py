@@ -1,3 +1,89 @@
-from django.shortcuts import render
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from graphql_jwt.exceptions import JSONWebTokenError
+from app.auth import authenticate_request
+from tracks.export import EXPORTS, FORMATS, export
 
-# Create your views here.
+ASGI_CHUNK_SIZE: int = 200
+
+
+def in_thread(
+    lines: Iterable[str], size: int = ASGI_CHUNK_SIZE
+) -> Iterator[str]:
+    '''Iterate `lines` on a thread of their own, `size` lines at a time
+
+    Under ASGI, Django 3.1 iterates streaming responses on the event loop,
+    where the ORM refuses to run. A single thread keeps the database
+    cursor of the export, and closes its connection at the end.
+
+    Django waits for each chunk on the event loop, blocking it. So the
+    next chunk is read while the current one is sent, and chunks are
+    small: the loop only blocks when the client reads faster than the
+    database.
+    '''
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(
+        1, thread_name_prefix='export'
+    )
+    iterator: Iterator[str] = iter(lines)
+
+    def close() -> None:
+        getattr(iterator, 'close', lambda: None)()
+        connection.close()
+
+    def read() -> str:
+        return ''.join(islice(iterator, size))
+
+    try:
+        future: Future = executor.submit(read)
+        while True:
+            chunk: str = future.result()
+            if not chunk:
+                return
+            future = executor.submit(read)
+            yield chunk
+    finally:
+        executor.submit(close).result()
+        executor.shutdown()
+
+
+def export_view(request: HttpRequest, name: str, format: str) -> HttpResponse:
+    '''Stream the tracks or likes as NDJSON or CSV, to staff users only
+
+    Pass the id of the last row received as `after` to resume. Under
+    ASGI, rows are read ASGI_CHUNK_SIZE at a time on a thread, ahead of
+    the ones sent, but the event loop waits for each chunk not read yet.
+    '''
+    if name not in EXPORTS or format not in FORMATS:
+        raise Http404
+    try:
+        authenticate_request(request)
+    except JSONWebTokenError as error:
+        return HttpResponseForbidden(str(error))
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    after: Optional[int] = None
+    if request.GET.get('after'):
+        try:
+            after = int(request.GET['after'])
+        except ValueError:
+            return HttpResponseBadRequest('Invalid cursor')
+    lines: Iterator[str] = export(name, format, after)
+    if isinstance(request, ASGIRequest):
+        lines = in_thread(lines)
+    response: StreamingHttpResponse = StreamingHttpResponse(
+        lines, content_type=FORMATS[format][1]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.{format}"'
+    return response
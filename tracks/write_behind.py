@@ -0,0 +1,223 @@
+'''Write-behind of likes: CreateLike queues them, a thread inserts them
+
+With TRACKS_WRITE_BEHIND['ENABLED'], CreateLike checks the track and
+puts the (user, track) pair in a bounded in-process queue instead of
+inserting it, so a spike of likes does not turn into as many write
+transactions. A flusher thread takes the queue as soon as BATCH_SIZE
+likes wait, or INTERVAL seconds after the first one, drops the
+duplicates and the likes of tracks or users deleted since, and inserts
+the batch in one transaction: likes, counters and feeds. trackLiked
+events are published once it commits.
+
+Likes wait in memory. The queue is flushed when the process exits
+normally, but likes queued by a process that is killed are lost, and
+the buffer refuses likes once stopped. When MAX_SIZE likes wait,
+CreateLike blocks up to TIMEOUT seconds for room, then fails. A batch
+failing to insert is tried RETRIES more times before it is dropped, and
+logged.
+
+Every flush observes the depth of the queue into graphql_like_queue_depth
+and its duration into graphql_like_flush_seconds.
+'''
+from __future__ import annotations
+from functools import lru_cache
+from itertools import groupby
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, Optional, Set, Tuple
+import atexit
+import logging
+import queue
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from app.pubsub import publish
+from app.response_cache import invalidate
+from app.tracing import get_metrics
+from tracks import feed
+from tracks.models import Like, Track
+
+Pair = Tuple[int, int]
+
+DEPTHS: Tuple[float, ...] = (0, 10, 100, 1000, 10000)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def get_config() -> Dict[str, Any]:
+    return getattr(settings, 'TRACKS_WRITE_BEHIND', {})
+
+
+class LikeBuffer:
+    '''The queue of the likes to insert, and the thread inserting them'''
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        interval: float = 0.5,
+        timeout: float = 1.0,
+        retries: int = 3,
+    ) -> None:
+        self.queue: queue.Queue = queue.Queue(max_size)
+        self.batch_size: int = batch_size
+        self.interval: float = interval
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.lock: Lock = Lock()
+        self.stopped: Event = Event()
+        self.thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = Thread(
+                target=self.run, name='like-flusher', daemon=True
+            )
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        '''Stop the thread, and insert what is left in the queue'''
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def put(self, user_id: int, track_id: int) -> bool:
+        '''Queue a like, and return whether it was queued
+
+        It is not when the queue stays full, or once the buffer stopped:
+        nothing would insert it.
+        '''
+        if self.stopped.is_set():
+            return False
+        try:
+            self.queue.put((user_id, track_id), timeout=self.timeout)
+        except queue.Full:
+            return False
+        return True
+
+    def take(self, timeout: float, interval: float) -> List[Pair]:
+        '''Wait up to `timeout` for a like, then `interval` for a batch'''
+        try:
+            pairs: List[Pair] = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline: float = time.monotonic() + interval
+        while len(pairs) < self.batch_size:
+            try:
+                pairs.append(
+                    self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                )
+            except queue.Empty:
+                break
+        return pairs
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            pairs: List[Pair] = self.take(self.interval, self.interval)
+            if pairs:
+                self.write(pairs)
+
+    def flush(self) -> None:
+        '''Insert every queued like, in the calling thread'''
+        while True:
+            pairs: List[Pair] = self.take(0, 0)
+            if not pairs:
+                return
+            self.write(pairs)
+
+    def write(self, pairs: List[Pair]) -> None:
+        get_metrics().observe(
+            'graphql_like_queue_depth',
+            (),
+            self.queue.qsize() + len(pairs),
+            DEPTHS,
+        )
+        start: float = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            close_old_connections()
+            try:
+                insert(pairs)
+                break
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception('Dropped %d likes', len(pairs))
+                    return
+                time.sleep(self.interval)
+        get_metrics().observe(
+            'graphql_like_flush_seconds', (), time.perf_counter() - start
+        )
+
+
+def insert(pairs: List[Pair]) -> List[Pair]:
+    '''Insert the (user id, track id) likes that do not exist yet
+
+    Likes of tracks or users that no longer exist are dropped: they would
+    fail the foreign keys, and the whole batch with them. Returns the
+    inserted likes.
+    '''
+    from tracks.schema import TRACK_LIKED
+
+    pairs = sorted(set(pairs))
+    user_ids: Set[int] = {user_id for user_id, _ in pairs}
+    track_ids: Set[int] = {track_id for _, track_id in pairs}
+    with transaction.atomic():
+        existing: Set[Pair] = set(
+            Like.objects.filter(
+                user__in=user_ids, track__in=track_ids
+            ).values_list('user_id', 'track_id')
+        )
+        user_ids = set(
+            User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)
+        )
+        track_ids = set(
+            Track.objects.filter(pk__in=track_ids).values_list('pk', flat=True)
+        )
+        new: List[Pair] = [
+            (user_id, track_id)
+            for user_id, track_id in pairs
+            if (user_id, track_id) not in existing
+            and user_id in user_ids
+            and track_id in track_ids
+        ]
+        if not new:
+            return new
+        Like.objects.bulk_create(
+            (
+                Like(user_id=user_id, track_id=track_id)
+                for user_id, track_id in new
+            ),
+            ignore_conflicts=True,
+        )
+        Track.objects.filter(
+            pk__in={track_id for _, track_id in new}
+        ).refresh_like_counts()
+        for user_id, likes in groupby(new, key=lambda pair: pair[0]):
+            feed.add_likes(
+                User(pk=user_id), [Track(pk=track_id) for _, track_id in likes]
+            )
+        for user_id, track_id in new:
+            publish(
+                f'{TRACK_LIKED}.{track_id}',
+                {'track_id': track_id, 'user_id': user_id},
+            )
+    invalidate(Like)
+    return new
+
+
+@lru_cache(maxsize=None)
+def get_like_buffer() -> LikeBuffer:
+    '''The buffer of the process, its thread started'''
+    config: Dict[str, Any] = get_config()
+    buffer: LikeBuffer = LikeBuffer(
+        **{
+            name.lower(): value
+            for name, value in config.items()
+            if name != 'ENABLED'
+        }
+    )
+    buffer.start()
+    return buffer
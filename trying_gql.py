@@ -1,24 +1,85 @@
-from typing import Any, ClassVar, Dict, Optional
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
 from gql import gql, Client
 from gql.transport.requests import RequestsHTTPTransport
 from graphql.language.ast import Document
+from graphql.language.printer import print_ast
+from graphql.type.schema import GraphQLSchema
+import requests
 
 
 class GQLClient:
     URL: ClassVar[str] = 'http://localhost:8000/graphql/'
+    _session: ClassVar[Optional[requests.Session]] = None
+    _schema: ClassVar[Optional[GraphQLSchema]] = None
+
+    @classmethod
+    def _get_session(cls) -> requests.Session:
+        '''The HTTP session shared by every call, keeping connections open'''
+        if cls._session is None:
+            cls._session = requests.Session()
+        return cls._session
 
     @classmethod
     def _get_transport(
         cls, headers: Optional[Dict[str, str]] = None
     ) -> RequestsHTTPTransport:
-        return RequestsHTTPTransport(cls.URL, headers=headers)
+        transport: RequestsHTTPTransport = RequestsHTTPTransport(
+            cls.URL, headers=headers
+        )
+        transport.session = cls._get_session()
+        return transport
+
+    @classmethod
+    def _get_schema(cls) -> GraphQLSchema:
+        '''The server schema, introspected on the first call only'''
+        if cls._schema is None:
+            cls._schema = Client(
+                transport=cls._get_transport(),
+                fetch_schema_from_transport=True,
+            ).schema
+        return cls._schema
 
     @classmethod
     def _get_client(cls, headers: Optional[Dict[str, str]] = None) -> Client:
         return Client(
-            transport=cls._get_transport(headers),
-            fetch_schema_from_transport=True,
+            schema=cls._get_schema(), transport=cls._get_transport(headers)
+        )
+
+    @classmethod
+    def execute_many(
+        cls,
+        operations: List[Tuple[Document, Optional[Dict[str, Any]]]],
+        jwt: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        '''Execute the operations in a single request, in order
+
+        Each document is validated against the cached schema first, and
+        the data of every operation is returned, as Client.execute does.
+        '''
+        client: Client = cls._get_client()
+        payload: List[Dict[str, Any]] = []
+        for document, variables in operations:
+            client.validate(document)
+            payload.append(
+                {'query': print_ast(document), 'variables': variables or {}}
+            )
+        response: requests.Response = cls._get_session().post(
+            cls.URL, json=payload, headers=cls.auth(jwt) if jwt else None
         )
+        try:
+            results: Any = response.json()
+        except ValueError:
+            results = None
+        if not isinstance(results, list):
+            response.raise_for_status()
+            raise requests.HTTPError(
+                'Server did not return a GraphQL batch result',
+                response=response,
+            )
+        for result in results:
+            if result.get('errors'):
+                raise Exception(str(result['errors'][0]))
+        return [result['data'] for result in results]
 
     @classmethod
     def get_jwt(cls, username: str, password: str) -> str:
@@ -174,6 +235,21 @@ def main() -> None:
     user = resp['createLike']['user']
     assert track['id'] == track_id
     assert user['username'] == 'sdq'
+    me, liked = GQLClient.execute_many(
+        [
+            (gql('query { me { username } }'), None),
+            (
+                gql(
+                    'query($trackId: Int!) '
+                    '{ track(trackId: $trackId) { likeCount } }'
+                ),
+                {'trackId': int(track_id)},
+            ),
+        ],
+        jwt,
+    )
+    assert me['me']['username'] == 'sdq'
+    assert liked['track']['likeCount'] >= 1
     resp = GQLClient.delete_track(jwt, track['id'])
     track_id = resp['deleteTrack']['trackId']
     assert track_id == int(track['id'])
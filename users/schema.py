@@ -1,12 +1,14 @@
 from __future__ import annotations
-from typing import Sequence
+from typing import Optional, Sequence
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
-from django.db.models.manager import BaseManager
+from django.db.models import QuerySet
 from graphene_django import DjangoObjectType
 from graphql import GraphQLError
 from graphql.execution.base import ResolveInfo
 import graphene
+from app.optimizer import optimize
+from app.pagination import paginate
 
 
 class UserType(DjangoObjectType):
@@ -15,18 +17,33 @@ class UserType(DjangoObjectType):
         # only_fields: Sequence[str] = ('id', 'email', 'username', 'dateJoined')
 
 
+class UserConnection(graphene.relay.Connection):
+    class Meta:
+        node: type = UserType
+
+
 class Query(graphene.ObjectType):
-    users: graphene.List = graphene.List(UserType)
+    users: graphene.Field = graphene.Field(
+        UserConnection, first=graphene.Int(), after=graphene.String()
+    )
     user: graphene.Field = graphene.Field(
         UserType, id=graphene.Int(), required=True
     )
     me: graphene.Field = graphene.Field(UserType)
 
-    def resolve_users(self, info: ResolveInfo) -> BaseManager[User]:
-        return get_user_model().objects.all()
+    def resolve_users(
+        self,
+        info: ResolveInfo,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> UserConnection:
+        users: QuerySet[User] = optimize(
+            get_user_model().objects.all(), info, ('edges', 'node')
+        )
+        return paginate(users, UserConnection, ('id',), first, after)
 
     def resolve_user(self, info: ResolveInfo, id: int) -> User:
-        return User.objects.get(pk=id)
+        return optimize(get_user_model().objects.all(), info).get(pk=id)
 
     def resolve_me(self, info: ResolveInfo) -> User:
         if info.context is not None: